@@ -1,26 +1,206 @@
-import requests
+import asyncio
+import httpx
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
-from config.main import ELEVENLABS_API_KEY, ELEVENLABS_AGENT_ID, ELEVENLABS_PHONE_ID
+from config.main import (
+    ELEVENLABS_API_KEY,
+    ELEVENLABS_AGENT_ID,
+    ELEVENLABS_PHONE_ID,
+    ELEVENLABS_BASE_URL,
+    ELEVENLABS_WEBHOOK_SECRET,
+    ELEVENLABS_BREAKER_WINDOW,
+    ELEVENLABS_BREAKER_WINDOW_CALLS,
+    ELEVENLABS_BREAKER_MIN_CALLS,
+    ELEVENLABS_BREAKER_FAILURE_RATE,
+    ELEVENLABS_BREAKER_SLOW_CALL_SECONDS,
+    ELEVENLABS_BREAKER_SLOW_RATE,
+    ELEVENLABS_BREAKER_OPEN_SECONDS,
+    ELEVENLABS_BREAKER_MAX_OPEN_SECONDS,
+    ELEVENLABS_HEDGE_GETS,
+    ELEVENLABS_HEDGE_MIN_DELAY,
+    ELEVENLABS_HEDGE_RATIO,
+    MONITOR_EXPECTED_CALL_DURATION,
+    MONITOR_MAX_WAIT,
+    MONITOR_MIN_POLL_INTERVAL,
+    MONITOR_MAX_POLL_INTERVAL,
+    MONITOR_MAX_CONCURRENT_POLLS,
+    MONITOR_WEBHOOK_FALLBACK_INTERVAL,
+    MONITOR_LEASE_SECONDS,
+    MONITOR_MAX_CALLS,
+    MONITOR_CLAIM_BATCH,
+    DIAL_MAX_QUEUED,
+    DIAL_MAX_CONCURRENT_PER_LINE,
+    TRANSCRIPT_CACHE_LIVE_TTL,
+    TRANSCRIPT_CACHE_MAX_BYTES,
+    RECORDING_CACHE_DIR,
+    RECORDING_CACHE_MAX_BYTES,
+    ARCHIVE_DIR,
+    ARCHIVE_CHUNK_RECORDS,
+    ARCHIVE_FLUSH_INTERVAL,
+    ARCHIVE_SEGMENT_BYTES,
+    SEARCH_INDEX_PATH,
+    TRANSCRIPT_STREAM_INTERVAL,
+    OUTCOME_KEYWORDS_PATH,
+    CALL_REGISTRY_PATH,
+    IDEMPOTENCY_PATH,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_LEAD_TTL,
+    IDEMPOTENCY_MAX_KEYS,
+    IDEMPOTENCY_WAIT,
+    BACKEND_URL,
+    OUTBOX_PATH,
+    OUTBOX_BATCH_PATH,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_RETRY_BASE,
+    OUTBOX_RETRY_MAX,
+    OUTBOX_MAX_ATTEMPTS,
+)
+from services.call_monitor import CallMonitor
+from services.call_registry import CallRegistry
+from services.dial_queue import DialJob, DialQueue, Line, QueueFull
+from services.idempotency import Idempotency, IdempotencyStore, lead_key
+from services.recording_cache import RecordingCache
+from services.transcript_archive import TranscriptArchive, day_of
+from services.transcript_cache import TranscriptCache
+from services.transcript_search import TranscriptSearch
+from services.transcript_stream import TranscriptStreams
+from utils.circuit_breaker import CircuitOpen, Endpoint
+from utils.http_client import get_http_client
+from utils.metrics import ANALYZE_SECONDS, instrument, timed
+from utils.outbox import Outbox
+from utils.outcome_classifier import get_classifier
 
 class ElevenLabsAgent:
     """ElevenLabs ConvAI Agent Integration"""
 
+    # Conversation states after which the transcript no longer changes
+    TERMINAL_STATUSES = ("done", "failed", "completed", "call_end", "finished")
+
     def __init__(self):
         self.api_key = ELEVENLABS_API_KEY
         self.agent_id = ELEVENLABS_AGENT_ID
         self.phone_id = ELEVENLABS_PHONE_ID
-        self.base_url = "https://api.elevenlabs.io/v1/convai"
+        self.base_url = ELEVENLABS_BASE_URL
+        self.classifier = get_classifier(OUTCOME_KEYWORDS_PATH)
+        # One breaker per upstream endpoint, so a failing conversation API does
+        # not stop dialing (and vice versa). Only idempotent reads are hedged.
+        self.endpoints = {
+            "outbound_call": self._endpoint("outbound_call"),
+            "get_conversation": self._endpoint("get_conversation", hedge=ELEVENLABS_HEDGE_GETS),
+            "get_audio": self._endpoint("get_audio"),
+        }
+        self.registry = CallRegistry(CALL_REGISTRY_PATH, lease=MONITOR_LEASE_SECONDS)
+        self.monitor = CallMonitor(
+            fetch=self.get_transcript,
+            on_finished=self._call_finished,
+            terminal_statuses=self.TERMINAL_STATUSES,
+            expected_duration=MONITOR_EXPECTED_CALL_DURATION,
+            max_wait=MONITOR_MAX_WAIT,
+            min_interval=MONITOR_MIN_POLL_INTERVAL,
+            max_interval=MONITOR_MAX_POLL_INTERVAL,
+            max_concurrent_polls=MONITOR_MAX_CONCURRENT_POLLS,
+            # With post-call webhooks configured, polling is only a safety net
+            fallback_interval=MONITOR_WEBHOOK_FALLBACK_INTERVAL if ELEVENLABS_WEBHOOK_SECRET else None,
+            registry=self.registry,
+            max_calls=MONITOR_MAX_CALLS,
+            claim_batch=MONITOR_CLAIM_BATCH,
+            on_dropped=self._call_dropped,
+        )
+        self.dialer = DialQueue(
+            dial=self._dial_job,
+            max_queued=DIAL_MAX_QUEUED,
+            max_concurrent_per_line=DIAL_MAX_CONCURRENT_PER_LINE,
+            expected_call_duration=MONITOR_EXPECTED_CALL_DURATION,
+            finished_calls=self._finished_calls,
+            reconcile_interval=MONITOR_LEASE_SECONDS,
+            renew_queued=self._renew_leads,
+            on_discarded=self._discard_leads,
+        )
+        self.idempotency = Idempotency(
+            IdempotencyStore(IDEMPOTENCY_PATH, max_entries=IDEMPOTENCY_MAX_KEYS),
+            ttl=IDEMPOTENCY_TTL,
+            lead_ttl=IDEMPOTENCY_LEAD_TTL,
+            wait=IDEMPOTENCY_WAIT,
+        )
+        self.transcripts = TranscriptCache(
+            fetch=self.get_transcript,
+            terminal_statuses=self.TERMINAL_STATUSES,
+            live_ttl=TRANSCRIPT_CACHE_LIVE_TTL,
+            max_bytes=TRANSCRIPT_CACHE_MAX_BYTES,
+        )
+        self.recordings = RecordingCache(
+            fetch=self.fetch_recording,
+            directory=RECORDING_CACHE_DIR,
+            max_bytes=RECORDING_CACHE_MAX_BYTES,
+        )
+        self.archive = TranscriptArchive(
+            ARCHIVE_DIR,
+            chunk_records=ARCHIVE_CHUNK_RECORDS,
+            flush_interval=ARCHIVE_FLUSH_INTERVAL,
+            segment_bytes=ARCHIVE_SEGMENT_BYTES,
+        )
+        self.search = TranscriptSearch(SEARCH_INDEX_PATH)
+        self.streams = TranscriptStreams(
+            fetch=self.get_transcript,
+            cache=self.transcripts,
+            terminal_statuses=self.TERMINAL_STATUSES,
+            interval=TRANSCRIPT_STREAM_INTERVAL,
+        )
+        self.outbox = Outbox(
+            path=OUTBOX_PATH,
+            url=f"{BACKEND_URL}/api/v1/call-agent/webhook/outcome",
+            batch_url=f"{BACKEND_URL}{OUTBOX_BATCH_PATH}" if OUTBOX_BATCH_PATH else None,
+            batch_size=OUTBOX_BATCH_SIZE,
+            retry_base=OUTBOX_RETRY_BASE,
+            retry_max=OUTBOX_RETRY_MAX,
+            max_attempts=OUTBOX_MAX_ATTEMPTS,
+        )
         
         if not self.api_key or not self.agent_id:
             logger.warning("ElevenLabs credentials missing. Calls will fail.")
         else:
             logger.info("ElevenLabs Agent initialized")
 
-    def make_call(self, phone: str, name: str, company: str) -> Dict:
+    @property
+    def client(self):
+        """Shared pooled HTTP client (keep-alive, bounded timeouts)"""
+        return get_http_client()
+
+    @staticmethod
+    def _endpoint(name: str, hedge: bool = False) -> Endpoint:
+        return Endpoint(
+            "elevenlabs",
+            name,
+            hedge=hedge,
+            hedge_min_delay=ELEVENLABS_HEDGE_MIN_DELAY,
+            hedge_ratio=ELEVENLABS_HEDGE_RATIO,
+            window=ELEVENLABS_BREAKER_WINDOW,
+            window_calls=ELEVENLABS_BREAKER_WINDOW_CALLS,
+            min_calls=ELEVENLABS_BREAKER_MIN_CALLS,
+            failure_rate=ELEVENLABS_BREAKER_FAILURE_RATE,
+            slow_call=ELEVENLABS_BREAKER_SLOW_CALL_SECONDS,
+            slow_rate=ELEVENLABS_BREAKER_SLOW_RATE,
+            open_seconds=ELEVENLABS_BREAKER_OPEN_SECONDS,
+            max_open_seconds=ELEVENLABS_BREAKER_MAX_OPEN_SECONDS,
+        )
+
+    def line(self, agent_id: Optional[str] = None, phone_id: Optional[str] = None):
+        """The (agent, phone number) pair a call is placed from, for concurrency caps"""
+        return (agent_id or self.agent_id, phone_id or self.phone_id)
+
+    @instrument("elevenlabs", "outbound_call")
+    async def make_call(
+        self,
+        phone: str,
+        name: str,
+        company: str,
+        agent_id: Optional[str] = None,
+        phone_id: Optional[str] = None,
+    ) -> Dict:
         """Trigger an outbound call via ElevenLabs"""
-        if not self.api_key or not self.agent_id or not self.phone_id:
+        agent_id, phone_id = self.line(agent_id, phone_id)
+        if not self.api_key or not agent_id or not phone_id:
             logger.error("Missing ElevenLabs credentials (API Key, Agent ID, or Phone ID)")
             return {"success": False, "error": "Missing credentials"}
 
@@ -32,14 +212,16 @@ class ElevenLabsAgent:
         
         # ElevenLabs ConvAI trigger payload
         payload = {
-            "agent_id": self.agent_id,
-            "agent_phone_number_id": self.phone_id,
+            "agent_id": agent_id,
+            "agent_phone_number_id": phone_id,
             "to_number": phone
         }
         
         try:
             logger.info(f"Triggering ElevenLabs call to {phone}...")
-            response = requests.post(url, json=payload, headers=headers)
+            response = await self.endpoints["outbound_call"].request(
+                lambda: self.client.post(url, json=payload, headers=headers)
+            )
             
             if response.status_code == 200:
                 data = response.json()
@@ -61,11 +243,15 @@ class ElevenLabsAgent:
                 logger.error(f"ElevenLabs call failed ({response.status_code}): {error_msg}")
                 return {"success": False, "error": error_msg, "status_code": response.status_code}
 
+        except CircuitOpen as e:
+            logger.warning(f"Not calling {phone}: {e}")
+            return {"success": False, "error": str(e), "circuit_open": True, "retry_after": e.retry_after}
         except Exception as e:
             logger.error(f"ElevenLabs call exception: {e}")
             return {"success": False, "error": str(e)}
 
-    def get_transcript(self, call_id: str) -> Dict:
+    @instrument("elevenlabs", "get_conversation")
+    async def get_transcript(self, call_id: str) -> Dict:
         """Get conversation details and transcript"""
         if not self.api_key:
             return {"success": False, "error": "Missing API Key"}
@@ -76,105 +262,198 @@ class ElevenLabsAgent:
         }
 
         try:
-            response = requests.get(url, headers=headers)
+            response = await self.endpoints["get_conversation"].request(
+                lambda: self.client.get(url, headers=headers)
+            )
             if response.status_code == 200:
-                data = response.json()
-                
-                # Extract transcript
-                # The structure usually contains 'transcript' list or similar.
-                # We need to parse it into a string.
-                transcript_items = data.get("transcript", [])
-                transcript_text = ""
-                for item in transcript_items:
-                    role = item.get("role", "unknown")
-                    message = item.get("message", "") # or 'text'
-                    if not message:
-                         message = item.get("text", "")
-                    
-                    transcript_text += f"{role}: {message}\n"
-
-                status = data.get("status", "unknown") 
-                
-                # Metadata for recording
-                audio_url = data.get("audio_url") # If available
-
-                return {
-                    "call_id": call_id,
-                    "status": status,
-                    "transcript": transcript_text.strip(),
-                    "has_recording": bool(audio_url),
-                    "recording_url": audio_url,
-                    "raw_data": data # Keep raw data just in case
-                }
+                return self.parse_conversation(call_id, response.json())
             else:
                 return {"success": False, "error": response.text}
+        except CircuitOpen as e:
+            return {"success": False, "error": str(e), "circuit_open": True, "retry_after": e.retry_after}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @instrument("elevenlabs", "get_audio")
+    async def fetch_recording(self, call_id: str) -> httpx.Response:
+        """Start downloading a conversation's audio; the caller reads and closes the streamed response"""
+        request = self.client.build_request(
+            "GET", f"{self.base_url}/conversations/{call_id}/audio", headers={"xi-api-key": self.api_key or ""}
+        )
+        return await self.endpoints["get_audio"].request(lambda: self.client.send(request, stream=True))
+
+    def parse_conversation(self, call_id: str, data: Dict) -> Dict:
+        """Normalize an ElevenLabs conversation payload (API response or webhook data)"""
+        # Extract transcript
+        # The structure usually contains 'transcript' list or similar.
+        # We need to parse it into a string.
+        # Collect lines and join once: repeated += is quadratic on long calls.
+        transcript_items = data.get("transcript") or []
+        lines = []
+        for item in transcript_items:
+            role = item.get("role", "unknown")
+            message = item.get("message", "") # or 'text'
+            if not message:
+                 message = item.get("text", "")
+
+            lines.append(f"{role}: {message}")
+        transcript_text = "\n".join(lines)
+
+        status = data.get("status", "unknown") 
+
+        # Metadata for recording
+        audio_url = data.get("audio_url") # If available
+
+        return {
+            "call_id": call_id,
+            "status": status,
+            "transcript": transcript_text.strip(),
+            "has_recording": bool(audio_url),
+            "recording_url": audio_url,
+            "raw_data": data # Keep raw data just in case
+        }
+
+    @timed(ANALYZE_SECONDS.labels("single"))
     def analyze_outcome(self, transcript: str) -> Dict:
         """Analyze call outcome based on transcript"""
-        # We can reuse the same logic as VoiceAgent, or use an LLM here if wanted.
-        # For now, reusing the simple keyword matching from the original agent is safest to maintain consistency 
-        # unless user requested a smarter analyzer.
-        # I'll copy the logic from VoiceAgent for now.
-        
-        text = transcript.lower()
-
-        if any(w in text for w in ["interested", "demo", "yes", "schedule"]):
-            return {
-                "outcome": "interested",
-                "qualified": True,
-                "action": "schedule_meeting",
-            }
-        elif any(w in text for w in ["not interested", "no thanks", "stop", "unsubscribe"]):
-            return {
-                "outcome": "not_interested",
-                "qualified": False,
-                "action": "blocklist",
-            }
-        elif any(w in text for w in ["call back", "later", "busy"]):
-            return {
-                "outcome": "callback",
-                "qualified": False,
-                "action": "schedule_callback",
-            }
-        else:
-            return {"outcome": "no_response", "qualified": False, "action": "follow_up"}
+        # Shared with the callagent VoiceAgent so both agents score identically
+        return self.classifier.classify(transcript)
 
     def monitor_call_and_report(self, call_id: str, context: Dict):
         """
-        Background task to monitor call, wait for completion, and report.
+        Hand the call to the shared monitor scheduler, which polls it until it
+        reaches a terminal state (or the max wait) and then calls report_call.
         ElevenLabs calls can be long.
         """
         logger.info(f"Starting background monitoring for ElevenLabs call {call_id}")
-        
-        # Poll for completion
-        # Logic: Check status every 10s. If 'completed', 'success', 'failed', stop.
-        # Max wait: 5 minutes? 10 minutes?
-        
-        max_retries = 60 # 60 * 5s = 5 mins
-        final_status = None
-        
-        for _ in range(max_retries):
-            details = self.get_transcript(call_id)
-            if details.get("success") is False:
-                logger.error(f"Error checking status for usage {call_id}")
-                time.sleep(5)
-                continue
-                
-            status = details.get("status")
-            logger.debug(f"Call {call_id} is {status}")
-            
-            if status in ["completed", "call_end", "finished"]: # Check exact ElevenLabs status enum
-                final_status = status
-                break
-            
-            # If the call is very old, it might count as finished.
-            
-            time.sleep(5)
-            
-        # Get final transcript
-        details = self.get_transcript(call_id)
+        self.monitor.watch(call_id, context)
+
+    async def queue_leads(self, leads: List[Dict], line: Line) -> Tuple[List[DialJob], Dict[int, Dict]]:
+        """
+        Queue leads on a line, skipping leads already dialed or queued within
+        the lead dedupe window (same campaignId + contactId, see lead_key).
+
+        Returns the new jobs and, by position in ``leads``, the recorded
+        result (dial_id, and call_id once dialed) of each skipped lead.
+
+        Raises:
+            QueueFull: As DialQueue.submit; nothing is queued or recorded.
+        """
+        # The dedupe table is read and written in a thread, the queue on the loop
+        fresh, claimed, duplicates = await asyncio.to_thread(self._claim_leads, leads)
+        try:
+            jobs = self.dialer.submit(fresh, line) if fresh else []
+        except QueueFull:
+            await asyncio.to_thread(self._release_leads, claimed)
+            raise
+        await asyncio.to_thread(self._record_queued, jobs, duplicates)
+        return jobs, duplicates
+
+    def _claim_leads(self, leads: List[Dict]) -> Tuple[List[Dict], List[str], Dict[int, object]]:
+        """Claim each lead's key; returns the fresh leads, their keys and the duplicates by position"""
+        fresh, claimed, duplicates = [], [], {}
+        for index, lead in enumerate(leads):
+            key = lead_key(lead["phone"], lead.get("context"))
+            if key is not None:
+                record = self.idempotency.claim(key)
+                if record is not None:
+                    self.idempotency.note_replay()
+                    duplicates[index] = key if record.response is None else record.response
+                    continue
+                claimed.append(key)
+            fresh.append(lead)
+        return fresh, claimed, duplicates
+
+    def _release_leads(self, keys: List[str]):
+        for key in keys:
+            self.idempotency.release(key)
+
+    async def _renew_leads(self, jobs: List[DialJob]):
+        # A queued lead's key must outlive its wait in the queue, however long
+        keys = [key for key in (lead_key(job.phone, job.context) for job in jobs) if key is not None]
+        await asyncio.to_thread(self.idempotency.renew, keys)
+
+    async def _discard_leads(self, jobs: List[DialJob]):
+        # The jobs are gone with this process: let their leads be queued again
+        keys = [key for key in (lead_key(job.phone, job.context) for job in jobs) if key is not None]
+        await asyncio.to_thread(self._release_leads, keys)
+
+    def _record_queued(self, jobs: List[DialJob], duplicates: Dict[int, object]):
+        for job in jobs:
+            key = lead_key(job.phone, job.context)
+            if key is not None:
+                self.idempotency.complete(key, {"success": True, "dial_id": job.dial_id, "status": "queued"})
+        for index, value in duplicates.items():
+            if isinstance(value, str):
+                # Repeated within this batch, or still pending in another request
+                record = self.idempotency.store.get(value)
+                duplicates[index] = (record and record.response) or {"success": True, "status": "pending"}
+
+    async def _dial_job(self, job: DialJob) -> Dict:
+        """
+        Place a queued call and start monitoring it. With the dial circuit
+        open the result carries ``retry_after`` and the queue requeues the job.
+        """
+        agent_id, phone_id = job.line
+        result = await self.make_call(job.phone, job.name, job.company, agent_id, phone_id)
+        key = lead_key(job.phone, job.context)
+        if result.get("success") and result.get("call_id"):
+            self.monitor_call_and_report(result["call_id"], job.context)
+            if key is not None:
+                await asyncio.to_thread(
+                    self.idempotency.complete, key, {"success": True, "dial_id": job.dial_id, "call_id": result["call_id"]}
+                )
+        elif key is not None and not result.get("circuit_open"):
+            # Let the lead be queued again (a job refused by the open circuit is still queued)
+            await asyncio.to_thread(self.idempotency.release, key)
+        return result
+
+    async def _call_finished(self, call_id: str, context: Dict, details: Optional[Dict] = None) -> Dict:
+        # Free the line first so the next queued call can dial while we report
+        self.dialer.release(call_id)
+        return await self.report_call(call_id, context, details)
+
+    async def _call_dropped(self, call_id: str):
+        # The worker that finalizes the call may not be the one holding its line slot
+        await self.dialer.reconcile([call_id])
+
+    async def _finished_calls(self, call_ids: List[str]) -> List[str]:
+        return await asyncio.to_thread(self.registry.finished, call_ids)
+
+    async def handle_conversation_ended(self, call_id: str, data: Dict):
+        """
+        Finalize a call from a post-call webhook payload, skipping any further
+        polling. Calls this worker is not monitoring (e.g. leased to another
+        worker) are claimed in the registry and reported with the context it
+        holds for them, unless another worker is already reporting them; the
+        owner drops them on its next poll.
+        """
+        details = self.parse_conversation(call_id, data)
+        if await self.monitor.complete(call_id, details):
+            return
+        if self.monitor.is_finished(call_id):
+            logger.info(f"Ignoring webhook for already reported call {call_id}")
+            return
+        record = await asyncio.to_thread(self.registry.get, call_id)
+        if record is None:
+            logger.warning(f"Webhook for unmonitored call {call_id}, reporting without context")
+        elif not await asyncio.to_thread(self.registry.claim_finish, call_id, True):
+            logger.info(f"Ignoring webhook for call {call_id}, already reported or being reported")
+            return
+        self.dialer.release(call_id)
+        result = await self.report_call(call_id, record.context if record else {}, details)
+        if record is not None:
+            await asyncio.to_thread(self.registry.finish, call_id, "webhook", details.get("status"), None, result)
+
+    async def report_call(self, call_id: str, context: Dict, details: Optional[Dict] = None) -> Dict:
+        """Analyze a finished call, report the outcome to the backend and return it"""
+        if not details or details.get("success") is False:
+            # Get final transcript
+            details = await self.get_transcript(call_id)
+        # Seed the transcript cache so dashboards never refetch a finished call,
+        # and end live streams without waiting for their next refresh
+        self.transcripts.put(call_id, details)
+        self.streams.update(call_id, details)
         transcript_text = details.get("transcript", "")
         
         # Analyze
@@ -191,28 +470,60 @@ class ElevenLabsAgent:
             "picked": True if len(transcript_text) > 10 else False,
         }
         
-        self.send_signal_to_backend(backend_data)
+        await self.send_signal_to_backend(backend_data)
+        await self.archive_call(call_id, context, details, analysis, backend_data["picked"])
         logger.info(f"Finished monitoring for call {call_id}")
+        return {**analysis, "picked": backend_data["picked"]}
 
-    def send_signal_to_backend(self, call_data: Dict) -> bool:
-        """Send signal to backend"""
-        # Exactly the same as VoiceAgent
-        # We could extract this to a common utility, but for now copying is faster/safer than refactoring shared code.
-        import os
-        import requests
-        
-        backend_url = os.getenv("BACKEND_URL", "http://localhost:4004")
-        webhook_url = f"{backend_url}/api/v1/call-agent/webhook/outcome"
+    async def archive_call(self, call_id: str, context: Dict, details: Dict, analysis: Dict, picked: bool):
+        """Append the finished call to the local archive and the search index"""
+        raw = details.get("raw_data") or {}
+        metadata = raw.get("metadata") or {}
+        started_at = metadata.get("start_time_unix_secs")
+        turns = [
+            {
+                "role": item.get("role", "unknown"),
+                "message": item.get("message") or item.get("text") or "",
+                "time": item.get("time_in_call_secs"),
+            }
+            for item in raw.get("transcript") or []
+        ]
+        record = {
+            "call_id": call_id,
+            "campaign_id": context.get("campaignId"),
+            "contact_id": context.get("contactId"),
+            "user_id": context.get("contactData", {}).get("userId"),
+            "status": details.get("status"),
+            "day": day_of(started_at or time.time()),
+            "started_at": started_at,
+            "duration_secs": metadata.get("call_duration_secs"),
+            "transcript": details.get("transcript", ""),
+            "turns": turns,
+            "analysis": analysis,
+            "picked": picked,
+        }
+        try:
+            self.archive.append(record)
+        except Exception as e:
+            logger.error(f"Error archiving call {call_id}: {e}")
+        try:
+            # An FTS write (and a wait on another worker's lock) stays off the event loop
+            await asyncio.to_thread(self.search.add, record)
+        except Exception as e:
+            logger.error(f"Error indexing call {call_id} for search: {e}")
 
+    async def send_signal_to_backend(self, call_data: Dict) -> bool:
+        """Queue the outcome for the backend; the outbox delivers and retries it"""
         try:
-            logger.info(f"Sending signal to backend: {webhook_url}")
-            response = requests.post(webhook_url, json=call_data, timeout=10)
-            if response.status_code == 200:
-                logger.info("Successfully sent signal to backend.")
-                return True
-            else:
-                logger.error(f"Failed to send signal. Status: {response.status_code}")
-                return False
+            outbox_id = self.outbox.enqueue(call_data)
+            logger.info(f"Queued outcome for call {call_data.get('call_id')} (outbox #{outbox_id})")
+            return True
         except Exception as e:
-            logger.error(f"Error sending signal to backend: {e}")
+            logger.error(f"Error queueing signal to backend: {e}")
             return False
+
+    @instrument("backend", "post_outcome")
+    async def post_to_backend(self, url: str, body: Dict) -> int:
+        """One outbox delivery attempt over the shared client"""
+        response = await self.client.post(url, json=body, timeout=10)
+        return response.status_code
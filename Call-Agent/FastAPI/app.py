@@ -1,7 +1,7 @@
 import logging
 from fastapi import FastAPI, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import (
     RequestValidationError,
     ValidationException,
@@ -10,9 +10,11 @@ from fastapi.exceptions import (
 from fastapi.staticfiles import StaticFiles
 import os
 
-# from backend.config.lifespan import lifespan
+from config.lifespan import lifespan
 from route.index import router as api_routes
+from utils.metrics import render_latest
 from utils.pydanticToFormError import pydantic_to_form_error
+from utils.request_metrics import RequestMetricsMiddleware
 
 # Initialize logging
 logger = logging.getLogger(__name__)
@@ -25,7 +27,7 @@ app= FastAPI(
     redoc_url="/redoc",
     openapi_url="/openapi.json",
     contact={"name": "Developer - Infynd", "url": "https://www.infynd.com/"},
-    # lifespan=lifespan
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -35,6 +37,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 # Mount assets directory
 # Going up 3 levels from backend/app.py to reach AISDR-BE root where assets folder is located
@@ -50,16 +53,10 @@ app.add_middleware(
 async def health_check():
     return {"status": "AI running", "service": "Python AI Service"}
 
-@app.middleware("http")
-
-async def add_checker(request: Request, call_next):
-    logger.info(f"Incoming Request: {request.method} {request.url.path}")
-    data = await request.body()
-    if data:
-        logger.debug(f"Request Body: {data}")
-    response = await call_next(request)
-    logger.info(f"Response Status: {response.status_code} for {request.method} {request.url.path}")
-    return response
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_latest()
+    return Response(body, headers={"Content-Type": content_type})
 
 
 @app.exception_handler(Exception)
@@ -76,6 +73,7 @@ async def catch_all_http_exceptions(request: Request, exc: HTTPException):
     return JSONResponse(
         exc.detail,
         status_code=exc.status_code,
+        headers=exc.headers,
     )
 
 
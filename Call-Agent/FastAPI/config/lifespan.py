@@ -0,0 +1,29 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from route.call_agent import voice_agent
+from route.webhook import twilio_pipeline
+from utils.http_client import close_http_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    voice_agent.monitor.start()
+    voice_agent.outbox.start(voice_agent.post_to_backend)
+    voice_agent.archive.start()
+    twilio_pipeline.start()
+    yield
+    await voice_agent.streams.stop()
+    await voice_agent.recordings.stop()
+    await voice_agent.dialer.stop()
+    await voice_agent.monitor.stop()
+    await twilio_pipeline.stop()
+    twilio_pipeline.store.close()
+    voice_agent.registry.close()
+    voice_agent.idempotency.store.close()
+    await voice_agent.archive.stop()
+    voice_agent.archive.close()
+    voice_agent.search.close()
+    await voice_agent.outbox.stop()
+    await close_http_client()
@@ -105,11 +105,110 @@ TWILIO_ACCOUNT_SID = config.get("TWILIO_ACCOUNT_SID", default=None)
 TWILIO_AUTH_TOKEN = config.get("TWILIO_AUTH_TOKEN", default=None)
 TWILIO_PHONE_NUMBER = config.get("TWILIO_PHONE_NUMBER", default=None)
 TWILIO_FLOW_SID = config.get("TWILIO_FLOW_SID", default=None)
+# Public URL of this service: callagent points Twilio's callbacks here, and
+# callback signatures are checked against it (set it when behind a proxy)
+TWILIO_CALLBACK_BASE_URL = config.get("TWILIO_CALLBACK_BASE_URL", default=None)
+# Call events from Twilio callbacks; calls whose transcription never arrives
+# are finalized this long after they end
+TWILIO_CALLS_PATH = config.get("TWILIO_CALLS_PATH", default="data/twilio_calls.sqlite3")
+TWILIO_TRANSCRIPTION_WAIT = config.get("TWILIO_TRANSCRIPTION_WAIT", cast=float, default=120.0)
 
 # ElevenLabs Configuration
 ELEVENLABS_API_KEY = config.get("ELEVENLABS_API_KEY", default=None)
 ELEVENLABS_AGENT_ID = config.get("ELEVENLABS_AGENT_ID", default=None)
 ELEVENLABS_PHONE_ID = config.get("ELEVENLABS_PHONE_ID", default=None)
+# Override to point at a local simulator (Call-Agent/simulator)
+ELEVENLABS_BASE_URL = config.get("ELEVENLABS_BASE_URL", default="https://api.elevenlabs.io/v1/convai")
+# Post-call webhook HMAC secret. When set, polling is only a slow fallback.
+ELEVENLABS_WEBHOOK_SECRET = config.get("ELEVENLABS_WEBHOOK_SECRET", default=None)
+ELEVENLABS_WEBHOOK_TOLERANCE = config.get("ELEVENLABS_WEBHOOK_TOLERANCE", cast=int, default=1800)
+# Per-endpoint circuit breakers: open when, of the last WINDOW_CALLS calls within the
+# WINDOW seconds, at least FAILURE_RATE fail or SLOW_RATE take longer than
+# SLOW_CALL_SECONDS; probe again after OPEN_SECONDS
+ELEVENLABS_BREAKER_WINDOW = config.get("ELEVENLABS_BREAKER_WINDOW", cast=float, default=30.0)
+ELEVENLABS_BREAKER_WINDOW_CALLS = config.get("ELEVENLABS_BREAKER_WINDOW_CALLS", cast=int, default=20)
+ELEVENLABS_BREAKER_MIN_CALLS = config.get("ELEVENLABS_BREAKER_MIN_CALLS", cast=int, default=10)
+ELEVENLABS_BREAKER_FAILURE_RATE = config.get("ELEVENLABS_BREAKER_FAILURE_RATE", cast=float, default=0.5)
+ELEVENLABS_BREAKER_SLOW_CALL_SECONDS = config.get("ELEVENLABS_BREAKER_SLOW_CALL_SECONDS", cast=float, default=5.0)
+ELEVENLABS_BREAKER_SLOW_RATE = config.get("ELEVENLABS_BREAKER_SLOW_RATE", cast=float, default=0.8)
+ELEVENLABS_BREAKER_OPEN_SECONDS = config.get("ELEVENLABS_BREAKER_OPEN_SECONDS", cast=float, default=15.0)
+ELEVENLABS_BREAKER_MAX_OPEN_SECONDS = config.get("ELEVENLABS_BREAKER_MAX_OPEN_SECONDS", cast=float, default=120.0)
+# Hedged conversation reads: resend a GET still unanswered after the recent p95 latency
+ELEVENLABS_HEDGE_GETS = config.get("ELEVENLABS_HEDGE_GETS", cast=bool, default=True)
+ELEVENLABS_HEDGE_MIN_DELAY = config.get("ELEVENLABS_HEDGE_MIN_DELAY", cast=float, default=0.05)
+ELEVENLABS_HEDGE_RATIO = config.get("ELEVENLABS_HEDGE_RATIO", cast=float, default=0.1)
+
+# Outbound HTTP (shared pooled client for ElevenLabs / backend calls)
+HTTP_CONNECT_TIMEOUT = config.get("HTTP_CONNECT_TIMEOUT", cast=float, default=5.0)
+HTTP_READ_TIMEOUT = config.get("HTTP_READ_TIMEOUT", cast=float, default=15.0)
+HTTP_POOL_MAX_CONNECTIONS = config.get("HTTP_POOL_MAX_CONNECTIONS", cast=int, default=200)
+HTTP_POOL_MAX_KEEPALIVE = config.get("HTTP_POOL_MAX_KEEPALIVE", cast=int, default=50)
+HTTP_KEEPALIVE_EXPIRY = config.get("HTTP_KEEPALIVE_EXPIRY", cast=float, default=30.0)
+
+# Call monitor scheduler (seconds)
+MONITOR_EXPECTED_CALL_DURATION = config.get("MONITOR_EXPECTED_CALL_DURATION", cast=float, default=120.0)
+MONITOR_MAX_WAIT = config.get("MONITOR_MAX_WAIT", cast=float, default=300.0)
+MONITOR_MIN_POLL_INTERVAL = config.get("MONITOR_MIN_POLL_INTERVAL", cast=float, default=5.0)
+MONITOR_MAX_POLL_INTERVAL = config.get("MONITOR_MAX_POLL_INTERVAL", cast=float, default=30.0)
+MONITOR_MAX_CONCURRENT_POLLS = config.get("MONITOR_MAX_CONCURRENT_POLLS", cast=int, default=50)
+MONITOR_WEBHOOK_FALLBACK_INTERVAL = config.get("MONITOR_WEBHOOK_FALLBACK_INTERVAL", cast=float, default=60.0)
+
+# Batch dialing admission control
+DIAL_MAX_QUEUED = config.get("DIAL_MAX_QUEUED", cast=int, default=10000)
+DIAL_MAX_CONCURRENT_PER_LINE = config.get("DIAL_MAX_CONCURRENT_PER_LINE", cast=int, default=10)
+
+# Transcript cache (finished calls are kept until the memory cap evicts them)
+TRANSCRIPT_CACHE_LIVE_TTL = config.get("TRANSCRIPT_CACHE_LIVE_TTL", cast=float, default=5.0)
+TRANSCRIPT_CACHE_MAX_BYTES = config.get("TRANSCRIPT_CACHE_MAX_MB", cast=int, default=64) * 1024 * 1024
+
+# Recording proxy (GET /api/agent/recording/{call_id}): on-disk LRU cache of call audio
+RECORDING_CACHE_DIR = config.get("RECORDING_CACHE_DIR", default="data/recordings")
+RECORDING_CACHE_MAX_BYTES = config.get("RECORDING_CACHE_MAX_MB", cast=int, default=2048) * 1024 * 1024
+
+# Transcript archive: append-only gzip'd JSONL chunks of finished calls with a SQLite index
+ARCHIVE_DIR = config.get("ARCHIVE_DIR", default="data/archive")
+ARCHIVE_CHUNK_RECORDS = config.get("ARCHIVE_CHUNK_RECORDS", cast=int, default=500)
+ARCHIVE_FLUSH_INTERVAL = config.get("ARCHIVE_FLUSH_INTERVAL", cast=float, default=5.0)
+ARCHIVE_SEGMENT_BYTES = config.get("ARCHIVE_SEGMENT_MB", cast=int, default=64) * 1024 * 1024
+
+# Transcript search (GET /api/agent/search): SQLite FTS5 index updated as calls finish
+SEARCH_INDEX_PATH = config.get("SEARCH_INDEX_PATH", default="data/search.sqlite3")
+SEARCH_MAX_LIMIT = config.get("SEARCH_MAX_LIMIT", cast=int, default=100)
+
+# Live transcript streams (SSE/WebSocket): upstream refresh and keepalive intervals
+TRANSCRIPT_STREAM_INTERVAL = config.get("TRANSCRIPT_STREAM_INTERVAL", cast=float, default=2.0)
+TRANSCRIPT_STREAM_HEARTBEAT = config.get("TRANSCRIPT_STREAM_HEARTBEAT", cast=float, default=15.0)
+
+# Outcome analysis keyword sets (defaults to config/outcome_keywords.json)
+OUTCOME_KEYWORDS_PATH = config.get("OUTCOME_KEYWORDS_PATH", default=None)
+
+# Bulk analysis (POST /api/agent/analyze/batch); 0 workers = CPU count for large batches
+ANALYZE_BATCH_MAX_TRANSCRIPTS = config.get("ANALYZE_BATCH_MAX_TRANSCRIPTS", cast=int, default=50000)
+ANALYZE_BATCH_WORKERS = config.get("ANALYZE_BATCH_WORKERS", cast=int, default=0)
+
+# Durable registry of monitored calls; unfinished calls are resumed on startup.
+# Workers sharing it lease calls and take over those whose lease lapses.
+CALL_REGISTRY_PATH = config.get("CALL_REGISTRY_PATH", default="data/calls.sqlite3")
+MONITOR_LEASE_SECONDS = config.get("MONITOR_LEASE_SECONDS", cast=float, default=30.0)
+MONITOR_MAX_CALLS = config.get("MONITOR_MAX_CALLS", cast=int, default=5000)
+MONITOR_CLAIM_BATCH = config.get("MONITOR_CLAIM_BATCH", cast=int, default=100)
+
+# Dial deduplication (Idempotency-Key header, or campaignId + contactId from the
+# call context). Keys are shared by workers through the SQLite file.
+IDEMPOTENCY_PATH = config.get("IDEMPOTENCY_PATH", default="data/idempotency.sqlite3")
+IDEMPOTENCY_TTL = config.get("IDEMPOTENCY_TTL", cast=float, default=86400.0)
+IDEMPOTENCY_LEAD_TTL = config.get("IDEMPOTENCY_LEAD_TTL", cast=float, default=600.0)
+IDEMPOTENCY_MAX_KEYS = config.get("IDEMPOTENCY_MAX_KEYS", cast=int, default=100000)
+IDEMPOTENCY_WAIT = config.get("IDEMPOTENCY_WAIT", cast=float, default=30.0)
+
+# Backend outcome webhook outbox (SQLite spool, retried with backoff)
+BACKEND_URL = config.get("BACKEND_URL", default="http://localhost:4004")
+OUTBOX_PATH = config.get("OUTBOX_PATH", default="data/outbox.sqlite3")
+OUTBOX_BATCH_PATH = config.get("OUTBOX_BATCH_PATH", default=None)
+OUTBOX_BATCH_SIZE = config.get("OUTBOX_BATCH_SIZE", cast=int, default=50)
+OUTBOX_RETRY_BASE = config.get("OUTBOX_RETRY_BASE", cast=float, default=1.0)
+OUTBOX_RETRY_MAX = config.get("OUTBOX_RETRY_MAX", cast=float, default=300.0)
+OUTBOX_MAX_ATTEMPTS = config.get("OUTBOX_MAX_ATTEMPTS", cast=int, default=20)
 
 # Cal.com Configuration
 CALCOM_API_KEY = config.get("CALCOM_API_KEY", default=None)
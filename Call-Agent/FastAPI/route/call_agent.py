@@ -1,38 +1,324 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from pydantic import BaseModel
-from typing import Dict, Optional
+import time
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 # from backend.agents.elevenlabs_agent import ElevenLabsAgent
 from agents.elevenlabs_agent import ElevenLabsAgent
+from config.main import (
+    ANALYZE_BATCH_MAX_TRANSCRIPTS,
+    ANALYZE_BATCH_WORKERS,
+    OUTCOME_KEYWORDS_PATH,
+    SEARCH_MAX_LIMIT,
+    TRANSCRIPT_STREAM_HEARTBEAT,
+)
+from services.dial_queue import QueueFull
+from services.idempotency import IdempotencyConflict, IdempotencyInProgress, fingerprint, lead_key
+from services.recording_cache import RecordingNotFound, RecordingUnavailable
+from services.transcript_search import SORTS, SPEAKERS, InvalidQuery
+from utils.circuit_breaker import CircuitOpen
+from utils.fast_json import FastJSONResponse, dumps
+from utils.outcome_batch import classify_batch
+from utils.range_response import RangeFileResponse
 
 router = APIRouter()
 voice_agent = ElevenLabsAgent()
 
+TRANSCRIPT_FIELDS = ("call_id", "status", "transcript", "has_recording", "recording_url", "raw_data")
+DEFAULT_TRANSCRIPT_FIELDS = ("call_id", "status", "transcript", "has_recording", "recording_url")
+
 class CallRequest(BaseModel):
     phone: str
     name: str
     company: str
     context: Optional[Dict] = {}
 
+class BatchLead(CallRequest):
+    priority: int = 0
+
+class BatchCallRequest(BaseModel):
+    leads: List[BatchLead] = Field(..., min_length=1)
+    agent_id: Optional[str] = None
+    phone_id: Optional[str] = None
+
 class AnalyzeRequest(BaseModel):
     transcript: str
 
-@router.post("/call")
-async def make_call(request: CallRequest, background_tasks: BackgroundTasks):
+class BatchAnalyzeRequest(BaseModel):
+    transcripts: List[str] = Field(..., min_length=1)
+
+DAY_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+class ArchiveFilter(BaseModel):
+    campaign_id: Optional[str] = None
+    since: Optional[str] = Field(None, pattern=DAY_PATTERN)
+    until: Optional[str] = Field(None, pattern=DAY_PATTERN)
+    outcome: Optional[str] = None
+
+async def run_idempotent(key: Optional[str], body: Optional[Dict], response: Response, handler) -> Dict:
+    """
+    Run ``handler`` once per key; repeats get the stored result and an
+    Idempotent-Replayed header. Repeats must carry the same ``body``, unless
+    it is None (derived keys, which dedupe on the lead alone).
+    """
+    if key is None:
+        return await handler()
     try:
-        result = voice_agent.make_call(request.phone, request.name, request.company)
-        if result.get("success") and result.get("call_id"):
-             background_tasks.add_task(voice_agent.monitor_call_and_report, result['call_id'], request.context)
+        result, replayed = await voice_agent.idempotency.run(key, fingerprint(body) if body is not None else None, handler)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail={"success": False, "message": str(e)})
+    except IdempotencyInProgress as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"success": False, "message": str(e), "retry_after": e.retry_after},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def queued_call_response(result: Dict) -> Dict:
+    """
+    A lead's stored result in the shape /call returns. Leads queued through
+    /calls/batch share the lead key but record a dial_id: their call_id is
+    null until the queue dials them.
+    """
+    if "dial_id" not in result:
         return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    job = voice_agent.dialer.get(result["dial_id"])
+    call_id = result.get("call_id") or (job.call_id if job is not None else None)
+    if call_id:
+        status = "initiated"
+    else:
+        status = job.status if job is not None else result.get("status", "queued")
+    return {"success": True, "call_id": call_id, "status": status, "dial_id": result["dial_id"]}
+
+@router.post("/call")
+async def make_call(
+    request: CallRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    async def dial():
+        try:
+            result = await voice_agent.make_call(request.phone, request.name, request.company)
+            if result.get("success") and result.get("call_id"):
+                 voice_agent.dialer.track_call(result['call_id'], voice_agent.line())
+                 voice_agent.monitor_call_and_report(result['call_id'], request.context)
+            return result
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    if idempotency_key:
+        return await run_idempotent(f"call:{idempotency_key}", request.model_dump(), response, dial)
+    # Without a key, a retried dial for the same campaign lead is still caught, whatever else changed
+    result = await run_idempotent(lead_key(request.phone, request.context), None, response, dial)
+    return queued_call_response(result)
+
+@router.post("/calls/batch", status_code=202)
+async def make_calls_batch(
+    request: BatchCallRequest,
+    http_request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    async def submit():
+        line = voice_agent.line(request.agent_id, request.phone_id)
+        try:
+            jobs, duplicates = await voice_agent.queue_leads([lead.model_dump() for lead in request.leads], line)
+        except QueueFull as e:
+            raise HTTPException(
+                status_code=429,
+                detail={"success": False, "message": str(e), "retry_after": e.retry_after},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        # Status handles live next to the queue stats route: .../calls/queue/{dial_id}
+        queue_url = str(http_request.url_for("dial_queue_stats")).rsplit("/", 1)[0]
+        fresh = iter(jobs)
+        calls = []
+        for index, lead in enumerate(request.leads):
+            if index in duplicates:
+                original = duplicates[index]
+                dial_id = original.get("dial_id")
+                calls.append({
+                    "dial_id": dial_id,
+                    "call_id": original.get("call_id"),
+                    "phone": lead.phone,
+                    "status": "duplicate",
+                    "status_url": f"{queue_url}/{dial_id}" if dial_id else None,
+                })
+                continue
+            job = next(fresh)
+            calls.append({
+                "dial_id": job.dial_id,
+                "phone": job.phone,
+                "status": job.status,
+                "status_url": f"{queue_url}/{job.dial_id}",
+            })
+        return {"success": True, "accepted": len(jobs), "duplicates": len(duplicates), "calls": calls}
+
+    key = f"batch:{idempotency_key}" if idempotency_key else None
+    return await run_idempotent(key, request.model_dump(), response, submit)
+
+@router.get("/upstream/stats")
+async def upstream_stats():
+    return {name: endpoint.stats() for name, endpoint in voice_agent.endpoints.items()}
+
+@router.get("/idempotency/stats")
+async def idempotency_stats():
+    return await run_in_threadpool(voice_agent.idempotency.stats)
+
+@router.get("/calls/queue/stats")
+async def dial_queue_stats():
+    return voice_agent.dialer.stats()
+
+@router.get("/calls/{call_id}")
+async def get_call(call_id: str):
+    record = await run_in_threadpool(voice_agent.registry.get, call_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail={"success": False, "message": "Unknown call_id"})
+    return {**record.to_dict(), "monitored": voice_agent.monitor.is_watching(call_id)}
+
+@router.get("/calls/queue/{dial_id}")
+async def get_queued_call(dial_id: str):
+    job = voice_agent.dialer.get(dial_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"success": False, "message": "Unknown dial_id"})
+    return job.to_dict()
+
+def project_transcript(details: Dict, fields: Optional[str], include_raw: bool) -> Dict:
+    """Select the requested transcript fields; raw upstream data only on request"""
+    if fields:
+        wanted = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in wanted if field not in TRANSCRIPT_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail={"success": False, "message": f"Unknown field(s): {', '.join(unknown)}"},
+            )
+    else:
+        wanted = DEFAULT_TRANSCRIPT_FIELDS
+    if include_raw and "raw_data" not in wanted:
+        wanted = [*wanted, "raw_data"]
+    return {field: details[field] for field in wanted if field in details}
 
 @router.get("/transcript/{call_id}")
-async def get_transcript(call_id: str):
+async def get_transcript(
+    call_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    include_raw: bool = Query(False, description="Include the raw ElevenLabs payload"),
+):
     try:
-        result = voice_agent.get_transcript(call_id)
-        return result
+        entry = await voice_agent.transcripts.get(call_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not entry.ok:
+        return entry.details
+    body = project_transcript(entry.details, fields, include_raw)
+    variant = ",".join(body)
+    headers = entry.headers(variant)
+    if entry.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since"), variant):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(body, headers=headers)
+
+@router.api_route("/recording/{call_id}", methods=["GET", "HEAD"])
+async def get_recording(call_id: str, request: Request):
+    """
+    Call audio, proxied through an on-disk cache. Cached recordings support
+    Range requests (seeking); a first plain GET streams while downloading.
+    """
+    cache = voice_agent.recordings
+    entry = cache.get(call_id)
+    status = "HIT"
+    if entry is None:
+        status = "MISS"
+        try:
+            download = await cache.download(call_id)
+            if request.method == "GET" and "range" not in request.headers:
+                headers = {"Accept-Ranges": "bytes", "X-Cache": status}
+                if download.size is not None:
+                    headers["Content-Length"] = str(download.size)
+                return StreamingResponse(
+                    download.stream(cache.chunk_size), media_type=download.media_type, headers=headers
+                )
+            # Ranges are served from the complete file
+            entry = await download.wait()
+        except RecordingNotFound:
+            raise HTTPException(status_code=404, detail={"success": False, "message": "No recording for this call yet"})
+        except RecordingUnavailable as e:
+            raise HTTPException(status_code=502, detail={"success": False, "message": str(e), "upstream_status": e.status_code})
+        except CircuitOpen as e:
+            raise HTTPException(
+                status_code=503,
+                detail={"success": False, "message": str(e), "retry_after": e.retry_after},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        if entry is None:
+            raise HTTPException(
+                status_code=413,
+                detail={"success": False, "message": "Recording exceeds the cache size; request it without a Range"},
+            )
+    return RangeFileResponse(
+        entry.path,
+        request.headers,
+        entry.media_type,
+        entry.etag,
+        method=request.method,
+        headers={"X-Cache": status, "Cache-Control": "private, max-age=86400"},
+    )
+
+@router.get("/recordings/stats")
+async def recording_cache_stats():
+    return voice_agent.recordings.stats()
+
+@router.get("/transcript/{call_id}/stream")
+async def stream_transcript(
+    call_id: str,
+    request: Request,
+    since: int = Query(0, ge=0, description="Skip this many turns (defaults to Last-Event-ID)"),
+):
+    """Server-Sent Events: status changes and new turns until the call ends"""
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = max(since, int(last_event_id))
+
+    async def events():
+        async for event in voice_agent.streams.subscribe(call_id, since, TRANSCRIPT_STREAM_HEARTBEAT):
+            yield event.sse()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/transcript/{call_id}/stream")
+async def stream_transcript_ws(websocket: WebSocket, call_id: str, since: int = 0):
+    """WebSocket flavour of the transcript stream: one JSON message per event"""
+    await websocket.accept()
+    events = voice_agent.streams.subscribe(call_id, max(0, since), TRANSCRIPT_STREAM_HEARTBEAT)
+    try:
+        async for event in events:
+            await websocket.send_json(event.to_dict())
+        await websocket.close()
+    except Exception as e:
+        # The client went away; depending on the server this surfaces as
+        # WebSocketDisconnect or the websocket library's ConnectionClosed
+        logger.debug(f"Transcript stream for {call_id} closed by client: {e!r}")
+    finally:
+        # Leave the stream now, not when the generator is garbage collected
+        await events.aclose()
+
+@router.get("/transcripts/stream/stats")
+async def transcript_stream_stats():
+    return voice_agent.streams.stats()
+
+@router.get("/transcripts/cache/stats")
+async def transcript_cache_stats():
+    return voice_agent.transcripts.stats()
 
 @router.post("/analyze")
 async def analyze_call(request: AnalyzeRequest):
@@ -41,3 +327,99 @@ async def analyze_call(request: AnalyzeRequest):
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analyze/batch")
+async def analyze_calls(request: BatchAnalyzeRequest):
+    if len(request.transcripts) > ANALYZE_BATCH_MAX_TRANSCRIPTS:
+        raise HTTPException(
+            status_code=413,
+            detail={"success": False, "message": f"At most {ANALYZE_BATCH_MAX_TRANSCRIPTS} transcripts per request"},
+        )
+    try:
+        # Scoring is CPU-bound; keep it off the event loop
+        results = await run_in_threadpool(
+            classify_batch, request.transcripts, OUTCOME_KEYWORDS_PATH, ANALYZE_BATCH_WORKERS or None
+        )
+        return FastJSONResponse({"success": True, "count": len(results), "results": results})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search")
+async def search_transcripts(
+    q: str = Query(..., min_length=1, description='Words, "quoted phrases", AND/OR/NOT, prefix*'),
+    campaign_id: Optional[str] = None,
+    outcome: Optional[str] = None,
+    since: Optional[str] = Query(None, pattern=DAY_PATTERN, description="First day (YYYY-MM-DD, UTC)"),
+    until: Optional[str] = Query(None, pattern=DAY_PATTERN, description="Last day (YYYY-MM-DD, UTC)"),
+    speaker: Optional[str] = Query(None, pattern=f"^({'|'.join(SPEAKERS)})$", description="Only what this side said"),
+    sort: str = Query("recent", pattern=f"^({'|'.join(SORTS)})$"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    cursor: Optional[int] = Query(None, ge=0, description="next_cursor of the previous page"),
+):
+    try:
+        page = await run_in_threadpool(
+            voice_agent.search.search,
+            q, campaign_id=campaign_id, outcome=outcome, since=since, until=until,
+            speaker=speaker, sort=sort, limit=limit, cursor=cursor,
+        )
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail={"success": False, "message": str(e)})
+    return FastJSONResponse({"success": True, **page})
+
+@router.post("/search/reindex")
+async def reindex_transcripts(request: ArchiveFilter):
+    """Rebuild search entries from the transcript archive"""
+    start = time.perf_counter()
+    await run_in_threadpool(voice_agent.archive.flush)
+    records = voice_agent.archive.iter_records(**request.model_dump())
+    count = await run_in_threadpool(voice_agent.search.add_many, records)
+    return {"success": True, "indexed": count, "seconds": round(time.perf_counter() - start, 3)}
+
+@router.get("/search/stats")
+async def search_stats():
+    return await run_in_threadpool(voice_agent.search.stats)
+
+@router.get("/archive/stats")
+async def archive_stats():
+    return await run_in_threadpool(voice_agent.archive.stats)
+
+@router.get("/archive/export")
+async def export_archive(
+    campaign_id: Optional[str] = None,
+    since: Optional[str] = Query(None, pattern=DAY_PATTERN, description="First day (YYYY-MM-DD, UTC)"),
+    until: Optional[str] = Query(None, pattern=DAY_PATTERN, description="Last day (YYYY-MM-DD, UTC)"),
+    outcome: Optional[str] = None,
+):
+    """Archived calls as NDJSON, streamed chunk by chunk"""
+    records = voice_agent.archive.iter_records(campaign_id=campaign_id, since=since, until=until, outcome=outcome)
+    # A sync iterator: Starlette pulls it from the threadpool, off the event loop
+    return StreamingResponse((dumps(record) + b"\n" for record in records), media_type="application/x-ndjson")
+
+@router.post("/archive/reanalyze")
+async def reanalyze_archive(request: ArchiveFilter):
+    """Re-score archived transcripts with the current keywords, without calling upstream"""
+    try:
+        result = await run_in_threadpool(
+            voice_agent.archive.reanalyze,
+            OUTCOME_KEYWORDS_PATH,
+            ANALYZE_BATCH_WORKERS or None,
+            **request.model_dump(),
+        )
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/archive/{call_id}")
+async def get_archived_call(call_id: str):
+    record = await run_in_threadpool(voice_agent.archive.get, call_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail={"success": False, "message": "Call not archived"})
+    return FastJSONResponse(record)
+
+@router.get("/monitor/stats")
+async def monitor_stats():
+    return voice_agent.monitor.stats()
+
+@router.get("/outbox/stats")
+async def outbox_stats():
+    return voice_agent.outbox.stats()
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
 from route.call_agent import router as call_agent_router
+from route.webhook import router as webhook_router
 
 router = APIRouter()
 
-router.include_router(prefix="/agent", router=call_agent_router)
\ No newline at end of file
+router.include_router(prefix="/agent", router=call_agent_router)
+router.include_router(prefix="/webhooks", router=webhook_router)
\ No newline at end of file
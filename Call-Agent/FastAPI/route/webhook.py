@@ -0,0 +1,154 @@
+import json
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl
+
+from fastapi import APIRouter, HTTPException, Query, Request, BackgroundTasks
+from loguru import logger
+
+from config.main import (
+    ELEVENLABS_WEBHOOK_SECRET,
+    ELEVENLABS_WEBHOOK_TOLERANCE,
+    TWILIO_AUTH_TOKEN,
+    TWILIO_CALLBACK_BASE_URL,
+    TWILIO_CALLS_PATH,
+    TWILIO_TRANSCRIPTION_WAIT,
+)
+from route.call_agent import voice_agent
+from services.twilio_pipeline import TwilioCall, TwilioCallStore, TwilioPipeline
+from utils.metrics import INBOUND_WEBHOOKS
+from utils.webhook_signature import verify_elevenlabs_signature, verify_twilio_signature
+
+router = APIRouter()
+
+# Post-call events that mean the conversation is over
+CONVERSATION_ENDED_EVENTS = ("post_call_transcription", "call_initiation_failure")
+
+# Call context callagent adds to the Twilio callback URLs
+TWILIO_CONTEXT_PARAMS = ("campaignId", "contactId", "userId")
+
+
+async def report_twilio_call(call: TwilioCall, picked: bool):
+    """Deliver a finalized Twilio call like a monitored ElevenLabs call"""
+    context = call.context
+    await voice_agent.send_signal_to_backend({
+        "call_id": call.call_sid,
+        "contact_id": context.get("contactId", 0),
+        "campaign_id": context.get("campaignId", 0),
+        "user_id": context.get("userId"),
+        "transcript": call.transcript or "",
+        "outcome": call.analysis["outcome"],
+        "picked": picked,
+    })
+    details = {"status": call.call_status, "transcript": call.transcript or ""}
+    await voice_agent.archive_call(call.call_sid, context, details, call.analysis, picked)
+
+
+twilio_pipeline = TwilioPipeline(
+    TwilioCallStore(TWILIO_CALLS_PATH),
+    analyze=voice_agent.analyze_outcome,
+    report=report_twilio_call,
+    transcription_wait=TWILIO_TRANSCRIPTION_WAIT,
+)
+
+
+@router.post("/elevenlabs")
+async def elevenlabs_webhook(request: Request, background_tasks: BackgroundTasks):
+    if not ELEVENLABS_WEBHOOK_SECRET:
+        raise HTTPException(
+            status_code=503,
+            detail={"success": False, "message": "Webhook secret not configured"},
+        )
+
+    payload = await request.body()
+    signature = request.headers.get("elevenlabs-signature")
+    if not verify_elevenlabs_signature(
+        payload, signature, ELEVENLABS_WEBHOOK_SECRET, ELEVENLABS_WEBHOOK_TOLERANCE
+    ):
+        logger.warning("Rejected ElevenLabs webhook with invalid signature")
+        INBOUND_WEBHOOKS.labels("elevenlabs", "invalid_signature").inc()
+        raise HTTPException(status_code=401, detail={"success": False, "message": "Invalid signature"})
+
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        INBOUND_WEBHOOKS.labels("elevenlabs", "invalid_json").inc()
+        raise HTTPException(status_code=400, detail={"success": False, "message": "Invalid JSON"})
+
+    event_type = event.get("type")
+    data = event.get("data") or {}
+    call_id = data.get("conversation_id")
+    if event_type not in CONVERSATION_ENDED_EVENTS or not call_id:
+        logger.debug(f"Ignoring ElevenLabs webhook event {event_type}")
+        INBOUND_WEBHOOKS.labels("elevenlabs", "ignored").inc()
+        return {"success": True, "handled": False}
+
+    if event_type == "call_initiation_failure":
+        data = {**data, "status": "failed"}
+
+    logger.info(f"ElevenLabs webhook {event_type} for call {call_id}")
+    INBOUND_WEBHOOKS.labels("elevenlabs", "accepted").inc()
+    # Acknowledge immediately; analysis and backend reporting run after the response
+    background_tasks.add_task(voice_agent.handle_conversation_ended, call_id, data)
+    return {"success": True, "handled": True}
+
+
+async def twilio_event(request: Request, kind: str) -> Tuple[Dict[str, str], Dict]:
+    """Authenticate a Twilio callback; returns its form parameters and the call context"""
+    if not TWILIO_AUTH_TOKEN:
+        raise HTTPException(
+            status_code=503,
+            detail={"success": False, "message": "Twilio auth token not configured"},
+        )
+    params = dict(parse_qsl((await request.body()).decode(), keep_blank_values=True))
+    url = str(request.url)
+    if TWILIO_CALLBACK_BASE_URL:
+        # Twilio signs the public URL it called, not the one we see behind a proxy
+        url = TWILIO_CALLBACK_BASE_URL.rstrip("/") + request.url.path
+        if request.url.query:
+            url += "?" + request.url.query
+    if not verify_twilio_signature(url, params, request.headers.get("x-twilio-signature"), TWILIO_AUTH_TOKEN):
+        logger.warning(f"Rejected Twilio {kind} callback with invalid signature")
+        INBOUND_WEBHOOKS.labels("twilio", "invalid_signature").inc()
+        raise HTTPException(status_code=401, detail={"success": False, "message": "Invalid signature"})
+    if not params.get("CallSid"):
+        INBOUND_WEBHOOKS.labels("twilio", "ignored").inc()
+        raise HTTPException(status_code=400, detail={"success": False, "message": "Missing CallSid"})
+
+    INBOUND_WEBHOOKS.labels("twilio", "accepted").inc()
+    context = {key: request.query_params[key] for key in TWILIO_CONTEXT_PARAMS if key in request.query_params}
+    return params, context
+
+
+@router.post("/twilio/call-status")
+async def twilio_call_status(request: Request):
+    params, context = await twilio_event(request, "call-status")
+    call = await twilio_pipeline.on_call_status(params, context)
+    return {"success": True, "state": call.state}
+
+
+@router.post("/twilio/recording-status")
+async def twilio_recording_status(request: Request):
+    params, context = await twilio_event(request, "recording-status")
+    call = await twilio_pipeline.on_recording_status(params, context)
+    return {"success": True, "state": call.state}
+
+
+@router.post("/twilio/transcription")
+async def twilio_transcription(request: Request):
+    params, context = await twilio_event(request, "transcription")
+    call = await twilio_pipeline.on_transcription(params, context)
+    return {"success": True, "state": call.state}
+
+
+@router.get("/twilio/calls/{call_sid}")
+async def get_twilio_call(call_sid: str, wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the outcome")):
+    """A Twilio call as its callbacks left it; with ``wait``, long-polls until it is reported"""
+    call = await twilio_pipeline.wait(call_sid, wait)
+    if call is None:
+        raise HTTPException(status_code=404, detail={"success": False, "message": "No events for this call"})
+    return {"success": True, **call.to_dict()}
+
+
+@router.get("/twilio/stats")
+async def twilio_stats():
+    return await twilio_pipeline.stats()
@@ -0,0 +1,420 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from services.call_registry import CallRegistry
+from utils.metrics import CALL_POLLS, CALLS_FINALIZED, MONITORED_CALLS, POLLS_PER_CALL
+
+
+@dataclass
+class MonitoredCall:
+    """A conversation being watched until it reaches a terminal state"""
+    call_id: str
+    context: Dict
+    started_at: float
+    next_poll_at: float
+    polls: int = 0
+    last_status: Optional[str] = None
+    last_details: Optional[Dict] = field(default=None, repr=False)
+    # Registry insert of a newly watched call, awaited before any later write
+    registered: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class CallMonitor:
+    """
+    Single in-process scheduler for in-flight call monitoring.
+
+    Every watched conversation sits in one heap keyed by its next poll time and
+    a single loop task sleeps until the earliest one is due, so thousands of
+    calls share the event loop instead of each holding a sleeping thread.
+
+    Poll intervals adapt to how far into the call we are: rarely early on and
+    down to ``min_interval`` as the expected end approaches. Calls that have
+    not finished after ``max_wait`` seconds are finalized with whatever was
+    last fetched.
+
+    When conversations also report completion via webhook, pass
+    ``fallback_interval``: polling then only starts around the expected end
+    and repeats at that slow interval, as a safety net for lost webhooks.
+
+    With a ``registry``, every watched call and its poll schedule is persisted
+    and leased to this worker. A background task renews those leases, claims
+    calls nobody holds and gives back calls above this worker's fair share of
+    the live workers, ``claim_batch`` at a time and never past ``max_calls``.
+    Calls left by a previous process or a dead worker are taken over, and
+    monitoring evens out across every worker sharing the registry. A call
+    whose lease was lost is dropped here without reporting.
+    ``on_finished`` may return a result dict, stored with the finalized call.
+    ``on_dropped`` is awaited with the id of every call that leaves this
+    worker unreported (shed, or lost to another worker).
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Dict]],
+        on_finished: Callable[[str, Dict, Optional[Dict]], Awaitable[Optional[Dict]]],
+        terminal_statuses: Iterable[str],
+        expected_duration: float = 120.0,
+        max_wait: float = 300.0,
+        min_interval: float = 5.0,
+        max_interval: float = 30.0,
+        max_concurrent_polls: int = 50,
+        fallback_interval: Optional[float] = None,
+        registry: Optional[CallRegistry] = None,
+        max_calls: int = 5000,
+        claim_batch: int = 100,
+        on_dropped: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        self.fetch = fetch
+        self.on_finished = on_finished
+        self.terminal_statuses = set(terminal_statuses)
+        self.expected_duration = expected_duration
+        self.max_wait = max_wait
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_concurrent_polls = max_concurrent_polls
+        self.fallback_interval = fallback_interval
+        self.registry = registry
+        self.max_calls = max_calls
+        self.claim_batch = claim_batch
+        self.on_dropped = on_dropped
+
+        self._calls: Dict[str, MonitoredCall] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        # Recently finished ids, so a late webhook does not report a call twice
+        self._finished_ids: "OrderedDict[str, None]" = OrderedDict()
+
+        self._polls_total = 0
+        self._finished_total = 0
+        self._timed_out_total = 0
+        self._claimed_total = 0
+        self._lost_total = 0
+        self._shed_total = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._avg_lag = 0.0
+
+    def start(self):
+        """Start the scheduler loop on the running event loop (idempotent)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent_polls)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self.registry is not None:
+            self._lease_task = asyncio.get_running_loop().create_task(self._lease_loop())
+        MONITORED_CALLS.set_function(lambda: len(self._calls))
+        logger.info("Call monitor started")
+
+    async def stop(self):
+        """
+        Stop polling. Calls still being watched are dropped from memory; with a
+        registry their leases are released so other workers (or the next
+        start) take them over right away.
+        """
+        tasks = list(self._in_flight)
+        for task in (self._task, self._lease_task):
+            if task is not None:
+                tasks.append(task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._lease_task = None
+        if self._calls and self.registry is not None:
+            pending = [call.registered for call in self._calls.values() if call.registered is not None]
+            await asyncio.gather(*pending, return_exceptions=True)
+            released = await self._persist(self.registry.release, default=0)
+            logger.info(f"Released {released} call lease(s) for other workers")
+            self._calls.clear()
+        elif self._calls:
+            logger.warning(f"Call monitor stopped with {len(self._calls)} call(s) still in flight")
+        logger.info("Call monitor stopped")
+
+    def watch(self, call_id: str, context: Optional[Dict] = None):
+        """Start monitoring a call. The first poll is scheduled adaptively."""
+        self.start()
+        if call_id in self._calls:
+            return
+        now = self._now()
+        call = MonitoredCall(
+            call_id=call_id,
+            context=context or {},
+            started_at=now,
+            next_poll_at=now + self.next_interval(0.0),
+        )
+        self._calls[call_id] = call
+        self._push(call)
+        if self.registry is not None:
+            call.registered = asyncio.get_running_loop().create_task(
+                self._persist(self.registry.add, call_id, call.context, time.time(), self._wall(call.next_poll_at))
+            )
+        logger.info(f"Monitoring call {call_id} (first poll in {call.next_poll_at - now:.1f}s)")
+
+    async def sync_leases(self) -> int:
+        """
+        Renew this worker's leases, then move it towards its fair share of
+        the active calls: shed the excess or claim unowned calls. Claimed
+        calls keep their original start time (for the max wait) and poll
+        count; polls that fell due while nobody held them run right away.
+        Returns the number of calls claimed.
+        """
+        if self.registry is None:
+            return 0
+        workers = await self._persist(self.registry.heartbeat, default=1) or 1
+        await self._persist(self.registry.renew)
+        counts = await self._persist(self.registry.counts, default=None)
+        if counts is None:
+            return 0
+        share = min(self.max_calls, math.ceil(counts["active"] / workers))
+        excess = len(self._calls) - share
+        # Some slack so calls are not passed back and forth around the share
+        if excess > max(1, share // 10):
+            for call_id in await self._persist(self.registry.shed, min(excess, self.claim_batch), default=[]):
+                if self._calls.pop(call_id, None) is not None:
+                    self._shed_total += 1
+                    await self._dropped(call_id)
+            return 0
+        room = min(self.claim_batch, share - len(self._calls))
+        if room <= 0 or not counts["unowned"]:
+            return 0
+        now, wall = self._now(), time.time()
+        claimed = 0
+        for record in await self._persist(self.registry.claim, room, default=[]):
+            if record.call_id in self._calls:
+                continue
+            due_in = max(0.0, (record.next_poll_at or wall) - wall)
+            call = MonitoredCall(
+                call_id=record.call_id,
+                context=record.context,
+                started_at=now - (wall - record.started_at),
+                next_poll_at=now + due_in,
+                polls=record.polls,
+                last_status=record.status,
+            )
+            self._calls[call.call_id] = call
+            self._push(call)
+            claimed += 1
+        if claimed:
+            self._claimed_total += claimed
+            logger.info(f"Claimed {claimed} unowned call(s) from the registry")
+        return claimed
+
+    def is_watching(self, call_id: str) -> bool:
+        return call_id in self._calls
+
+    def is_finished(self, call_id: str) -> bool:
+        return call_id in self._finished_ids
+
+    async def complete(self, call_id: str, details: Dict) -> bool:
+        """
+        Finalize a watched call immediately with externally supplied details
+        (e.g. from a webhook). Returns False if the call is not being watched.
+        """
+        call = self._calls.get(call_id)
+        if call is None:
+            return False
+        call.last_details = details
+        call.last_status = details.get("status")
+        await self._finish(call, "webhook")
+        return True
+
+    def next_interval(self, elapsed: float) -> float:
+        """
+        Seconds until the next poll for a call that started ``elapsed`` seconds ago.
+
+        Half of the time remaining until the expected end, clamped to
+        [min_interval, max_interval], so polling tightens as the call is likely
+        to be wrapping up and stays at ``min_interval`` once it overruns.
+        In fallback mode the first poll waits for the expected end and later
+        ones are ``fallback_interval`` apart.
+        """
+        remaining = self.expected_duration - elapsed
+        if self.fallback_interval:
+            interval = max(self.fallback_interval, remaining)
+        else:
+            interval = min(self.max_interval, max(self.min_interval, remaining / 2))
+        # Never sleep past the max wait deadline
+        return max(0.0, min(interval, self.max_wait - elapsed))
+
+    def stats(self) -> Dict:
+        now = self._now()
+        due = sum(1 for call in self._calls.values() if call.next_poll_at <= now)
+        return {
+            "queue_depth": len(self._calls),
+            "due": due,
+            "polls_in_flight": len(self._in_flight),
+            "polls_total": self._polls_total,
+            "finished_total": self._finished_total,
+            "timed_out_total": self._timed_out_total,
+            "claimed_total": self._claimed_total,
+            "lost_total": self._lost_total,
+            "shed_total": self._shed_total,
+            "owner": self.registry.owner if self.registry is not None else None,
+            "poll_lag_seconds": {
+                "last": round(self._last_lag, 4),
+                "avg": round(self._avg_lag, 4),
+                "max": round(self._max_lag, 4),
+            },
+        }
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _wall(self, loop_time: float) -> float:
+        """Unix time of a loop-clock deadline, for the registry"""
+        return time.time() + (loop_time - self._now())
+
+    async def _persist(self, write: Callable, *args, default=None):
+        # In a thread, so a write waiting on another worker's lock never stalls the loop.
+        # A registry failure must not stop the call from being monitored.
+        try:
+            return await asyncio.to_thread(write, *args)
+        except Exception as e:
+            logger.error(f"Call registry write failed: {e}")
+            return default
+
+    async def _registered(self, call: MonitoredCall):
+        if call.registered is not None:
+            await asyncio.shield(call.registered)
+
+    async def _lease_loop(self):
+        # Renew well within the lease so a slow cycle never lets it lapse
+        while True:
+            await self.sync_leases()
+            await asyncio.sleep(self.registry.lease / 3)
+
+    async def _drop(self, call: MonitoredCall):
+        """Forget a call another worker now holds or has already finalized"""
+        if self._calls.pop(call.call_id, None) is not None:
+            await self._lost(call.call_id)
+
+    async def _lost(self, call_id: str):
+        self._lost_total += 1
+        logger.info(f"Call {call_id} is no longer held by this worker, dropping it")
+        await self._dropped(call_id)
+
+    async def _dropped(self, call_id: str):
+        if self.on_dropped is None:
+            return
+        try:
+            await self.on_dropped(call_id)
+        except Exception as e:
+            logger.error(f"Error handing off dropped call {call_id}: {e}")
+
+    def _push(self, call: MonitoredCall):
+        heapq.heappush(self._heap, (call.next_poll_at, next(self._seq), call.call_id))
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _sleep_until(self, deadline: Optional[float]):
+        self._wake.clear()
+        timeout = None if deadline is None else max(0.0, deadline - self._now())
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                await self._sleep_until(None)
+                continue
+
+            due_at, _, call_id = self._heap[0]
+            if due_at > self._now():
+                await self._sleep_until(due_at)
+                continue
+
+            heapq.heappop(self._heap)
+            call = self._calls.get(call_id)
+            if call is None or call.next_poll_at != due_at:
+                continue  # finished or rescheduled since this entry was pushed
+
+            # Backpressure: wait for a free poll slot before dispatching
+            await self._slots.acquire()
+            self._record_lag(self._now() - due_at)
+            task = asyncio.get_running_loop().create_task(self._poll(call))
+            self._in_flight.add(task)
+            task.add_done_callback(self._poll_done)
+
+    def _poll_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    def _record_lag(self, lag: float):
+        self._last_lag = lag
+        self._max_lag = max(self._max_lag, lag)
+        self._avg_lag = lag if self._polls_total == 0 else 0.9 * self._avg_lag + 0.1 * lag
+
+    async def _poll(self, call: MonitoredCall):
+        self._polls_total += 1
+        call.polls += 1
+        CALL_POLLS.inc()
+        try:
+            details = await self.fetch(call.call_id)
+        except Exception as e:
+            logger.error(f"Error polling call {call.call_id}: {e}")
+            details = None
+
+        if details is not None and details.get("success") is not False:
+            call.last_details = details
+            call.last_status = details.get("status")
+            logger.debug(f"Call {call.call_id} is {call.last_status}")
+        else:
+            logger.error(f"Error checking status for call {call.call_id}")
+
+        elapsed = self._now() - call.started_at
+        if call.last_status in self.terminal_statuses:
+            await self._finish(call, "terminal")
+        elif elapsed >= self.max_wait:
+            logger.warning(f"Call {call.call_id} still '{call.last_status}' after {elapsed:.0f}s, finalizing")
+            self._timed_out_total += 1
+            await self._finish(call, "timeout")
+        else:
+            call.next_poll_at = self._now() + self.next_interval(elapsed)
+            await self._registered(call)
+            if self.registry is not None and not await self._persist(
+                self.registry.schedule, call.call_id, call.last_status, call.polls, self._wall(call.next_poll_at),
+                default=True,
+            ):
+                await self._drop(call)
+                return
+            self._push(call)
+
+    async def _finish(self, call: MonitoredCall, reason: str):
+        await self._registered(call)
+        if self._calls.pop(call.call_id, None) is None:
+            return  # already finalized by a concurrent poll or webhook
+        # Claimed in the registry first, so a webhook on another worker cannot report it too
+        if self.registry is not None and not await self._persist(self.registry.claim_finish, call.call_id, default=True):
+            await self._lost(call.call_id)
+            return
+        CALLS_FINALIZED.labels(reason).inc()
+        POLLS_PER_CALL.observe(call.polls)
+        self._finished_ids[call.call_id] = None
+        if len(self._finished_ids) > 10000:
+            self._finished_ids.popitem(last=False)
+        self._finished_total += 1
+        result = None
+        try:
+            result = await self.on_finished(call.call_id, call.context, call.last_details)
+        except Exception as e:
+            logger.error(f"Error finalizing call {call.call_id}: {e}")
+        # Marked finished only after reporting: a crash mid-report leaves the call
+        # finalizing, and it is reported again once the lease lapses rather than never
+        if self.registry is not None:
+            await self._persist(self.registry.finish, call.call_id, reason, call.last_status, call.polls, result)
@@ -0,0 +1,351 @@
+"""
+Durable registry of monitored calls.
+
+Every call handed to the monitor gets a row holding its context, poll
+schedule, last upstream status and, once finalized, the analysed outcome.
+Calls still being monitored when the process stops are picked up again on the
+next start, so a deploy or crash no longer drops their outcomes.
+
+Active calls are leased to the worker monitoring them. Several uvicorn
+workers, or containers sharing the file on one host, spread monitoring between
+them: each heartbeats in the ``workers`` table, renews the leases it holds,
+claims calls whose lease has lapsed and sheds calls above its fair share, so
+load evens out and the calls of a worker that dies are taken over.
+
+Reporting a call starts by moving its row from ``monitoring`` to
+``finalizing`` with a conditional update, so only one worker reports it
+even when a webhook lands on another worker mid-report. The finalizing row
+stays leased to that worker; if the worker dies before ``finished``, the
+row goes back to ``monitoring`` once the lease lapses and is reported again.
+
+Lookups go through the primary key and the lease and claim scans through
+partial indexes over active rows only, so they stay cheap however many
+finished calls the table accumulates.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+ACTIVE = "monitoring"
+FINALIZING = "finalizing"
+FINISHED = "finished"
+
+TABLE = """
+CREATE TABLE IF NOT EXISTS calls (
+    call_id TEXT PRIMARY KEY,
+    context TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT,
+    reason TEXT,
+    polls INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    next_poll_at REAL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    result TEXT,
+    owner TEXT,
+    lease_until REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workers (
+    owner TEXT PRIMARY KEY,
+    lease_until REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS calls_active ON calls (next_poll_at) WHERE state = 'monitoring';
+CREATE INDEX IF NOT EXISTS calls_owner ON calls (owner, lease_until) WHERE state = 'monitoring';
+CREATE INDEX IF NOT EXISTS calls_finalizing ON calls (owner, lease_until) WHERE state = 'finalizing';
+"""
+
+# Columns added after the first release, for registries created before them
+MIGRATIONS = (("owner", "TEXT"), ("lease_until", "REAL"))
+
+COLUMNS = (
+    "call_id, context, state, status, reason, polls, started_at, next_poll_at, updated_at, finished_at, result,"
+    " owner, lease_until"
+)
+
+
+@dataclass
+class CallRecord:
+    """One registry row; times are Unix timestamps"""
+    call_id: str
+    context: Dict
+    state: str
+    status: Optional[str]
+    reason: Optional[str]
+    polls: int
+    started_at: float
+    next_poll_at: Optional[float]
+    updated_at: float
+    finished_at: Optional[float]
+    result: Optional[Dict]
+    owner: Optional[str] = None
+    lease_until: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row) -> "CallRecord":
+        (
+            call_id, context, state, status, reason, polls, started_at, next_poll_at, updated_at, finished_at, result,
+            owner, lease_until,
+        ) = row
+        return cls(
+            call_id=call_id,
+            context=json.loads(context),
+            state=state,
+            status=status,
+            reason=reason,
+            polls=polls,
+            started_at=started_at,
+            next_poll_at=next_poll_at,
+            updated_at=updated_at,
+            finished_at=finished_at,
+            result=json.loads(result) if result else None,
+            owner=owner,
+            lease_until=lease_until,
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "call_id": self.call_id,
+            "state": self.state,
+            "status": self.status,
+            "reason": self.reason,
+            "polls": self.polls,
+            "context": self.context,
+            "started_at": self.started_at,
+            "next_poll_at": self.next_poll_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "owner": self.owner,
+            "lease_until": self.lease_until,
+        }
+
+
+def worker_id() -> str:
+    """Identity of this process in the lease table"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class CallRegistry:
+    """
+    SQLite call registry (WAL, safe across threads and processes).
+
+    ``owner`` names this process in the lease table; calls it registers or
+    claims are leased to it until renewed or released.
+    """
+
+    def __init__(self, path: str, owner: Optional[str] = None, lease: float = 30.0):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.owner = owner or worker_id()
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(TABLE)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(calls)")}
+        for column, kind in MIGRATIONS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE calls ADD COLUMN {column} {kind}")
+        self._conn.executescript(INDEXES)
+
+    def add(self, call_id: str, context: Dict, started_at: float, next_poll_at: float) -> bool:
+        """Register a newly monitored call, leased to this worker; False if it is already known"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO calls"
+                " (call_id, context, state, started_at, next_poll_at, updated_at, owner, lease_until)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    call_id, json.dumps(context, default=str), ACTIVE, started_at, next_poll_at, now,
+                    self.owner, now + self.lease,
+                ),
+            )
+            return cursor.rowcount > 0
+
+    def schedule(self, call_id: str, status: Optional[str], polls: int, next_poll_at: float) -> bool:
+        """
+        Record a poll result and when the call is next due. False if this
+        worker no longer holds the call (finished elsewhere or lease lost).
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE calls SET status = ?, polls = ?, next_poll_at = ?, updated_at = ?"
+                " WHERE call_id = ? AND state = ? AND owner = ?",
+                (status, polls, next_poll_at, time.time(), call_id, ACTIVE, self.owner),
+            )
+            return cursor.rowcount > 0
+
+    def claim_finish(self, call_id: str, any_owner: bool = False) -> bool:
+        """
+        Take the right to report a call: move it from monitoring to finalizing,
+        leased to this worker. Only a call this worker holds, unless
+        ``any_owner`` (a webhook for a call monitored elsewhere). False if the
+        call is already being reported or finished.
+        """
+        now = time.time()
+        query = (
+            "UPDATE calls SET state = ?, owner = ?, lease_until = ?, next_poll_at = NULL, updated_at = ?"
+            " WHERE call_id = ? AND state = ?"
+        )
+        params = [FINALIZING, self.owner, now + self.lease, now, call_id, ACTIVE]
+        if not any_owner:
+            query += " AND owner = ?"
+            params.append(self.owner)
+        with self._lock:
+            return self._conn.execute(query, params).rowcount > 0
+
+    def heartbeat(self) -> int:
+        """Mark this worker alive for one lease; returns the number of live workers"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (owner, lease_until) VALUES (?, ?)"
+                " ON CONFLICT (owner) DO UPDATE SET lease_until = excluded.lease_until",
+                (self.owner, now + self.lease),
+            )
+            # Forget workers that have been gone for a while
+            self._conn.execute("DELETE FROM workers WHERE lease_until < ?", (now - 10 * self.lease,))
+            return self._conn.execute("SELECT COUNT(*) FROM workers WHERE lease_until >= ?", (now,)).fetchone()[0]
+
+    def renew(self) -> int:
+        """Extend the lease on every call this worker monitors or is reporting; returns how many"""
+        now = time.time()
+        with self._lock:
+            renewed = 0
+            # One statement per state, so each uses its partial index
+            for state in (ACTIVE, FINALIZING):
+                renewed += self._conn.execute(
+                    f"UPDATE calls SET lease_until = ? WHERE state = '{state}' AND owner = ?",
+                    (now + self.lease, self.owner),
+                ).rowcount
+            return renewed
+
+    def claim(self, limit: int) -> List[CallRecord]:
+        """
+        Take over up to ``limit`` active calls that nobody holds a live lease
+        on (released, or owned by a worker that stopped renewing), earliest
+        due first. Calls whose reporting worker died first go back to monitoring.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    f"UPDATE calls SET state = '{ACTIVE}', owner = NULL, lease_until = NULL, next_poll_at = ?"
+                    f" WHERE state = '{FINALIZING}' AND lease_until < ?",
+                    (now, now),
+                )
+                rows = self._conn.execute(
+                    f"SELECT {COLUMNS} FROM calls WHERE state = '{ACTIVE}'"
+                    " AND (owner IS NULL OR lease_until IS NULL OR lease_until < ?) ORDER BY next_poll_at LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE calls SET owner = ?, lease_until = ? WHERE call_id = ?",
+                    [(self.owner, now + self.lease, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [CallRecord.from_row(row) for row in rows]
+
+    def shed(self, limit: int) -> List[str]:
+        """Give up to ``limit`` held calls back for other workers, latest due first; returns their ids"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"UPDATE calls SET owner = NULL, lease_until = NULL WHERE call_id IN ("
+                f"SELECT call_id FROM calls WHERE state = '{ACTIVE}' AND owner = ?"
+                " ORDER BY next_poll_at DESC LIMIT ?) RETURNING call_id",
+                (self.owner, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def release(self) -> int:
+        """
+        Give up every lease this worker holds, so other workers claim the calls
+        at once. Calls it was still reporting go back to monitoring.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE calls SET owner = NULL, lease_until = NULL WHERE state = '{ACTIVE}' AND owner = ?",
+                (self.owner,),
+            )
+            self._conn.execute(
+                f"UPDATE calls SET state = '{ACTIVE}', owner = NULL, lease_until = NULL, next_poll_at = ?"
+                f" WHERE state = '{FINALIZING}' AND owner = ?",
+                (now, self.owner),
+            )
+            self._conn.execute("DELETE FROM workers WHERE owner = ?", (self.owner,))
+            return cursor.rowcount
+
+    def finish(
+        self,
+        call_id: str,
+        reason: str,
+        status: Optional[str],
+        polls: Optional[int] = None,
+        result: Optional[Dict] = None,
+    ) -> bool:
+        """Mark a call finalized with its outcome; False if it was already finished"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE calls SET state = ?, reason = ?, status = ?, polls = COALESCE(?, polls), next_poll_at = NULL,"
+                " lease_until = NULL, result = ?, updated_at = ?, finished_at = ? WHERE call_id = ? AND state IN (?, ?)",
+                (
+                    FINISHED, reason, status, polls,
+                    json.dumps(result, default=str) if result is not None else None,
+                    now, now, call_id, ACTIVE, FINALIZING,
+                ),
+            )
+            return cursor.rowcount > 0
+
+    def finished(self, call_ids: List[str]) -> List[str]:
+        """Which of ``call_ids`` have been finalized, by any worker"""
+        done = []
+        with self._lock:
+            # In chunks, under SQLite's bound-parameter limit
+            for start in range(0, len(call_ids), 500):
+                chunk = call_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT call_id FROM calls WHERE call_id IN ({', '.join('?' for _ in chunk)}) AND state = ?",
+                    (*chunk, FINISHED),
+                ).fetchall()
+                done.extend(row[0] for row in rows)
+        return done
+
+    def get(self, call_id: str) -> Optional[CallRecord]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {COLUMNS} FROM calls WHERE call_id = ?", (call_id,)).fetchone()
+        return CallRecord.from_row(row) if row else None
+
+    def counts(self) -> Dict:
+        # Literal state predicates so SQLite can use the partial indexes
+        now = time.time()
+        with self._lock:
+            active, owned, orphaned = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(owner = ?), 0),"
+                " COALESCE(SUM(owner IS NULL OR lease_until IS NULL OR lease_until < ?), 0)"
+                f" FROM calls WHERE state = '{ACTIVE}'",
+                (self.owner, now),
+            ).fetchone()
+        return {"active": active, "owned": owned, "unowned": orphaned}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
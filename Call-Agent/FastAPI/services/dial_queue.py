@@ -0,0 +1,343 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# A "line" is the (agent_id, phone_id) pair an outbound call is placed from
+Line = Tuple[Optional[str], Optional[str]]
+
+# Job states after which a job no longer changes
+DONE_STATUSES = ("completed", "failed")
+
+
+class QueueFull(Exception):
+    """Raised when a batch does not fit in the dial queue"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Dial queue is full")
+        self.retry_after = retry_after
+
+
+@dataclass
+class DialJob:
+    """One queued outbound call and its status handle"""
+    dial_id: str
+    phone: str
+    name: str
+    company: str
+    context: Dict
+    priority: int
+    line: Line
+    status: str = "queued"  # queued | waiting | dialing | in_call | completed | failed
+    call_id: Optional[str] = None
+    error: Optional[str] = None
+    retry_at: Optional[float] = None
+    seq: int = field(default=0, repr=False)  # FIFO position within its priority
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict:
+        return {
+            "dial_id": self.dial_id,
+            "status": self.status,
+            "call_id": self.call_id,
+            "error": self.error,
+            "retry_at": self.retry_at,
+            "phone": self.phone,
+            "priority": self.priority,
+            "agent_id": self.line[0],
+            "phone_id": self.line[1],
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class DialQueue:
+    """
+    Prioritized outbound dial queue with a concurrent-call cap per line.
+    Queue and cap are per process: N workers allow N times the cap per line.
+
+    Each line has its own priority heap so a saturated line never blocks
+    dispatch on another one. A slot is held from dialing until the call is
+    released (when its monitor finishes), so the cap bounds live calls rather
+    than just trigger requests. Dispatch is event driven: submitting jobs or
+    releasing a slot pumps the affected line.
+
+    A dial result carrying ``retry_after`` (upstream refused it outright, e.g.
+    an open circuit breaker) puts the job back in the queue as ``waiting``:
+    its slot is freed and the line pauses dispatch for that long, rather
+    than holding the slot while it waits.
+
+    A call is normally released by the worker that finalizes it. When that
+    is another worker (the call was shed, its lease lost, or a webhook
+    reported it elsewhere), ``finished_calls`` is asked every
+    ``reconcile_interval`` seconds which tracked calls have ended, and
+    their slots are freed.
+
+    Jobs live in this process only. ``renew_queued`` is called on the same
+    schedule with the jobs not dialed yet (queued, waiting or dialing), so
+    state kept for them elsewhere (their lead keys) lasts as long as they
+    do, and ``on_discarded`` with the queued jobs ``stop`` throws away.
+    """
+
+    def __init__(
+        self,
+        dial: Callable[[DialJob], Awaitable[Dict]],
+        max_queued: int = 10000,
+        max_concurrent_per_line: int = 10,
+        expected_call_duration: float = 120.0,
+        max_tracked_jobs: int = 100000,
+        finished_calls: Optional[Callable[[List[str]], Awaitable[List[str]]]] = None,
+        reconcile_interval: float = 30.0,
+        renew_queued: Optional[Callable[[List[DialJob]], Awaitable[None]]] = None,
+        on_discarded: Optional[Callable[[List[DialJob]], Awaitable[None]]] = None,
+    ):
+        self.dial = dial
+        self.max_queued = max_queued
+        self.max_concurrent_per_line = max_concurrent_per_line
+        self.expected_call_duration = expected_call_duration
+        self.max_tracked_jobs = max_tracked_jobs
+        self.finished_calls = finished_calls
+        self.reconcile_interval = reconcile_interval
+        self.renew_queued = renew_queued
+        self.on_discarded = on_discarded
+
+        self._heaps: Dict[Line, List[Tuple[int, int, str]]] = {}
+        self._active: Dict[Line, int] = {}
+        # call_id -> (line holding the slot, dial_id if it came from the queue)
+        self._calls: Dict[str, Tuple[Line, Optional[str]]] = {}
+        self._jobs: "OrderedDict[str, DialJob]" = OrderedDict()
+        # Completed and failed jobs, oldest first: the only ones evicted past max_tracked_jobs
+        self._done_jobs: "OrderedDict[str, None]" = OrderedDict()
+        self._seq = itertools.count()
+        self._tasks: set = set()
+        self._queued = 0
+        # Lines waiting out an upstream outage, and the handles that resume them
+        self._paused: Dict[Line, asyncio.TimerHandle] = {}
+        self._reconciler: Optional[asyncio.Task] = None
+        self._reconciled_total = 0
+
+    def submit(self, leads: List[Dict], line: Line) -> List[DialJob]:
+        """
+        Queue a batch of leads on a line, all or nothing.
+
+        Raises:
+            QueueFull: If the batch would exceed ``max_queued``; carries a
+                Retry-After estimate based on the current drain rate.
+        """
+        if self._queued + len(leads) > self.max_queued:
+            raise QueueFull(self._retry_after(self._queued + len(leads) - self.max_queued))
+
+        jobs = []
+        heap = self._heaps.setdefault(line, [])
+        for lead in leads:
+            job = DialJob(
+                dial_id=uuid.uuid4().hex,
+                phone=lead["phone"],
+                name=lead["name"],
+                company=lead["company"],
+                context=lead.get("context") or {},
+                priority=lead.get("priority", 0),
+                line=line,
+            )
+            self._track(job)
+            # Higher priority first, FIFO within a priority
+            job.seq = next(self._seq)
+            heapq.heappush(heap, (-job.priority, job.seq, job.dial_id))
+            jobs.append(job)
+        self._queued += len(jobs)
+        logger.info(f"Queued {len(jobs)} call(s) on line {line}, queue depth {self._queued}")
+        self._start_reconciler()
+        self._pump(line)
+        return jobs
+
+    def get(self, dial_id: str) -> Optional[DialJob]:
+        return self._jobs.get(dial_id)
+
+    def track_call(self, call_id: str, line: Line):
+        """Count a call dialed outside the queue against its line's cap"""
+        self._active[line] = self._active.get(line, 0) + 1
+        self._calls[call_id] = (line, None)
+        self._start_reconciler()
+
+    def release(self, call_id: str):
+        """Free the line slot held by a finished call and dispatch the next job"""
+        entry = self._calls.pop(call_id, None)
+        if entry is None:
+            return
+        line, dial_id = entry
+        self._active[line] = max(0, self._active.get(line, 0) - 1)
+        job = self._jobs.get(dial_id) if dial_id else None
+        if job is not None:
+            self._set_status(job, "completed")
+        self._pump(line)
+
+    async def reconcile(self, call_ids: Optional[List[str]] = None) -> int:
+        """Free the slots of tracked calls (all, or ``call_ids``) that have ended elsewhere; returns how many"""
+        tracked = [call_id for call_id in (call_ids if call_ids is not None else self._calls) if call_id in self._calls]
+        if self.finished_calls is None or not tracked:
+            return 0
+        try:
+            finished = await self.finished_calls(tracked)
+        except Exception as e:
+            logger.error(f"Error checking for finished calls: {e}")
+            return 0
+        for call_id in finished:
+            self.release(call_id)
+        if finished:
+            self._reconciled_total += len(finished)
+            logger.info(f"Freed {len(finished)} line slot(s) of calls finalized by another worker")
+        return len(finished)
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queued,
+            "tracked_calls": len(self._calls),
+            "reconciled_total": self._reconciled_total,
+            "max_queued": self.max_queued,
+            "max_concurrent_per_line": self.max_concurrent_per_line,
+            "lines": [
+                {
+                    "agent_id": line[0],
+                    "phone_id": line[1],
+                    "active": self._active.get(line, 0),
+                    "queued": len(heap),
+                    "paused": line in self._paused,
+                }
+                for line, heap in self._heaps.items()
+            ],
+        }
+
+    async def stop(self):
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            await asyncio.gather(self._reconciler, return_exceptions=True)
+            self._reconciler = None
+        for handle in self._paused.values():
+            handle.cancel()
+        self._paused.clear()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        discarded = self._queued_jobs()
+        for job in discarded:
+            self._set_status(job, "failed", "Dial queue stopped")
+        self._heaps.clear()
+        self._queued = 0
+        if discarded:
+            logger.warning(f"Dial queue stopped with {len(discarded)} call(s) not dialed")
+            if self.on_discarded is not None:
+                try:
+                    await self.on_discarded(discarded)
+                except Exception as e:
+                    logger.error(f"Error discarding queued calls: {e}")
+
+    def _retry_after(self, overflow: int) -> int:
+        lines = max(1, len(self._heaps))
+        rounds = math.ceil(overflow / (self.max_concurrent_per_line * lines))
+        return max(1, int(rounds * self.expected_call_duration))
+
+    def _start_reconciler(self):
+        if self.finished_calls is None and self.renew_queued is None:
+            return
+        if self._reconciler is not None and not self._reconciler.done():
+            return
+        self._reconciler = asyncio.get_running_loop().create_task(self._reconcile_loop())
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            await self.reconcile()
+            await self._renew()
+
+    async def _renew(self):
+        if self.renew_queued is None:
+            return
+        jobs = [job for job in self._jobs.values() if job.status in ("queued", "waiting", "dialing")]
+        if not jobs:
+            return
+        try:
+            await self.renew_queued(jobs)
+        except Exception as e:
+            logger.error(f"Error renewing queued calls: {e}")
+
+    def _queued_jobs(self) -> List[DialJob]:
+        """Jobs in the line heaps: queued, or waiting out an upstream outage"""
+        jobs = (self._jobs.get(dial_id) for heap in self._heaps.values() for _, _, dial_id in heap)
+        return [job for job in jobs if job is not None]
+
+    def _track(self, job: DialJob):
+        self._jobs[job.dial_id] = job
+        self._evict()
+
+    def _evict(self):
+        # Live jobs are never evicted, however old, so they do not hold eviction up either
+        while len(self._jobs) > self.max_tracked_jobs and self._done_jobs:
+            dial_id, _ = self._done_jobs.popitem(last=False)
+            self._jobs.pop(dial_id, None)
+
+    def _set_status(self, job: DialJob, status: str, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.updated_at = time.time()
+        if status in DONE_STATUSES:
+            self._done_jobs[job.dial_id] = None
+            self._evict()
+
+    def _pump(self, line: Line):
+        heap = self._heaps.get(line)
+        while line not in self._paused and heap and self._active.get(line, 0) < self.max_concurrent_per_line:
+            _, _, dial_id = heapq.heappop(heap)
+            self._queued -= 1
+            job = self._jobs.get(dial_id)
+            if job is None:
+                continue
+            self._active[line] = self._active.get(line, 0) + 1
+            self._set_status(job, "dialing")
+            task = asyncio.get_running_loop().create_task(self._dial(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dial(self, job: DialJob):
+        try:
+            result = await self.dial(job)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        if result.get("success") and result.get("call_id"):
+            job.call_id = result["call_id"]
+            self._calls[job.call_id] = (job.line, job.dial_id)
+            self._set_status(job, "in_call")
+            self._start_reconciler()
+            return
+
+        self._active[job.line] = max(0, self._active.get(job.line, 0) - 1)
+        retry_after = result.get("retry_after")
+        if retry_after is not None:
+            job.retry_at = time.time() + retry_after
+            self._set_status(job, "waiting", str(result.get("error", "Upstream unavailable")))
+            # Back in its original place, ahead of jobs queued after it
+            heapq.heappush(self._heaps[job.line], (-job.priority, job.seq, job.dial_id))
+            self._queued += 1
+            self._pause(job.line, retry_after)
+            return
+
+        self._set_status(job, "failed", str(result.get("error", "Unknown error")))
+        self._pump(job.line)
+
+    def _pause(self, line: Line, delay: float):
+        if line in self._paused:
+            return
+        logger.warning(f"Line {line} paused for {delay:g}s, upstream is refusing calls")
+        self._paused[line] = asyncio.get_running_loop().call_later(delay, self._resume, line)
+
+    def _resume(self, line: Line):
+        self._paused.pop(line, None)
+        self._pump(line)
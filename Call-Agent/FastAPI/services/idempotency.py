@@ -0,0 +1,310 @@
+"""
+Idempotent request handling for dial endpoints.
+
+A retried ``POST /call`` must not dial the same lead twice. Each request is
+keyed by its ``Idempotency-Key`` header or, failing that, by the lead and
+campaign it targets. The first request for a key records it as pending,
+does the work and stores the response; repeats get the stored response
+without touching upstream, and repeats that arrive while the first is still
+dialing wait for its result. Failed attempts are forgotten so the client
+can retry them.
+
+Keys live in SQLite so every worker sharing the file sees them. Entries
+expire after their TTL and the table is capped at ``max_entries``. The
+async paths reach the store from a worker thread, so a write waiting on
+another worker's lock does not stall the event loop.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.fast_json import dumps
+
+PENDING = "pending"
+DONE = "done"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT,
+    state TEXT NOT NULL,
+    response TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idempotency_expiry ON idempotency (expires_at);
+CREATE INDEX IF NOT EXISTS idempotency_age ON idempotency (created_at);
+"""
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused for a different request body"""
+
+    def __init__(self):
+        super().__init__("Idempotency-Key was already used for a different request")
+
+
+class IdempotencyInProgress(Exception):
+    """Raised when the original request for a key is still running after the wait"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("A request with this Idempotency-Key is still in progress")
+        self.retry_after = retry_after
+
+
+@dataclass
+class IdempotencyRecord:
+    key: str
+    fingerprint: Optional[str]
+    state: str
+    response: Optional[Dict]
+    created_at: float
+    expires_at: float
+
+
+def fingerprint(body: Dict) -> str:
+    """Stable hash of a request body, to catch keys reused for other requests"""
+    return hashlib.sha256(dumps(body, sort_keys=True)).hexdigest()
+
+
+def lead_key(phone: str, context: Optional[Dict]) -> Optional[str]:
+    """
+    Derived key for a dial without an Idempotency-Key: the campaign plus the
+    contact (or phone). None when the request names no campaign.
+    """
+    context = context or {}
+    campaign = context.get("campaignId")
+    if campaign in (None, ""):
+        return None
+    lead = context.get("contactId") or phone
+    return f"lead:{campaign}:{lead}"
+
+
+class IdempotencyStore:
+    """SQLite dedupe table (WAL, safe across threads and processes)"""
+
+    def __init__(self, path: str, max_entries: int = 100000, prune_every: int = 100):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def begin(self, key: str, fingerprint: Optional[str], pending_ttl: float) -> Optional[IdempotencyRecord]:
+        """
+        Claim ``key`` for a new request. Returns None when the caller should
+        go ahead, or the live record of an earlier request with this key.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT key, fingerprint, state, response, created_at, expires_at FROM idempotency WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None and row[5] > now:
+                    self._conn.execute("COMMIT")
+                    key, fp, state, response, created_at, expires_at = row
+                    return IdempotencyRecord(
+                        key, fp, state, json.loads(response) if response else None, created_at, expires_at
+                    )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO idempotency (key, fingerprint, state, created_at, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, fingerprint, PENDING, now, now + pending_ttl),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._inserts += 1
+            if self._inserts % self.prune_every == 0:
+                self._prune(now)
+        return None
+
+    def complete(self, key: str, response: Dict, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE idempotency SET state = ?, response = ?, expires_at = ? WHERE key = ?",
+                (DONE, json.dumps(response, default=str), time.time() + ttl, key),
+            )
+
+    def renew(self, keys: List[str], ttl: float) -> int:
+        """Push back the expiry of completed ``keys``; returns how many were still live"""
+        now = time.time()
+        renewed = 0
+        with self._lock:
+            # In chunks, under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                cursor = self._conn.execute(
+                    f"UPDATE idempotency SET expires_at = ? WHERE key IN ({', '.join('?' for _ in chunk)})"
+                    " AND state = ? AND expires_at > ?",
+                    (now + ttl, *chunk, DONE, now),
+                )
+                renewed += cursor.rowcount
+        return renewed
+
+    def abandon(self, key: str):
+        """Forget a key so the request can be retried (e.g. after the dial failed)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM idempotency WHERE key = ?", (key,))
+
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, fingerprint, state, response, created_at, expires_at FROM idempotency"
+                " WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        key, fp, state, response, created_at, expires_at = row
+        return IdempotencyRecord(key, fp, state, json.loads(response) if response else None, created_at, expires_at)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM idempotency").fetchone()[0]
+
+    def _prune(self, now: float):
+        # Called with the lock held
+        self._conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM idempotency").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM idempotency WHERE key IN (SELECT key FROM idempotency ORDER BY created_at LIMIT ?)",
+                (excess,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Idempotency:
+    """
+    Run request handlers at most once per key.
+
+    ``run`` returns ``(response, replayed)``. Only responses for which
+    ``succeeded(response)`` holds are kept; anything else, or an exception,
+    frees the key again. A repeat that finds the key pending polls for up to
+    ``wait`` seconds for the original to finish; if the original failed in
+    the meantime, the repeat runs the handler itself.
+
+    Explicit keys are kept for ``ttl``; derived ``lead:`` keys only for
+    ``lead_ttl``, long enough to absorb retries without blocking a
+    deliberate redial (e.g. a scheduled callback) later on. A lead key whose
+    job is still queued is ``renew``ed by the worker holding the job, so it
+    lasts as long as the job does, plus at most ``lead_ttl`` if that worker
+    dies with it.
+    """
+
+    def __init__(
+        self,
+        store: IdempotencyStore,
+        ttl: float = 86400.0,
+        lead_ttl: float = 600.0,
+        pending_ttl: float = 120.0,
+        wait: float = 30.0,
+        poll_interval: float = 0.1,
+    ):
+        self.store = store
+        self.ttl = ttl
+        self.lead_ttl = lead_ttl
+        self.pending_ttl = pending_ttl
+        self.wait = wait
+        self.poll_interval = poll_interval
+
+        self._executed_total = 0
+        self._replayed_total = 0
+        self._conflicts_total = 0
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: Optional[str],
+        handler: Callable[[], Awaitable[Dict]],
+        succeeded: Callable[[Dict], bool] = lambda response: response.get("success") is not False,
+    ) -> Tuple[Dict, bool]:
+        """
+        Raises:
+            IdempotencyConflict: If the key was used with another fingerprint.
+            IdempotencyInProgress: If the original is still running after ``wait``.
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            record = await asyncio.to_thread(self.claim, key, fingerprint)
+            if record is None:
+                break
+            response = await self._replay(record, fingerprint, deadline)
+            if response is not None:
+                return response, True
+
+        self._executed_total += 1
+        try:
+            response = await handler()
+        except BaseException:
+            await asyncio.to_thread(self.release, key)
+            raise
+        if succeeded(response):
+            await asyncio.to_thread(self.complete, key, response)
+        else:
+            await asyncio.to_thread(self.release, key)
+        return response, False
+
+    def claim(self, key: str, fingerprint: Optional[str] = None) -> Optional[IdempotencyRecord]:
+        """Mark ``key`` pending; None if claimed, else the earlier request's record"""
+        return self.store.begin(key, fingerprint, self.pending_ttl)
+
+    def complete(self, key: str, response: Dict):
+        """Store the response to replay for ``key``"""
+        self.store.complete(key, response, self.lead_ttl if key.startswith("lead:") else self.ttl)
+
+    def renew(self, keys: List[str]) -> int:
+        """Keep completed lead ``keys`` for another ``lead_ttl``"""
+        return self.store.renew(keys, self.lead_ttl) if keys else 0
+
+    def release(self, key: str):
+        """Forget ``key`` so the request can be made again"""
+        self.store.abandon(key)
+
+    def note_replay(self):
+        """Count a duplicate answered from a record fetched through ``claim``"""
+        self._replayed_total += 1
+
+    async def _replay(self, record: IdempotencyRecord, fingerprint: Optional[str], deadline: float) -> Optional[Dict]:
+        if fingerprint and record.fingerprint and record.fingerprint != fingerprint:
+            self._conflicts_total += 1
+            raise IdempotencyConflict()
+        while record.state == PENDING:
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(retry_after=max(1, math.ceil(self.wait / 10)))
+            await asyncio.sleep(self.poll_interval)
+            record = await asyncio.to_thread(self.store.get, record.key)
+            if record is None:
+                return None  # the original failed and gave the key up
+        self._replayed_total += 1
+        return record.response
+
+    def stats(self) -> Dict:
+        return {
+            "entries": self.store.count(),
+            "max_entries": self.store.max_entries,
+            "executed_total": self._executed_total,
+            "replayed_total": self._replayed_total,
+            "conflicts_total": self._conflicts_total,
+        }
@@ -0,0 +1,301 @@
+"""
+Size-bounded on-disk LRU cache of call recordings.
+
+A miss starts one background download per call that writes the upstream body
+to ``<key>.part`` in chunks and renames it into place once complete. Clients
+stream the recording while it downloads by following the growing file, so
+concurrent requests share one upstream fetch and a client hanging up does not
+waste the download. Completed files are evicted least recently used first
+once the cache exceeds ``max_bytes``; the index is rebuilt from the directory
+on startup.
+"""
+import asyncio
+import hashlib
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Optional
+
+import httpx
+from loguru import logger
+
+DEFAULT_TYPE = "audio/mpeg"
+
+
+class RecordingNotFound(Exception):
+    """Upstream has no recording for the call (yet)"""
+
+
+class RecordingUnavailable(Exception):
+    """Upstream failed to serve the recording"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class CachedRecording:
+    path: str
+    size: int
+    media_type: str
+    etag: str
+
+
+@dataclass(eq=False)
+class Download:
+    """An in-flight download; readers follow ``path`` as it grows"""
+    key: str
+    path: str
+    media_type: str = DEFAULT_TYPE
+    size: Optional[int] = None
+    written: int = 0
+    done: bool = False
+    error: Optional[Exception] = None
+    result: Optional[CachedRecording] = None
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self) -> Optional[CachedRecording]:
+        """
+        Wait for the download to finish; raises what it failed with. None if
+        the recording was too large to keep.
+        """
+        while not self.done:
+            await self.changed.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def open(self) -> BinaryIO:
+        try:
+            return open(self.path, "rb")
+        except FileNotFoundError:
+            # Finished meanwhile: the file was renamed into the cache
+            if self.done and self.result is not None:
+                return open(self.result.path, "rb")
+            raise RecordingUnavailable(503, "Recording is no longer available")
+
+    async def stream(self, chunk_size: int) -> AsyncIterator[bytes]:
+        """The recording's bytes as they arrive"""
+        with self.open() as file:
+            while True:
+                changed = self.changed
+                chunk = file.read(chunk_size)
+                if chunk:
+                    yield chunk
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await changed.wait()
+
+
+def media_type_for(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or DEFAULT_TYPE
+
+
+def extension_for(media_type: str) -> str:
+    if media_type == "audio/mpeg":
+        return ".mp3"
+    return mimetypes.guess_extension(media_type) or ".bin"
+
+
+class RecordingCache:
+    """
+    ``fetch(call_id)`` must return a streamed httpx response (the caller of
+    ``download`` closes it); its status decides between caching the body,
+    ``RecordingNotFound`` (404) and ``RecordingUnavailable``.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[httpx.Response]],
+        directory: str,
+        max_bytes: int = 2 * 1024 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+    ):
+        self.fetch = fetch
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+        # key -> CachedRecording, least recently used first
+        self._entries: "OrderedDict[str, CachedRecording]" = OrderedDict()
+        self._downloads: Dict[str, Download] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._upstream_bytes = 0
+        self._load()
+
+    @staticmethod
+    def key(call_id: str) -> str:
+        return hashlib.sha256(call_id.encode()).hexdigest()[:32]
+
+    def get(self, call_id: str) -> Optional[CachedRecording]:
+        """The cached recording, marked most recently used; None on a miss"""
+        key = self.key(call_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.path):
+            self._forget(key)  # removed behind our back
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        try:
+            # Persist the access, so the LRU order survives a restart
+            now = time.time()
+            os.utime(entry.path, (now, now))
+        except OSError:
+            pass
+        return entry
+
+    async def download(self, call_id: str) -> Download:
+        """
+        Start (or join) the download of a recording and wait for upstream to
+        answer. The returned download may still be in progress; read it with
+        ``stream`` or wait for it to land in the cache.
+
+        Raises:
+            RecordingNotFound, RecordingUnavailable: As answered by upstream.
+            CircuitOpen: If the upstream endpoint's breaker is open.
+        """
+        key = self.key(call_id)
+        download = self._downloads.get(key)
+        if download is None:
+            self._misses += 1
+            download = self._downloads[key] = Download(key, os.path.join(self.directory, f"{key}.part"))
+            download.task = asyncio.get_running_loop().create_task(self._run(call_id, download))
+        await download.ready.wait()
+        if download.error is not None and download.written == 0:
+            raise download.error
+        return download
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "downloading": len(self._downloads),
+            "hits_total": self._hits,
+            "misses_total": self._misses,
+            "evictions_total": self._evictions,
+            "upstream_bytes_total": self._upstream_bytes,
+        }
+
+    async def stop(self):
+        tasks = [download.task for download in self._downloads.values() if download.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, call_id: str, download: Download):
+        response = None
+        try:
+            response = await self.fetch(call_id)
+            if response.status_code == 404:
+                raise RecordingNotFound(f"No recording for {call_id}")
+            if response.status_code != 200:
+                await response.aread()
+                raise RecordingUnavailable(response.status_code, response.text or f"Upstream returned {response.status_code}")
+            download.media_type = response.headers.get("content-type", DEFAULT_TYPE).split(";")[0].strip()
+            length = response.headers.get("content-length")
+            download.size = int(length) if length and length.isdigit() else None
+            with open(download.path, "wb") as file:
+                download.ready.set()
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    file.write(chunk)
+                    file.flush()
+                    download.written += len(chunk)
+                    self._upstream_bytes += len(chunk)
+                    download.notify()
+            if download.size is not None and download.written != download.size:
+                raise RecordingUnavailable(502, f"Recording download for {call_id} was cut short")
+            download.result = self._store(download)
+            download.done = True
+            self._downloads.pop(download.key, None)
+        except BaseException as e:
+            download.error = e if isinstance(e, Exception) else RecordingUnavailable(503, "Download cancelled")
+            self._remove(download.path)
+            if not isinstance(e, (RecordingNotFound, asyncio.CancelledError)):
+                logger.warning(f"Recording download for {call_id} failed: {e}")
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            if response is not None:
+                await response.aclose()
+            download.done = True
+            download.ready.set()
+            download.notify()
+            self._downloads.pop(download.key, None)
+
+    def _store(self, download: Download) -> Optional[CachedRecording]:
+        """Move a finished download into the cache; None if it can never fit"""
+        entry = CachedRecording(
+            path=os.path.join(self.directory, download.key + extension_for(download.media_type)),
+            size=download.written,
+            media_type=download.media_type,
+            etag=f'"{download.key}-{download.written:x}"',
+        )
+        if entry.size > self.max_bytes:
+            # Readers already have it open; the name goes, the bytes stay until they finish
+            self._remove(download.path)
+            return None
+        os.replace(download.path, entry.path)
+        self._forget(download.key)
+        self._entries[download.key] = entry
+        self._bytes += entry.size
+        self._evict()
+        return entry
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._evictions += 1
+            self._remove(entry.path)
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _load(self):
+        """Index the files left by a previous run, oldest access first"""
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            key, ext = os.path.splitext(name)
+            if ext == ".part":
+                self._remove(path)  # interrupted download
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            media_type = media_type_for(path)
+            found.append((stat.st_mtime, key, CachedRecording(path, stat.st_size, media_type, f'"{key}-{stat.st_size:x}"')))
+        for _, key, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[key] = entry
+            self._bytes += entry.size
+        self._evict()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
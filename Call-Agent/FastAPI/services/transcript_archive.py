@@ -0,0 +1,446 @@
+"""
+Append-only local archive of finished calls: normalized transcript and turns,
+outcome analysis and campaign context, one JSON record per call.
+
+Records are buffered and written in chunks of up to ``chunk_records``, each
+chunk a separately compressed gzip member appended to the current segment
+file (``<dir>/segments/*.jsonl.gz``). A segment is therefore an ordinary
+gzip'd JSONL file (``zcat`` reads it whole), while any single chunk can be
+decompressed on its own from its byte range. Every process writes its own
+segments, so uvicorn workers sharing the directory never interleave writes.
+
+A SQLite index next to the segments maps each chunk to its byte range and
+each call to its chunk, campaign, day and outcome. Lookups by call_id read
+one chunk; filtered scans only decompress the chunks holding matching calls,
+reading segments through ``mmap`` so the page cache is the only buffer.
+Scans can also be fanned out over processes (``map_chunks``), which is how
+historical calls are reprocessed without any upstream traffic.
+
+The index is the source of truth: bytes a crash left past the last indexed
+chunk are never read.
+"""
+import asyncio
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from utils.fast_json import dumps, loads
+from utils.outcome_batch import classify_batch
+
+# zlib window bits selecting the gzip container
+GZIP_WBITS = 31
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS calls (
+    call_id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    campaign_id TEXT,
+    day TEXT NOT NULL,
+    outcome TEXT,
+    archived_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_call ON calls (call_id);
+CREATE INDEX IF NOT EXISTS calls_campaign ON calls (campaign_id, day);
+CREATE INDEX IF NOT EXISTS calls_day ON calls (day);
+"""
+
+# Below this many chunks a process pool costs more than it saves
+PARALLEL_CHUNKS = 16
+
+# (segment path, offset, length) of one chunk
+ChunkRef = Tuple[str, int, int]
+
+
+def day_of(timestamp: float) -> str:
+    """UTC date (YYYY-MM-DD) the archive files a record under"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def matches(
+    record: Dict,
+    campaign_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    outcome: Optional[str] = None,
+) -> bool:
+    """Whether a record passes the scan filters (days are inclusive)"""
+    if campaign_id is not None and record.get("campaign_id") != campaign_id:
+        return False
+    day = record.get("day", "")
+    if since is not None and day < since:
+        return False
+    if until is not None and day > until:
+        return False
+    if outcome is not None and (record.get("analysis") or {}).get("outcome") != outcome:
+        return False
+    return True
+
+
+def read_chunk(buffer, offset: int, length: int) -> List[Dict]:
+    """Decode the records of one chunk from a segment's bytes (an mmap or bytes)"""
+    data = zlib.decompress(memoryview(buffer)[offset:offset + length], GZIP_WBITS)
+    return [loads(line) for line in data.split(b"\n") if line]
+
+
+def load_chunk(ref: ChunkRef) -> List[Dict]:
+    """Read one chunk straight from its segment file"""
+    path, offset, length = ref
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return read_chunk(mapped, offset, length)
+
+
+class TranscriptArchive:
+    def __init__(
+        self,
+        directory: str,
+        chunk_records: int = 500,
+        flush_interval: float = 5.0,
+        segment_bytes: int = 64 * 1024 * 1024,
+        compress_level: int = 6,
+    ):
+        self.directory = directory
+        self.segment_dir = os.path.join(directory, "segments")
+        self.chunk_records = chunk_records
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.compress_level = compress_level
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self._lock = threading.Lock()  # the index connection
+        self._write_lock = threading.Lock()  # the open segment
+        self._buffer_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"), isolation_level=None, check_same_thread=False, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        self._buffer: List[Dict] = []
+        self._buffered_since: Optional[float] = None
+        self._segment: Optional[str] = None
+        self._file = None
+        self._writer = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._segments_opened = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._appended = 0
+        self._flush_errors = 0
+
+    # ------------------------------------------------------------------ writes
+
+    def append(self, record: Dict):
+        """
+        Buffer one call's record. It needs ``call_id``; ``day`` defaults to
+        today and ``archived_at`` to now.
+        """
+        record.setdefault("archived_at", time.time())
+        record.setdefault("day", day_of(record["archived_at"]))
+        if record.get("campaign_id") is not None:
+            record["campaign_id"] = str(record["campaign_id"])  # filters compare strings
+        with self._buffer_lock:
+            self._buffer.append(record)
+            self._appended += 1
+            if self._buffered_since is None:
+                self._buffered_since = time.monotonic()
+            full = len(self._buffer) >= self.chunk_records
+        if full:
+            if self._wake is not None:
+                self._wake.set()  # compress off the event loop
+            else:
+                self.flush()
+
+    def flush(self) -> int:
+        """Write the buffered records as one chunk; returns how many"""
+        with self._write_lock:
+            with self._buffer_lock:
+                records, self._buffer = self._buffer, []
+                self._buffered_since = None
+            if not records:
+                return 0
+            try:
+                self._write_chunk(records)
+            except Exception as e:
+                # Keep them for the next flush rather than lose them
+                with self._buffer_lock:
+                    self._buffer[:0] = records
+                    self._buffered_since = time.monotonic()
+                self._flush_errors += 1
+                logger.error(f"Archiving {len(records)} calls failed: {e}")
+                return 0
+            return len(records)
+
+    def _write_chunk(self, records: List[Dict]):
+        raw = b"".join(dumps(record) + b"\n" for record in records)
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, GZIP_WBITS)
+        blob = compressor.compress(raw) + compressor.flush()
+
+        file = self._open_segment(len(blob))
+        offset = file.tell()
+        file.write(blob)
+        file.flush()
+        rows = [
+            (
+                str(record["call_id"]),
+                record.get("campaign_id"),
+                record["day"],
+                (record.get("analysis") or {}).get("outcome"),
+                record["archived_at"],
+            )
+            for record in records
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                chunk = self._conn.execute(
+                    "INSERT INTO chunks (segment, offset, length, records, raw_bytes, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._segment, offset, len(blob), len(records), len(raw), time.time()),
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO calls (call_id, chunk, campaign_id, day, outcome, archived_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(call_id, chunk, campaign, day, outcome, at) for call_id, campaign, day, outcome, at in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _open_segment(self, incoming: int):
+        """This process's current segment, rolled over once it would grow past ``segment_bytes``"""
+        if self._file is not None and self._file.tell() > 0 and self._file.tell() + incoming > self.segment_bytes:
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            # The sequence keeps names unique when segments roll over within a second
+            self._segments_opened += 1
+            self._segment = f"{stamp}-{self._writer}-{self._segments_opened:04d}.jsonl.gz"
+            self._file = open(os.path.join(self.segment_dir, self._segment), "ab")
+            self._file.seek(0, os.SEEK_END)
+        return self._file
+
+    def start(self):
+        """Flush in the background: when a chunk fills up, or ``flush_interval`` after the first buffered record"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._wake = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            since = self._buffered_since
+            if len(self._buffer) >= self.chunk_records or (
+                since is not None and time.monotonic() - since >= self.flush_interval
+            ):
+                await asyncio.to_thread(self.flush)
+
+    def close(self):
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------- reads
+
+    def get(self, call_id: str) -> Optional[Dict]:
+        """The latest archived record of a call, or None"""
+        with self._buffer_lock:
+            buffered = [record for record in self._buffer if record["call_id"] == call_id]
+        if buffered:
+            return buffered[-1]
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT k.segment, k.offset, k.length FROM calls c JOIN chunks k ON k.id = c.chunk"
+                " WHERE c.call_id = ? ORDER BY c.chunk DESC LIMIT 1",
+                (call_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        found = None
+        for record in load_chunk((os.path.join(self.segment_dir, row[0]), row[1], row[2])):
+            if record.get("call_id") == call_id:
+                found = record
+        return found
+
+    def chunks(
+        self,
+        campaign_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        outcome: Optional[str] = None,
+    ) -> List[ChunkRef]:
+        """Byte ranges of the chunks holding matching calls, oldest first"""
+        where, params = [], []
+        if campaign_id is not None:
+            where.append("campaign_id = ?")
+            params.append(campaign_id)
+        if since is not None:
+            where.append("day >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("day <= ?")
+            params.append(until)
+        if outcome is not None:
+            where.append("outcome = ?")
+            params.append(outcome)
+        sql = "SELECT segment, offset, length FROM chunks"
+        if where:
+            sql += f" WHERE id IN (SELECT chunk FROM calls WHERE {' AND '.join(where)})"
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id", params).fetchall()
+        return [(os.path.join(self.segment_dir, segment), offset, length) for segment, offset, length in rows]
+
+    def iter_records(
+        self,
+        campaign_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        outcome: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """
+        Stream matching records in archive order, one chunk in memory at a
+        time. Records still buffered are not included; ``flush`` first.
+        """
+        filters = {"campaign_id": campaign_id, "since": since, "until": until, "outcome": outcome}
+        refs = self.chunks(**filters)
+        mapped: Dict[str, mmap.mmap] = {}
+        try:
+            for path, offset, length in refs:
+                if path not in mapped:
+                    # One mapping per segment for the whole scan
+                    with open(path, "rb") as file:
+                        mapped[path] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                for record in read_chunk(mapped[path], offset, length):
+                    if matches(record, **filters):
+                        yield record
+        finally:
+            for old in mapped.values():
+                old.close()
+
+    def map_chunks(
+        self,
+        func: Callable[[List[Dict]], Any],
+        workers: Optional[int] = 1,
+        campaign_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        outcome: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """
+        Apply ``func`` to the matching records of each chunk and yield its
+        results in chunk order. With more than one worker the chunks are read
+        and processed in a process pool (``func`` must be picklable, i.e. a
+        module-level function); only byte ranges and results cross processes.
+        ``workers=None`` uses the CPU count from ``PARALLEL_CHUNKS`` chunks up.
+        """
+        filters = {"campaign_id": campaign_id, "since": since, "until": until, "outcome": outcome}
+        tasks = [(func, ref, filters) for ref in self.chunks(**filters)]
+        if workers is None:
+            workers = (os.cpu_count() or 1) if len(tasks) >= PARALLEL_CHUNKS else 1
+        if workers <= 1 or len(tasks) <= 1:
+            yield from map(_apply_to_chunk, tasks)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(_apply_to_chunk, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+
+    def reanalyze(self, keywords_path: Optional[str] = None, workers: Optional[int] = None, **filters) -> Dict:
+        """
+        Re-run outcome analysis over archived transcripts with the current
+        keywords and compare with the archived outcomes.
+        """
+        start = time.perf_counter()
+        outcomes: Counter = Counter()
+        changes: Counter = Counter()
+        records = 0
+        for part_records, part_outcomes, part_changes in self.map_chunks(
+            _ReanalyzeChunk(keywords_path), workers=workers, **filters
+        ):
+            records += part_records
+            outcomes.update(part_outcomes)
+            changes.update(part_changes)
+        return {
+            "records": records,
+            "outcomes": dict(outcomes),
+            "changed": sum(changes.values()),
+            "changes": {f"{old}->{new}": count for (old, new), count in changes.most_common()},
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            chunks, records, compressed, raw = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(records), 0), COALESCE(SUM(length), 0), COALESCE(SUM(raw_bytes), 0) FROM chunks"
+            ).fetchone()
+            segments = self._conn.execute("SELECT COUNT(DISTINCT segment) FROM chunks").fetchone()[0]
+            first_day, last_day = self._conn.execute("SELECT MIN(day), MAX(day) FROM calls").fetchone()
+        return {
+            "records": records,
+            "chunks": chunks,
+            "segments": segments,
+            "compressed_bytes": compressed,
+            "raw_bytes": raw,
+            "compression_ratio": round(raw / compressed, 2) if compressed else None,
+            "first_day": first_day,
+            "last_day": last_day,
+            "buffered": len(self._buffer),
+            "appended_total": self._appended,
+            "flush_errors_total": self._flush_errors,
+        }
+
+
+def _apply_to_chunk(task: Tuple[Callable[[List[Dict]], Any], ChunkRef, Dict]) -> Any:
+    func, ref, filters = task
+    return func([record for record in load_chunk(ref) if matches(record, **filters)])
+
+
+class _ReanalyzeChunk:
+    """Picklable per-chunk step of ``TranscriptArchive.reanalyze``"""
+
+    def __init__(self, keywords_path: Optional[str]):
+        self.keywords_path = keywords_path
+
+    def __call__(self, records: List[Dict]) -> Tuple[int, Counter, Counter]:
+        results = classify_batch([record.get("transcript") or "" for record in records], self.keywords_path, workers=1)
+        outcomes: Counter = Counter()
+        changes: Counter = Counter()
+        for record, result in zip(records, results):
+            outcomes[result["outcome"]] += 1
+            old = (record.get("analysis") or {}).get("outcome")
+            if old != result["outcome"]:
+                changes[(old, result["outcome"])] += 1
+        return len(records), outcomes, changes
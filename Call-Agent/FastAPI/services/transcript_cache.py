@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from utils.fast_json import dumps
+
+
+@dataclass
+class CachedTranscript:
+    """A transcript response plus the validators clients revalidate against"""
+    details: Dict
+    etag: str
+    last_modified: float
+    fetched_at: float
+    terminal: bool
+    size: int
+
+    @property
+    def ok(self) -> bool:
+        return self.details.get("success") is not False
+
+    def tag(self, variant: str = "") -> str:
+        """Strong ETag for one representation (e.g. a field projection) of the entry"""
+        if not variant:
+            return self.etag
+        return '%s-%s"' % (self.etag[:-1], hashlib.sha1(variant.encode()).hexdigest()[:8])
+
+    def headers(self, variant: str = "") -> Dict[str, str]:
+        return {
+            "ETag": self.tag(variant),
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+        }
+
+    def not_modified(
+        self,
+        if_none_match: Optional[str],
+        if_modified_since: Optional[str],
+        variant: str = "",
+    ) -> bool:
+        """Evaluate conditional request headers (If-None-Match wins when present)"""
+        if if_none_match:
+            etag = self.tag(variant)
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.last_modified) <= since
+        return False
+
+
+class TranscriptCache:
+    """
+    Bounded LRU/TTL cache in front of the upstream transcript fetch.
+
+    Conversations in a terminal state can no longer change, so they stay cached
+    until evicted by the ``max_bytes`` memory cap. Live conversations are
+    served from cache for ``live_ttl`` seconds. Concurrent misses for the same
+    call_id share a single upstream fetch, run as its own task so a caller
+    that is cancelled (e.g. its client disconnected) does not cancel it for
+    the others. Failed fetches are never cached.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Dict]],
+        terminal_statuses: Iterable[str],
+        live_ttl: float = 5.0,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.fetch = fetch
+        self.terminal_statuses = set(terminal_statuses)
+        self.live_ttl = live_ttl
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[str, CachedTranscript]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    async def get(self, call_id: str) -> CachedTranscript:
+        """Return a fresh cached entry or fetch it (once, however many callers)"""
+        entry = self.peek(call_id)
+        if entry is not None:
+            self._hits += 1
+            return entry
+
+        inflight = self._inflight.get(call_id)
+        if inflight is not None:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+            inflight = asyncio.ensure_future(self._fetch(call_id))
+            self._inflight[call_id] = inflight
+            # Mark retrieved so a failure nobody is left waiting for does not warn
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return await asyncio.shield(inflight)
+
+    async def _fetch(self, call_id: str) -> CachedTranscript:
+        try:
+            return self.put(call_id, await self.fetch(call_id))
+        finally:
+            self._inflight.pop(call_id, None)
+
+    def peek(self, call_id: str) -> Optional[CachedTranscript]:
+        """Return the cached entry if it is still fresh, without fetching"""
+        entry = self._entries.get(call_id)
+        if entry is None:
+            return None
+        if not entry.terminal and time.time() - entry.fetched_at > self.live_ttl:
+            return None
+        self._entries.move_to_end(call_id)
+        return entry
+
+    def put(self, call_id: str, details: Dict) -> CachedTranscript:
+        """Store a fetched transcript (e.g. the final one from the monitor)"""
+        now = time.time()
+        body = dumps(details, sort_keys=True)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        previous = self._entries.get(call_id)
+        entry = CachedTranscript(
+            details=details,
+            etag=etag,
+            # Only move Last-Modified when the content actually changed
+            last_modified=previous.last_modified if previous and previous.etag == etag else now,
+            fetched_at=now,
+            terminal=details.get("status") in self.terminal_statuses,
+            size=len(body),
+        )
+        if details.get("success") is False:
+            return entry
+
+        self._evict(call_id)
+        self._entries[call_id] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+        return entry
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "inflight": len(self._inflight),
+        }
+
+    def _evict(self, call_id: str):
+        entry = self._entries.pop(call_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
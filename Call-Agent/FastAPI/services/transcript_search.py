@@ -0,0 +1,282 @@
+"""
+Full-text search over finished calls (SQLite FTS5).
+
+Each call is indexed once, when it is reported, from the same record the
+transcript archive stores: what the prospect said and what the agent said go
+into separate columns, so a search can be limited to either speaker. Campaign,
+outcome and day live in an ordinary table sharing the FTS rowid and are
+applied as filters on the matches.
+
+Queries use a forgiving subset of the FTS5 syntax: ``"quoted phrases"``,
+``AND``/``OR``/``NOT`` (upper case), ``prefix*`` and parentheses. Any other
+word is matched literally (stemmed, case and accent insensitive), so input
+like ``e-mail`` or ``don't`` never fails to parse.
+
+Results come newest first by default. Paging then walks the FTS rowid with a
+keyset cursor, so a query stops after ``limit`` matches however many calls
+mention a common word. Campaign and outcome filters also bound the rowid
+range searched to the first and last call they match, which is what keeps a
+common word in a small (or empty) campaign fast. ``sort="relevance"`` ranks
+by BM25, which has to score every match and is slower for very common terms.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    call_id TEXT NOT NULL UNIQUE,
+    campaign_id TEXT,
+    outcome TEXT,
+    day TEXT NOT NULL,
+    started_at REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_campaign ON calls (campaign_id, id);
+CREATE INDEX IF NOT EXISTS calls_outcome ON calls (outcome, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS transcripts USING fts5(
+    prospect, agent, tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+
+SPEAKERS = ("prospect", "agent")
+SORTS = ("recent", "relevance")
+
+# Roles ElevenLabs uses for the agent; every other speaker is the prospect
+AGENT_ROLES = ("agent", "assistant", "ai")
+
+OPERATORS = ("AND", "OR", "NOT")
+_TOKEN = re.compile(r'"[^"]*"?|[()]|[^\s()"]+')
+
+
+class InvalidQuery(ValueError):
+    """The search text is empty or not a valid query"""
+
+
+def fts_query(text: str) -> str:
+    """Translate search text into an FTS5 query, quoting every plain word"""
+    parts = []
+    for token in _TOKEN.findall(text):
+        if token in OPERATORS or token in ("(", ")"):
+            parts.append(token)
+        elif token.startswith('"'):
+            phrase = token.strip('"').strip()
+            if phrase:
+                parts.append(f'"{phrase}"')
+        elif token.endswith("*") and token.strip("*"):
+            parts.append('"{}"*'.format(token.strip("*").replace('"', "")))
+        elif token.strip("*"):
+            parts.append('"{}"'.format(token.replace('"', "")))
+    if not parts:
+        raise InvalidQuery("Search text is empty")
+    return " ".join(parts)
+
+
+def transcript_turn(line: str) -> Dict:
+    """A ``role: message`` transcript line as a turn; unlabelled lines are the prospect's"""
+    role, sep, message = line.partition(":")
+    if not sep or " " in role.strip():
+        return {"role": "user", "message": line}
+    return {"role": role.strip().lower(), "message": message.strip()}
+
+
+def split_speakers(record: Dict) -> Tuple[str, str]:
+    """(prospect text, agent text) of an archive record"""
+    prospect, agent = [], []
+    turns = record.get("turns") or [transcript_turn(line) for line in (record.get("transcript") or "").splitlines()]
+    for turn in turns:
+        (agent if turn.get("role") in AGENT_ROLES else prospect).append(turn.get("message") or "")
+    return "\n".join(prospect), "\n".join(agent)
+
+
+class TranscriptSearch:
+    """SQLite FTS5 index of call transcripts (WAL, safe across threads and processes)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._indexed = 0
+        self._queries = 0
+
+    def add(self, record: Dict):
+        """Index (or re-index) one archive record"""
+        self.add_many([record])
+
+    def add_many(self, records: Iterable[Dict], batch: int = 1000) -> int:
+        """Index records in transactions of ``batch``; returns how many"""
+        count = 0
+        pending: List[Dict] = []
+        for record in records:
+            pending.append(record)
+            if len(pending) >= batch:
+                count += self._insert(pending)
+                pending = []
+        if pending:
+            count += self._insert(pending)
+        return count
+
+    def _insert(self, records: List[Dict]) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for record in records:
+                    campaign_id = record.get("campaign_id")
+                    row = self._conn.execute(
+                        "INSERT INTO calls (call_id, campaign_id, outcome, day, started_at, indexed_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (call_id) DO UPDATE SET campaign_id = excluded.campaign_id,"
+                        " outcome = excluded.outcome, day = excluded.day, started_at = excluded.started_at,"
+                        " indexed_at = excluded.indexed_at"
+                        " RETURNING id",
+                        (
+                            str(record["call_id"]),
+                            None if campaign_id is None else str(campaign_id),
+                            (record.get("analysis") or {}).get("outcome"),
+                            record["day"],
+                            record.get("started_at"),
+                            now,
+                        ),
+                    ).fetchone()
+                    self._conn.execute("DELETE FROM transcripts WHERE rowid = ?", (row[0],))
+                    self._conn.execute(
+                        "INSERT INTO transcripts (rowid, prospect, agent) VALUES (?, ?, ?)",
+                        (row[0], *split_speakers(record)),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._indexed += len(records)
+        return len(records)
+
+    def search(
+        self,
+        text: str,
+        campaign_id: Optional[str] = None,
+        outcome: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        speaker: Optional[str] = None,
+        sort: str = "recent",
+        limit: int = 20,
+        cursor: Optional[int] = None,
+    ) -> Dict:
+        """
+        One page of matching calls with highlighted snippets.
+
+        ``cursor`` is the ``next_cursor`` of the previous page (None for the
+        first); it is None on the last page.
+
+        Raises:
+            InvalidQuery: For empty or malformed search text.
+        """
+        query = fts_query(text)
+        if speaker is not None:
+            query = f"{{{speaker}}} : ({query})"
+        where, params = ["transcripts MATCH ?"], [query]
+        start = time.perf_counter()
+        with self._lock:
+            bounds = self._bounds(campaign_id=campaign_id, outcome=outcome)
+        if bounds is None:
+            return {"results": [], "next_cursor": None, "took_ms": round((time.perf_counter() - start) * 1000, 2)}
+        for column, value in (("c.campaign_id", campaign_id), ("c.outcome", outcome)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if bounds != (None, None):
+            where.append("transcripts.rowid BETWEEN ? AND ?")
+            params.extend(bounds)
+        if since is not None:
+            where.append("c.day >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("c.day <= ?")
+            params.append(until)
+
+        offset = cursor or 0
+        if sort == "recent":
+            if cursor is not None:
+                where.append("transcripts.rowid < ?")
+                params.append(cursor)
+            order, offset = "transcripts.rowid DESC", 0
+        else:
+            order = "bm25(transcripts)"
+        sql = (
+            "SELECT transcripts.rowid, c.call_id, c.campaign_id, c.outcome, c.day, c.started_at,"
+            " snippet(transcripts, -1, '<mark>', '</mark>', '…', 16)"
+            " FROM transcripts CROSS JOIN calls c ON c.id = transcripts.rowid"
+            f" WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ? OFFSET ?"
+        )
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, (*params, limit + 1, offset)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise InvalidQuery(f"Invalid search query: {e}")
+        self._queries += 1
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if not more:
+            next_cursor = None
+        elif sort == "recent":
+            next_cursor = rows[-1][0]
+        else:
+            next_cursor = offset + limit
+        return {
+            "results": [
+                {
+                    "call_id": call_id,
+                    "campaign_id": campaign,
+                    "outcome": call_outcome,
+                    "day": day,
+                    "started_at": started_at,
+                    "snippet": snippet,
+                }
+                for _, call_id, campaign, call_outcome, day, started_at, snippet in rows
+            ],
+            "next_cursor": next_cursor,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def _bounds(self, **filters) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """Smallest rowid range holding every call the equality filters match; None if none do"""
+        low, high = None, None
+        for column, value in filters.items():
+            if value is None:
+                continue
+            # Separate subqueries: SQLite only answers a lone MIN or MAX from the index
+            first, last = self._conn.execute(
+                f"SELECT (SELECT MIN(id) FROM calls WHERE {column} = ?), (SELECT MAX(id) FROM calls WHERE {column} = ?)",
+                (value, value),
+            ).fetchone()
+            if first is None:
+                return None
+            low = first if low is None else max(low, first)
+            high = last if high is None else min(high, last)
+            if low > high:
+                return None
+        return low, high
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = self._conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {"calls": calls, "bytes": size, "indexed_total": self._indexed, "queries_total": self._queries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
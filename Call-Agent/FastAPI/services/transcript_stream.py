@@ -0,0 +1,264 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from services.transcript_cache import TranscriptCache
+from utils.fast_json import dumps
+from utils.metrics import TRANSCRIPT_STREAM_SUBSCRIBERS, TRANSCRIPT_STREAM_WATCHERS
+
+
+@dataclass
+class StreamEvent:
+    """
+    One update pushed to transcript subscribers.
+
+    ``event`` is ``status``, ``turns``, ``error``, ``end`` or ``keepalive``.
+    Turn events carry as ``id`` the number of turns delivered so far, which a
+    client passes back (SSE ``Last-Event-ID``) to resume without repeats.
+    """
+    event: str
+    data: Dict
+    id: Optional[int] = None
+
+    def sse(self) -> bytes:
+        if self.event == "keepalive":
+            return b": keepalive\n\n"
+        head = f"id: {self.id}\n" if self.id is not None else ""
+        return f"{head}event: {self.event}\ndata: ".encode() + dumps(self.data) + b"\n\n"
+
+    def to_dict(self) -> Dict:
+        body = {"event": self.event, "data": self.data}
+        if self.id is not None:
+            body["id"] = self.id
+        return body
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    queue: asyncio.Queue
+    next_turn: int
+    closed: bool = False
+
+
+@dataclass(eq=False)
+class _Watch:
+    call_id: str
+    status: Optional[str] = None
+    turns: List[Dict] = field(default_factory=list)
+    subscribers: set = field(default_factory=set)
+    task: Optional[asyncio.Task] = None
+    failures: int = 0
+    done: bool = False
+
+
+def conversation_turns(details: Dict) -> List[Dict]:
+    """Turns of a parsed conversation, from the raw payload or the joined text"""
+    items = (details.get("raw_data") or {}).get("transcript")
+    if items is not None:
+        return [
+            {
+                "role": item.get("role", "unknown"),
+                "message": item.get("message") or item.get("text") or "",
+                "time_in_call_secs": item.get("time_in_call_secs"),
+            }
+            for item in items
+        ]
+    turns = []
+    for line in (details.get("transcript") or "").splitlines():
+        role, _, message = line.partition(": ")
+        turns.append({"role": role, "message": message, "time_in_call_secs": None})
+    return turns
+
+
+class TranscriptStreams:
+    """
+    Live transcript fan-out: one upstream watcher per conversation, any
+    number of subscribers.
+
+    The first subscriber to a call starts a watcher that refreshes the
+    transcript every ``interval`` seconds (sharing the transcript cache, so
+    fresh entries are reused and GET pollers see what it fetched) and pushes
+    only what changed: new turns and status changes. The watcher stops at a
+    terminal status, after ``max_failures`` consecutive failed fetches, or
+    when its last subscriber leaves. ``update`` lets the monitor and webhooks
+    push a final transcript the moment they have it.
+
+    Each subscriber has a bounded queue; one that falls ``queue_size``
+    events behind is disconnected rather than buffering without limit, and
+    can resume from its last turn id.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Dict]],
+        cache: TranscriptCache,
+        terminal_statuses: Iterable[str],
+        interval: float = 2.0,
+        queue_size: int = 256,
+        max_failures: int = 5,
+    ):
+        self.fetch = fetch
+        self.cache = cache
+        self.terminal_statuses = set(terminal_statuses)
+        self.interval = interval
+        self.queue_size = queue_size
+        self.max_failures = max_failures
+
+        self._watches: Dict[str, _Watch] = {}
+        self._fetches_total = 0
+        self._events_total = 0
+        self._dropped_total = 0
+
+        TRANSCRIPT_STREAM_WATCHERS.set_function(lambda: sum(1 for w in self._watches.values() if not w.done))
+        TRANSCRIPT_STREAM_SUBSCRIBERS.set_function(lambda: sum(len(w.subscribers) for w in self._watches.values()))
+
+    async def subscribe(
+        self,
+        call_id: str,
+        since: int = 0,
+        heartbeat: Optional[float] = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Yield the call's current status and turns after ``since``, then live
+        updates until the call ends. With ``heartbeat``, a ``keepalive`` event
+        is yielded after that many idle seconds.
+        """
+        watch = self._watches.get(call_id)
+        if watch is None:
+            watch = self._watches[call_id] = _Watch(call_id)
+            watch.task = asyncio.get_running_loop().create_task(self._run(watch))
+        subscriber = _Subscriber(asyncio.Queue(self.queue_size), since)
+        watch.subscribers.add(subscriber)
+        if watch.status is not None:
+            # Catch a late subscriber up before live updates
+            self._send(subscriber, self._status_event(watch))
+            self._send_turns(watch, subscriber)
+            if watch.done:
+                self._send(subscriber, self._end_event(watch))
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield StreamEvent("keepalive", {})
+                    continue
+                if event is None:
+                    return  # fell too far behind, or the service is stopping
+                yield event
+                if event.event == "end":
+                    return
+        finally:
+            watch.subscribers.discard(subscriber)
+            if not watch.subscribers and self._watches.get(call_id) is watch:
+                del self._watches[call_id]
+                if watch.task is not None:
+                    watch.task.cancel()
+
+    def update(self, call_id: str, details: Dict):
+        """Push freshly fetched details to the call's subscribers, if it has any"""
+        watch = self._watches.get(call_id)
+        if watch is not None and not watch.done and details.get("success") is not False:
+            self._apply(watch, details)
+
+    async def stop(self):
+        """Stop every watcher and disconnect its subscribers"""
+        watches = list(self._watches.values())
+        self._watches.clear()
+        tasks = [watch.task for watch in watches if watch.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for watch in watches:
+            for subscriber in watch.subscribers:
+                self._disconnect(subscriber)
+
+    def stats(self) -> Dict:
+        return {
+            "watchers": sum(1 for watch in self._watches.values() if not watch.done),
+            "subscribers": sum(len(watch.subscribers) for watch in self._watches.values()),
+            "upstream_fetches_total": self._fetches_total,
+            "events_total": self._events_total,
+            "dropped_subscribers_total": self._dropped_total,
+        }
+
+    async def _run(self, watch: _Watch):
+        while not watch.done:
+            entry = self.cache.peek(watch.call_id)
+            if entry is not None and (entry.terminal or time.time() - entry.fetched_at < self.interval):
+                details = entry.details
+            else:
+                self._fetches_total += 1
+                try:
+                    details = await self.fetch(watch.call_id)
+                except Exception as e:
+                    details = {"success": False, "error": str(e)}
+                self.cache.put(watch.call_id, details)
+
+            if details.get("success") is False:
+                watch.failures += 1
+                logger.warning(f"Transcript stream fetch failed for {watch.call_id}: {details.get('error')}")
+                self._publish(watch, StreamEvent("error", {"call_id": watch.call_id, "message": str(details.get("error"))}))
+                if watch.failures >= self.max_failures:
+                    watch.done = True
+                    self._publish(watch, self._end_event(watch, "upstream_error"))
+                    return
+            else:
+                watch.failures = 0
+                self._apply(watch, details)
+            if not watch.done:
+                await asyncio.sleep(self.interval)
+
+    def _apply(self, watch: _Watch, details: Dict):
+        status = details.get("status")
+        turns = conversation_turns(details)
+        if len(turns) > len(watch.turns):
+            watch.turns.extend(turns[len(watch.turns):])
+        if status != watch.status:
+            watch.status = status
+            self._publish(watch, self._status_event(watch))
+        for subscriber in list(watch.subscribers):
+            self._send_turns(watch, subscriber)
+        if status in self.terminal_statuses:
+            watch.done = True
+            self._publish(watch, self._end_event(watch))
+
+    def _status_event(self, watch: _Watch) -> StreamEvent:
+        return StreamEvent("status", {"call_id": watch.call_id, "status": watch.status})
+
+    def _end_event(self, watch: _Watch, reason: str = "terminal") -> StreamEvent:
+        return StreamEvent(
+            "end", {"call_id": watch.call_id, "status": watch.status, "turns": len(watch.turns), "reason": reason}
+        )
+
+    def _send_turns(self, watch: _Watch, subscriber: _Subscriber):
+        if subscriber.next_turn >= len(watch.turns):
+            return
+        start = subscriber.next_turn
+        subscriber.next_turn = len(watch.turns)
+        self._send(subscriber, StreamEvent(
+            "turns", {"call_id": watch.call_id, "index": start, "turns": watch.turns[start:]}, id=len(watch.turns),
+        ))
+
+    def _publish(self, watch: _Watch, event: StreamEvent):
+        for subscriber in list(watch.subscribers):
+            self._send(subscriber, event)
+
+    def _send(self, subscriber: _Subscriber, event: StreamEvent):
+        if subscriber.closed:
+            return  # already disconnected, waiting to read its end marker
+        try:
+            subscriber.queue.put_nowait(event)
+            self._events_total += 1
+        except asyncio.QueueFull:
+            self._dropped_total += 1
+            self._disconnect(subscriber)
+
+    @staticmethod
+    def _disconnect(subscriber: _Subscriber):
+        subscriber.closed = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
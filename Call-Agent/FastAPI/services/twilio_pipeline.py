@@ -0,0 +1,370 @@
+"""
+Event-driven processing of Twilio calls from their callbacks.
+
+Calls placed by the callagent ``VoiceAgent`` ask Twilio for call-status,
+recording-status and transcription callbacks. Each callback updates the
+call's row in a SQLite store, and the call is finalized (analyzed, reported
+to the backend, archived) as soon as its outcome is known:
+
+- the call ends unanswered (``no-answer``, ``busy``, ``failed``, ``canceled``);
+- the transcription arrives (or fails);
+- the recording is reported ``absent``, so no transcription will follow.
+
+Twilio does not transcribe silence, so an answered call whose transcription
+never arrives is finalized with what is known ``transcription_wait`` seconds
+after the call (or its recording) completed.
+
+Callbacks can arrive out of order and more than once. Status never moves
+backwards, and finalizing claims the row with a conditional update, so every
+call is reported exactly once even with several workers sharing the store.
+The call context (campaign and contact ids) travels in the callback URLs'
+query string, so any worker can report any call.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+DIALING = "dialing"
+IN_PROGRESS = "in_progress"
+ENDED = "ended"
+REPORTED = "reported"
+
+# Call statuses in lifecycle order; later callbacks never move a call back
+CALL_STATUS_RANK = {"queued": 0, "initiated": 1, "ringing": 2, "in-progress": 3, "answered": 3}
+# Terminal statuses of calls that were never answered
+UNANSWERED = ("no-answer", "busy", "failed", "canceled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS twilio_calls (
+    call_sid TEXT PRIMARY KEY,
+    context TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL,
+    call_status TEXT,
+    duration INTEGER,
+    recording_sid TEXT,
+    recording_url TEXT,
+    transcription_sid TEXT,
+    transcript TEXT,
+    analysis TEXT,
+    reason TEXT,
+    deadline REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    reported_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS twilio_calls_due ON twilio_calls (deadline) WHERE state = 'ended';
+"""
+
+
+@dataclass
+class TwilioCall:
+    call_sid: str
+    context: Dict
+    state: str
+    call_status: Optional[str] = None
+    duration: Optional[int] = None
+    recording_sid: Optional[str] = None
+    recording_url: Optional[str] = None
+    transcription_sid: Optional[str] = None
+    transcript: Optional[str] = None
+    analysis: Optional[Dict] = None
+    reason: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    reported_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def status_rank(status: Optional[str]) -> int:
+    if status is None:
+        return -1
+    return CALL_STATUS_RANK.get(status, 4)  # completed and the unanswered statuses are final
+
+
+def was_answered(call: TwilioCall) -> bool:
+    """
+    Whether the call was picked up. The transcription (or recording) callback
+    can beat the ``completed`` status, so a recording or transcript counts too.
+    """
+    if call.call_status in UNANSWERED:
+        return False
+    return (
+        status_rank(call.call_status) >= CALL_STATUS_RANK["in-progress"]
+        or bool(call.transcript or call.recording_url)
+    )
+
+
+class TwilioCallStore:
+    """SQLite store of Twilio call events (WAL, safe across threads and processes)"""
+
+    COLUMNS = (
+        "call_sid, context, state, call_status, duration, recording_sid, recording_url, transcription_sid,"
+        " transcript, analysis, reason, created_at, updated_at, reported_at"
+    )
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def update(self, call_sid: str, context: Dict, **fields) -> TwilioCall:
+        """
+        Record an event for a call (creating its row on the first one) and
+        return the call. ``call_status`` only moves forward; ``state`` and
+        ``deadline`` are not changed once the call is reported.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {self.COLUMNS}, deadline FROM twilio_calls WHERE call_sid = ?", (call_sid,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO twilio_calls (call_sid, context, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                        (call_sid, json.dumps(context), DIALING, now, now),
+                    )
+                    call, deadline = TwilioCall(call_sid, context, DIALING, created_at=now, updated_at=now), None
+                else:
+                    call, deadline = self._row(row[:-1]), row[-1]
+                    if context and not call.context:
+                        call.context = context
+
+                if "call_status" in fields and status_rank(fields["call_status"]) < status_rank(call.call_status):
+                    # A late callback for an earlier status: keep what we know
+                    for name in ("call_status", "state", "deadline"):
+                        fields.pop(name, None)
+                if call.state == REPORTED:
+                    fields.pop("state", None)
+                    fields.pop("deadline", None)
+                deadline = fields.pop("deadline", deadline)
+                for name, value in fields.items():
+                    if value is not None:
+                        setattr(call, name, value)
+                call.updated_at = now
+                self._conn.execute(
+                    "UPDATE twilio_calls SET context = ?, state = ?, call_status = ?, duration = ?, recording_sid = ?,"
+                    " recording_url = ?, transcription_sid = ?, transcript = ?, deadline = ?, updated_at = ?"
+                    " WHERE call_sid = ?",
+                    (
+                        json.dumps(call.context), call.state, call.call_status, call.duration, call.recording_sid,
+                        call.recording_url, call.transcription_sid, call.transcript, deadline, now, call_sid,
+                    ),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return call
+
+    def claim_report(self, call_sid: str, transcript: str, analysis: Dict, reason: str) -> bool:
+        """Mark a call reported; False if it already was (by this or another worker)"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE twilio_calls SET state = ?, transcript = ?, analysis = ?, reason = ?, deadline = NULL,"
+                " reported_at = ?, updated_at = ? WHERE call_sid = ? AND state != ?",
+                (REPORTED, transcript, json.dumps(analysis), reason, now, now, call_sid, REPORTED),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, call_sid: str) -> Optional[TwilioCall]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM twilio_calls WHERE call_sid = ?", (call_sid,)
+            ).fetchone()
+        return None if row is None else self._row(row)
+
+    def due(self, now: float, limit: int = 100) -> List[str]:
+        """Ended calls whose transcription wait has run out"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT call_sid FROM twilio_calls WHERE state = 'ended' AND deadline <= ? ORDER BY deadline LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM twilio_calls GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row(row) -> TwilioCall:
+        (call_sid, context, state, call_status, duration, recording_sid, recording_url, transcription_sid,
+         transcript, analysis, reason, created_at, updated_at, reported_at) = row
+        return TwilioCall(
+            call_sid=call_sid,
+            context=json.loads(context or "{}"),
+            state=state,
+            call_status=call_status,
+            duration=duration,
+            recording_sid=recording_sid,
+            recording_url=recording_url,
+            transcription_sid=transcription_sid,
+            transcript=transcript,
+            analysis=json.loads(analysis) if analysis else None,
+            reason=reason,
+            created_at=created_at,
+            updated_at=updated_at,
+            reported_at=reported_at,
+        )
+
+
+class TwilioPipeline:
+    """
+    ``analyze(transcript)`` returns the outcome analysis; ``report(call, picked)``
+    delivers a finalized call (backend outbox, archive). Both run once per call.
+    """
+
+    def __init__(
+        self,
+        store: TwilioCallStore,
+        analyze: Callable[[str], Dict],
+        report: Callable[[TwilioCall, bool], Awaitable[None]],
+        transcription_wait: float = 120.0,
+        sweep_interval: float = 5.0,
+    ):
+        self.store = store
+        self.analyze = analyze
+        self.report = report
+        self.transcription_wait = transcription_wait
+        self.sweep_interval = sweep_interval
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._events = 0
+        self._reported = 0
+        self._timed_out = 0
+
+    async def on_call_status(self, params: Dict[str, str], context: Dict) -> TwilioCall:
+        status = params.get("CallStatus")
+        duration = params.get("CallDuration")
+        fields: Dict = {"call_status": status, "duration": int(duration) if duration and duration.isdigit() else None}
+        if status in ("in-progress", "answered"):
+            fields["state"] = IN_PROGRESS
+        elif status == "completed":
+            # The transcription comes later; finalize without it if it never does
+            fields.update(state=ENDED, deadline=time.time() + self.transcription_wait)
+        call = await self._update(params["CallSid"], context, **fields)
+        if status in UNANSWERED:
+            await self._finalize(call, "", status)
+        return call
+
+    async def on_recording_status(self, params: Dict[str, str], context: Dict) -> TwilioCall:
+        status = params.get("RecordingStatus")
+        fields: Dict = {"recording_sid": params.get("RecordingSid"), "recording_url": params.get("RecordingUrl")}
+        call = await asyncio.to_thread(self.store.get, params["CallSid"])
+        if status == "completed" and call is not None and call.state == ENDED:
+            # Transcription starts once the recording is ready
+            fields["deadline"] = time.time() + self.transcription_wait
+        call = await self._update(params["CallSid"], context, **fields)
+        if status in ("absent", "failed"):
+            await self._finalize(call, call.transcript or "", f"recording_{status}")
+        return call
+
+    async def on_transcription(self, params: Dict[str, str], context: Dict) -> TwilioCall:
+        status = params.get("TranscriptionStatus")
+        text = (params.get("TranscriptionText") or "").strip() if status == "completed" else ""
+        call = await self._update(
+            params["CallSid"],
+            context,
+            transcription_sid=params.get("TranscriptionSid"),
+            recording_sid=params.get("RecordingSid"),
+            recording_url=params.get("RecordingUrl"),
+            transcript=text or None,
+        )
+        await self._finalize(call, text, "transcribed" if status == "completed" else f"transcription_{status}")
+        return call
+
+    async def wait(self, call_sid: str, timeout: float) -> Optional[TwilioCall]:
+        """The call once it is reported, or as it stands after ``timeout`` seconds"""
+        deadline = time.monotonic() + timeout
+        # One event per waiter: a waiter leaving must not strand the others
+        event = asyncio.Event()
+        self._waiters.setdefault(call_sid, set()).add(event)
+        try:
+            while True:
+                call = await asyncio.to_thread(self.store.get, call_sid)
+                remaining = deadline - time.monotonic()
+                if (call is not None and call.state == REPORTED) or remaining <= 0:
+                    return call
+                try:
+                    # Re-read the store at least every second: another worker may report it
+                    await asyncio.wait_for(event.wait(), timeout=min(remaining, 1.0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            events = self._waiters.get(call_sid)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[call_sid]
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def stats(self) -> Dict:
+        return {
+            "calls": await asyncio.to_thread(self.store.counts),
+            "events_total": self._events,
+            "reported_total": self._reported,
+            "timed_out_total": self._timed_out,
+            "waiting": sum(len(events) for events in self._waiters.values()),
+        }
+
+    async def _update(self, call_sid: str, context: Dict, **fields) -> TwilioCall:
+        self._events += 1
+        # SQLite calls (BEGIN IMMEDIATE may wait on other workers) run off the event loop
+        return await asyncio.to_thread(self.store.update, call_sid, context, **fields)
+
+    async def _finalize(self, call: TwilioCall, transcript: str, reason: str):
+        analysis = self.analyze(transcript)
+        if not await asyncio.to_thread(self.store.claim_report, call.call_sid, transcript, analysis, reason):
+            return
+        self._reported += 1
+        call.state, call.transcript, call.analysis, call.reason = REPORTED, transcript, analysis, reason
+        logger.info(f"Twilio call {call.call_sid} finalized ({reason}): {analysis.get('outcome')}")
+        try:
+            await self.report(call, was_answered(call))
+        except Exception as e:
+            logger.error(f"Error reporting Twilio call {call.call_sid}: {e}")
+        for event in self._waiters.get(call.call_sid, ()):
+            event.set()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                for call_sid in await asyncio.to_thread(self.store.due, time.time()):
+                    call = await asyncio.to_thread(self.store.get, call_sid)
+                    if call is not None:
+                        self._timed_out += 1
+                        await self._finalize(call, call.transcript or "", "transcription_timeout")
+            except Exception as e:
+                logger.error(f"Twilio call sweep failed: {e}")
@@ -0,0 +1,76 @@
+import os
+import sys
+
+import httpx
+import pytest
+
+# Service modules import each other from the FastAPI directory ("from utils...")
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVICE_DIR not in sys.path:
+    sys.path.insert(0, SERVICE_DIR)
+
+
+class Upstream:
+    """Stand-in for every upstream HTTP API: records requests and answers them with ``respond``"""
+
+    def __init__(self):
+        self.requests = []
+        self.respond = self.default
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return self.respond(request)
+
+    def reset(self):
+        self.requests.clear()
+        self.respond = self.default
+
+    def calls_to(self, suffix: str) -> int:
+        return sum(1 for request in self.requests if request.url.path.endswith(suffix))
+
+    @staticmethod
+    def default(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/outbound-call"):
+            return httpx.Response(200, json={"conversation_id": f"conv-{os.urandom(4).hex()}"})
+        return httpx.Response(200, json={"status": "in-progress", "transcript": []})
+
+
+@pytest.fixture(scope="session")
+def service(tmp_path_factory):
+    """
+    The FastAPI app, started once per session over scratch stores, with
+    upstream HTTP answered by an ``Upstream``. Yields ``(client, upstream)``.
+    """
+    scratch = tmp_path_factory.mktemp("service")
+    os.environ.update(
+        DATABASE_URL="test",
+        AWS_COGNITO_REGION="test",
+        ELEVENLABS_API_KEY="test",
+        ELEVENLABS_AGENT_ID="agent",
+        ELEVENLABS_PHONE_ID="phone",
+        ELEVENLABS_WEBHOOK_SECRET="whsec-test",
+        TWILIO_AUTH_TOKEN="twilio-test",
+        OUTBOX_PATH=str(scratch / "outbox.sqlite3"),
+        CALL_REGISTRY_PATH=str(scratch / "calls.sqlite3"),
+        IDEMPOTENCY_PATH=str(scratch / "idempotency.sqlite3"),
+        RECORDING_CACHE_DIR=str(scratch / "recordings"),
+        ARCHIVE_DIR=str(scratch / "archive"),
+        SEARCH_INDEX_PATH=str(scratch / "search.sqlite3"),
+        TWILIO_CALLS_PATH=str(scratch / "twilio_calls.sqlite3"),
+    )
+    from fastapi.testclient import TestClient
+
+    from app import app
+    from utils import http_client
+
+    upstream = Upstream()
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    with TestClient(app) as client:
+        yield client, upstream
+
+
+@pytest.fixture
+def api(service):
+    client, upstream = service
+    upstream.reset()
+    return client, upstream
@@ -0,0 +1,88 @@
+import asyncio
+
+from services.call_monitor import CallMonitor
+
+TERMINAL = ("done", "failed")
+
+
+def make_monitor(statuses, finished, **kwargs):
+    """A fast-polling monitor whose fetch returns ``statuses`` in turn (the last one repeats)"""
+    polls = []
+
+    async def fetch(call_id):
+        polls.append(call_id)
+        return {"status": statuses[min(len(polls), len(statuses)) - 1]}
+
+    async def on_finished(call_id, context, details):
+        finished.append((call_id, context, details))
+
+    options = dict(expected_duration=0.0, min_interval=0.01, max_interval=0.01, max_wait=5.0)
+    options.update(kwargs)
+    return CallMonitor(fetch, on_finished, TERMINAL, **options), polls
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_next_interval_tightens_toward_expected_end():
+    monitor = CallMonitor(None, None, TERMINAL, expected_duration=120, min_interval=5, max_interval=30, max_wait=300)
+    assert monitor.next_interval(0) == 30
+    assert monitor.next_interval(100) == 10
+    assert monitor.next_interval(200) == 5
+    assert monitor.next_interval(298) == 2  # never past max_wait
+
+
+def test_fallback_interval_waits_for_expected_end():
+    monitor = CallMonitor(None, None, TERMINAL, expected_duration=120, fallback_interval=60, max_wait=300)
+    assert monitor.next_interval(0) == 120
+    assert monitor.next_interval(130) == 60
+
+
+def test_polls_until_terminal_and_finishes_once():
+    async def scenario():
+        finished = []
+        monitor, polls = make_monitor(["in-progress", "in-progress", "done"], finished)
+        monitor.watch("c1", {"campaignId": 1})
+        await wait_for(lambda: finished)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return finished, polls, monitor
+
+    finished, polls, monitor = asyncio.run(scenario())
+    assert finished == [("c1", {"campaignId": 1}, {"status": "done"})]
+    assert len(polls) == 3
+    assert monitor.is_finished("c1") and not monitor.is_watching("c1")
+
+
+def test_timeout_finalizes_with_last_details():
+    async def scenario():
+        finished = []
+        monitor, _ = make_monitor(["in-progress"], finished, max_wait=0.05)
+        monitor.watch("c1")
+        await wait_for(lambda: finished)
+        await monitor.stop()
+        return finished, monitor.stats()
+
+    finished, stats = asyncio.run(scenario())
+    assert finished == [("c1", {}, {"status": "in-progress"})]
+    assert stats["timed_out_total"] == 1
+
+
+def test_complete_finalizes_immediately_and_only_once():
+    async def scenario():
+        finished = []
+        monitor, polls = make_monitor(["in-progress"], finished, expected_duration=60, min_interval=30, max_interval=30)
+        monitor.watch("c1")
+        first = await monitor.complete("c1", {"status": "done", "transcript": "hi"})
+        second = await monitor.complete("c1", {"status": "done"})
+        await monitor.stop()
+        return finished, polls, first, second
+
+    finished, polls, first, second = asyncio.run(scenario())
+    assert (first, second) == (True, False)
+    assert finished == [("c1", {}, {"status": "done", "transcript": "hi"})]
+    assert polls == []
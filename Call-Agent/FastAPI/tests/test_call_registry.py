@@ -0,0 +1,147 @@
+import asyncio
+import time
+
+import pytest
+
+from services.call_monitor import CallMonitor
+from services.call_registry import ACTIVE, FINISHED, CallRegistry
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "calls.sqlite3")
+
+
+def registry(path, owner, lease=30.0):
+    return CallRegistry(path, owner=owner, lease=lease)
+
+
+def test_add_schedule_finish(path):
+    a = registry(path, "a")
+    assert a.add("c1", {"campaignId": 1}, time.time(), time.time() + 5)
+    assert not a.add("c1", {}, time.time(), time.time())  # already known
+    assert a.schedule("c1", "in-progress", 1, time.time() + 5)
+    assert a.finish("c1", "terminal", "done", 2, {"outcome": "interested"})
+    assert not a.finish("c1", "terminal", "done")
+
+    record = a.get("c1")
+    assert (record.state, record.status, record.polls, record.result) == (FINISHED, "done", 2, {"outcome": "interested"})
+    assert record.context == {"campaignId": 1}
+    assert not a.schedule("c1", "done", 3, time.time())  # finished calls are not rescheduled
+    assert a.finished(["c1", "unknown"]) == ["c1"]
+
+
+def test_released_calls_are_resumed_by_the_next_process(path):
+    a = registry(path, "a")
+    a.add("c1", {"campaignId": 1}, time.time(), time.time())
+    a.schedule("c1", "in-progress", 3, time.time())
+    assert a.release() == 1
+    a.close()
+
+    b = registry(path, "b")
+    [record] = b.claim(10)
+    assert (record.call_id, record.state, record.status, record.polls) == ("c1", ACTIVE, "in-progress", 3)
+    assert b.get("c1").owner == "b"
+
+
+def test_monitor_resumes_registered_calls_after_restart(path):
+    def make_monitor(owner, statuses):
+        finished = []
+
+        async def fetch(call_id):
+            return {"status": statuses.pop(0) if len(statuses) > 1 else statuses[0]}
+
+        async def on_finished(call_id, context, details):
+            finished.append((call_id, context, details["status"]))
+            return {"outcome": "interested"}
+
+        monitor = CallMonitor(
+            fetch, on_finished, ("done",), expected_duration=0.0, min_interval=0.01, max_interval=0.01,
+            registry=registry(path, owner),
+        )
+        return monitor, finished
+
+    async def first_process():
+        monitor, _ = make_monitor("a", ["in-progress"])
+        monitor.watch("c1", {"campaignId": 7})
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        monitor.registry.close()
+
+    async def second_process():
+        monitor, finished = make_monitor("b", ["done"])
+        monitor.start()
+        for _ in range(200):
+            if finished:
+                break
+            await asyncio.sleep(0.01)
+        await monitor.stop()
+        return finished, monitor.registry.get("c1")
+
+    asyncio.run(first_process())
+    finished, record = asyncio.run(second_process())
+    assert finished == [("c1", {"campaignId": 7}, "done")]
+    assert (record.state, record.result) == (FINISHED, {"outcome": "interested"})
+
+
+def test_live_leases_are_not_claimed(path):
+    a, b = registry(path, "a"), registry(path, "b")
+    a.add("c1", {}, time.time(), time.time())
+    assert b.claim(10) == []
+    assert not b.schedule("c1", "in-progress", 1, time.time())  # b does not hold it
+
+
+def test_lapsed_leases_are_claimed_and_renewed_ones_are_kept(path):
+    a, b = registry(path, "a", lease=0.05), registry(path, "b", lease=0.05)
+    a.add("c1", {}, time.time(), time.time())
+    a.add("c2", {}, time.time(), time.time() + 1)
+    time.sleep(0.1)
+    assert a.renew() == 2
+    assert b.claim(10) == []
+    time.sleep(0.1)
+    assert [record.call_id for record in b.claim(1)] == ["c1"]  # earliest due first
+    assert b.get("c1").owner == "b"
+    assert not a.schedule("c1", "in-progress", 1, time.time())  # a lost it
+
+
+def test_shed_gives_back_latest_due_calls(path):
+    a, b = registry(path, "a"), registry(path, "b")
+    for index in range(3):
+        a.add(f"c{index}", {}, time.time(), time.time() + index)
+    assert sorted(a.shed(2)) == ["c1", "c2"]
+    assert sorted(record.call_id for record in b.claim(10)) == ["c1", "c2"]
+    assert a.counts() == {"active": 3, "owned": 1, "unowned": 0}
+
+
+def test_claim_finish_is_granted_once(path):
+    a, b = registry(path, "a"), registry(path, "b")
+    a.add("c1", {}, time.time(), time.time())
+    assert not b.claim_finish("c1")  # held by a
+    assert b.claim_finish("c1", any_owner=True)  # a webhook on b
+    assert not a.claim_finish("c1")
+    assert not a.claim_finish("c1", any_owner=True)
+    assert b.get("c1").owner == "b"
+    assert b.finish("c1", "webhook", "done")
+    assert not b.claim_finish("c1", any_owner=True)
+
+
+def test_finalizing_call_of_a_dead_worker_is_reported_again(path):
+    a, b = registry(path, "a", lease=0.05), registry(path, "b", lease=0.05)
+    a.add("c1", {}, time.time(), time.time())
+    assert a.claim_finish("c1")
+    assert b.claim(10) == []  # a is still reporting it
+    time.sleep(0.1)  # a died mid-report
+    [record] = b.claim(10)
+    assert (record.call_id, record.state) == ("c1", ACTIVE)
+    assert b.claim_finish("c1")
+    assert b.finish("c1", "terminal", "done")
+
+
+def test_release_returns_finalizing_calls_to_monitoring(path):
+    a, b = registry(path, "a"), registry(path, "b")
+    a.add("c1", {}, time.time(), time.time())
+    a.claim_finish("c1")
+    a.release()
+    [record] = b.claim(10)
+    assert (record.call_id, record.state) == ("c1", ACTIVE)
+    assert b.get("c1").owner == "b"
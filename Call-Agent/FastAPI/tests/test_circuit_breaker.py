@@ -0,0 +1,164 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, Endpoint
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def make_breaker(clock, **kwargs):
+    options = dict(window=30, window_calls=10, min_calls=4, failure_rate=0.5, slow_call=1.0, slow_rate=0.8,
+                   open_seconds=10, max_open_seconds=40, half_open_probes=2)
+    options.update(kwargs)
+    changes = []
+    return CircuitBreaker("test", on_change=changes.append, clock=clock, **options), changes
+
+
+def fail(breaker, count, seconds=0.1):
+    for _ in range(count):
+        breaker.record(True, seconds, breaker.allow())
+
+
+def succeed(breaker, count, seconds=0.1):
+    for _ in range(count):
+        breaker.record(False, seconds, breaker.allow())
+
+
+def test_stays_closed_below_min_calls_and_failure_rate(clock):
+    breaker, changes = make_breaker(clock)
+    fail(breaker, 3)
+    assert breaker.state == CLOSED  # under min_calls
+    breaker, changes = make_breaker(clock)
+    succeed(breaker, 4)
+    fail(breaker, 3)
+    assert breaker.state == CLOSED  # 3 of 7 failed
+    assert changes == []
+
+
+def test_opens_on_failure_rate_and_rejects(clock):
+    breaker, changes = make_breaker(clock)
+    succeed(breaker, 2)
+    fail(breaker, 2)
+    assert breaker.state == OPEN and changes == [OPEN]
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.allow()
+    assert rejected.value.retry_after == 10
+    assert breaker.stats()["rejected_total"] == 1
+
+
+def test_opens_on_slow_calls(clock):
+    breaker, _ = make_breaker(clock)
+    succeed(breaker, 4, seconds=2.0)
+    assert breaker.state == OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker, _ = make_breaker(clock)
+    fail(breaker, 3)
+    clock.now += 31
+    succeed(breaker, 3)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probes_close_the_breaker(clock):
+    breaker, changes = make_breaker(clock)
+    fail(breaker, 4)
+    clock.now += 10
+    assert breaker.allow() is True and breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+    with pytest.raises(CircuitOpen):
+        breaker.allow()  # only half_open_probes at a time
+    breaker.record(False, 0.1, probe=True)
+    breaker.record(False, 0.1, probe=True)
+    assert breaker.state == CLOSED
+    assert changes == [OPEN, HALF_OPEN, CLOSED]
+    assert breaker.allow() is False
+
+
+def test_failed_probe_reopens_with_backoff(clock):
+    breaker, changes = make_breaker(clock)
+    fail(breaker, 4)
+    for expected in (20, 40, 40):  # doubled each time, up to max_open_seconds
+        clock.now += 100
+        breaker.record(True, 0.1, probe=breaker.allow())
+        assert breaker.state == OPEN
+        assert breaker.retry_after() == expected
+    clock.now += 40
+    succeed(breaker, 2)
+    assert breaker.state == CLOSED
+    fail(breaker, 4)
+    assert breaker.retry_after() == 10  # backoff resets once closed
+
+
+def test_cancelled_probe_frees_its_slot(clock):
+    breaker, _ = make_breaker(clock, half_open_probes=1)
+    fail(breaker, 4)
+    clock.now += 10
+    breaker.cancel(breaker.allow())
+    assert breaker.allow() is True
+
+
+def test_endpoint_records_failures_and_fails_fast():
+    endpoint = Endpoint("test", "fail_fast", min_calls=2, failure_rate=0.5, open_seconds=60)
+    sent = []
+
+    async def send():
+        sent.append(1)
+        return httpx.Response(503)
+
+    async def scenario():
+        for _ in range(2):
+            assert (await endpoint.request(send)).status_code == 503
+        with pytest.raises(CircuitOpen):
+            await endpoint.request(send)
+
+    asyncio.run(scenario())
+    assert len(sent) == 2
+    assert endpoint.stats()["state"] == OPEN
+
+
+def test_client_errors_do_not_count_as_failures():
+    endpoint = Endpoint("test", "client_errors", min_calls=2, failure_rate=0.5)
+
+    async def send():
+        return httpx.Response(404)
+
+    async def scenario():
+        for _ in range(5):
+            await endpoint.request(send)
+
+    asyncio.run(scenario())
+    assert endpoint.stats()["state"] == CLOSED
+
+
+def test_slow_reads_are_hedged_and_the_faster_answer_wins():
+    endpoint = Endpoint("test", "hedged", hedge=True, hedge_min_delay=0.01, hedge_ratio=1.0, hedge_min_samples=5)
+    delays = [0.001] * 5 + [0.5, 0.001]
+
+    async def send():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"delay": delay})
+
+    async def scenario():
+        for _ in range(5):
+            await endpoint.request(send)  # warm up the latency samples
+        return await endpoint.request(send)
+
+    response = asyncio.run(scenario())
+    assert response.json() == {"delay": 0.001}
+    stats = endpoint.stats()
+    assert (stats["hedged_total"], stats["hedge_wins_total"]) == (1, 1)
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from services.dial_queue import DialQueue, QueueFull
+
+LINE = ("agent", "phone")
+
+
+def leads(count, priority=0, start=0):
+    return [{"phone": f"+1{start + i}", "name": "n", "company": "c", "priority": priority} for i in range(count)]
+
+
+class Dialer:
+    """Dial stand-in: records each job and answers with ``results`` in turn (success once they run out)"""
+
+    def __init__(self, results=()):
+        self.dialed = []
+        self.results = list(results)
+
+    async def __call__(self, job):
+        self.dialed.append(job.phone)
+        if self.results:
+            return self.results.pop(0)
+        return {"success": True, "call_id": f"call-{job.phone}"}
+
+
+def test_caps_live_calls_per_line_and_frees_slots_on_release():
+    async def scenario():
+        dialer = Dialer()
+        queue = DialQueue(dialer, max_concurrent_per_line=2)
+        jobs = queue.submit(leads(5), LINE)
+        await asyncio.sleep(0.01)
+        first = list(dialer.dialed)
+        queue.release(jobs[0].call_id)
+        await asyncio.sleep(0.01)
+        stats = queue.stats()
+        await queue.stop()
+        return first, dialer.dialed, jobs, stats
+
+    first, dialed, jobs, stats = asyncio.run(scenario())
+    assert first == ["+10", "+11"]
+    assert dialed == ["+10", "+11", "+12"]
+    assert [job.status for job in jobs] == ["completed", "in_call", "in_call", "failed", "failed"]
+    assert stats["lines"][0]["active"] == 2 and stats["lines"][0]["queued"] == 2
+
+
+def test_lines_do_not_block_each_other():
+    async def scenario():
+        dialer = Dialer()
+        queue = DialQueue(dialer, max_concurrent_per_line=1)
+        queue.submit(leads(3), LINE)
+        queue.submit(leads(1, start=10), ("agent", "other"))
+        await asyncio.sleep(0.01)
+        await queue.stop()
+        return dialer.dialed
+
+    assert asyncio.run(scenario()) == ["+10", "+110"]
+
+
+def test_higher_priority_dials_first_and_fifo_within_a_priority():
+    async def scenario():
+        dialer = Dialer()
+        queue = DialQueue(dialer, max_concurrent_per_line=1)
+        queue.submit(leads(1, start=99), LINE)
+        queue.submit(leads(2, priority=0), LINE)
+        queue.submit(leads(2, priority=5, start=10), LINE)
+        await asyncio.sleep(0.01)
+        for _ in range(4):
+            call_id = f"call-{dialer.dialed[-1]}"
+            queue.release(call_id)
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return dialer.dialed
+
+    dialed = asyncio.run(scenario())
+    assert dialed == ["+199", "+110", "+111", "+10", "+11"]
+
+
+def test_full_queue_rejects_the_whole_batch():
+    async def scenario():
+        queue = DialQueue(Dialer(), max_queued=2, max_concurrent_per_line=1, expected_call_duration=60)
+        queue.submit(leads(2), LINE)
+        with pytest.raises(QueueFull) as rejected:
+            queue.submit(leads(3, start=5), LINE)
+        stats = queue.stats()
+        await queue.stop()
+        return rejected.value, stats
+
+    rejected, stats = asyncio.run(scenario())
+    assert rejected.retry_after == 120
+    assert stats["queued"] == 1
+
+
+def test_failed_dial_frees_the_slot():
+    async def scenario():
+        dialer = Dialer([{"success": False, "error": "bad number"}])
+        queue = DialQueue(dialer, max_concurrent_per_line=1)
+        jobs = queue.submit(leads(2), LINE)
+        await asyncio.sleep(0.01)
+        await queue.stop()
+        return jobs
+
+    failed, dialed = asyncio.run(scenario())
+    assert (failed.status, failed.error) == ("failed", "bad number")
+    assert dialed.status == "in_call"
+
+
+def test_refused_dial_waits_in_place_and_pauses_the_line():
+    async def scenario():
+        dialer = Dialer([{"success": False, "error": "circuit open", "retry_after": 0.05}])
+        queue = DialQueue(dialer, max_concurrent_per_line=2)
+        jobs = queue.submit(leads(3), LINE)
+        await asyncio.sleep(0.01)
+        waiting = (jobs[0].status, queue.stats()["lines"][0]["paused"])
+        await asyncio.sleep(0.1)
+        await queue.stop()
+        return waiting, jobs, dialer.dialed
+
+    waiting, jobs, dialed = asyncio.run(scenario())
+    assert waiting == ("waiting", True)
+    # The refused lead is redialed first once the line resumes; the one behind it never got a slot
+    assert dialed == ["+10", "+11", "+10"]
+    assert [job.status for job in jobs] == ["in_call", "in_call", "failed"]
+
+
+def test_calls_finalized_elsewhere_are_reconciled():
+    async def scenario():
+        async def finished_calls(call_ids):
+            return [call_id for call_id in call_ids if call_id == "call-+10"]
+
+        queue = DialQueue(Dialer(), max_concurrent_per_line=1, finished_calls=finished_calls, reconcile_interval=0.02)
+        jobs = queue.submit(leads(2), LINE)
+        await asyncio.sleep(0.1)
+        stats = queue.stats()
+        await queue.stop()
+        return jobs, stats
+
+    jobs, stats = asyncio.run(scenario())
+    assert [job.status for job in jobs] == ["completed", "in_call"]
+    assert stats["reconciled_total"] == 1
+
+
+def test_stop_discards_undialed_jobs_and_renews_queued_ones():
+    async def scenario():
+        renewed, discarded = [], []
+
+        async def renew(jobs):
+            renewed.append(sorted(job.phone for job in jobs))
+
+        async def discard(jobs):
+            discarded.extend(job.phone for job in jobs)
+
+        queue = DialQueue(
+            Dialer(), max_concurrent_per_line=1, reconcile_interval=0.02, renew_queued=renew, on_discarded=discard,
+        )
+        jobs = queue.submit(leads(3), LINE)
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        return jobs, renewed, discarded, queue.stats()
+
+    jobs, renewed, discarded, stats = asyncio.run(scenario())
+    assert renewed and renewed[0] == ["+11", "+12"]
+    assert sorted(discarded) == ["+11", "+12"]
+    assert [job.status for job in jobs] == ["in_call", "failed", "failed"]
+    assert stats["queued"] == 0
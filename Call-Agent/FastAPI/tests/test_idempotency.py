@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from services.idempotency import (
+    Idempotency,
+    IdempotencyConflict,
+    IdempotencyInProgress,
+    IdempotencyStore,
+    fingerprint,
+    lead_key,
+)
+
+
+@pytest.fixture
+def idempotency(tmp_path):
+    return Idempotency(IdempotencyStore(str(tmp_path / "keys.sqlite3")), wait=0.5, poll_interval=0.01)
+
+
+def counting_handler(response):
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return response
+
+    return handler, calls
+
+
+def test_repeat_replays_the_stored_response(idempotency):
+    handler, calls = counting_handler({"success": True, "call_id": "c1"})
+    first = asyncio.run(idempotency.run("k", fingerprint({"a": 1}), handler))
+    second = asyncio.run(idempotency.run("k", fingerprint({"a": 1}), handler))
+    assert first == ({"success": True, "call_id": "c1"}, False)
+    assert second == ({"success": True, "call_id": "c1"}, True)
+    assert len(calls) == 1
+
+
+def test_key_reused_for_another_body_conflicts(idempotency):
+    handler, _ = counting_handler({"success": True})
+    asyncio.run(idempotency.run("k", fingerprint({"a": 1}), handler))
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(idempotency.run("k", fingerprint({"a": 2}), handler))
+
+
+def test_failures_free_the_key(idempotency):
+    handler, calls = counting_handler({"success": False, "error": "busy"})
+    asyncio.run(idempotency.run("k", None, handler))
+    asyncio.run(idempotency.run("k", None, handler))
+    assert len(calls) == 2
+
+    async def boom():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(idempotency.run("k2", None, boom))
+    assert idempotency.store.get("k2") is None
+
+
+def test_concurrent_repeat_waits_for_the_original(idempotency):
+    async def scenario():
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {"success": True, "call_id": "c1"}
+
+        results = await asyncio.gather(idempotency.run("k", None, slow), idempotency.run("k", None, slow))
+        return results, calls
+
+    results, calls = asyncio.run(scenario())
+    assert sorted(replayed for _, replayed in results) == [False, True]
+    assert all(response == {"success": True, "call_id": "c1"} for response, _ in results)
+    assert len(calls) == 1
+
+
+def test_repeat_gives_up_while_the_original_is_still_running(idempotency):
+    async def scenario():
+        async def slow():
+            await asyncio.sleep(1)
+            return {"success": True}
+
+        original = asyncio.ensure_future(idempotency.run("k", None, slow))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(IdempotencyInProgress):
+                await idempotency.run("k", None, slow)
+        finally:
+            original.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_lead_keys_expire_after_lead_ttl_unless_renewed(tmp_path):
+    idempotency = Idempotency(IdempotencyStore(str(tmp_path / "keys.sqlite3")), lead_ttl=0.1)
+    key = lead_key("+1555", {"campaignId": 3, "contactId": 9})
+    assert key == "lead:3:9"
+    assert lead_key("+1555", {}) is None
+    for k in (key, "lead:3:10"):
+        idempotency.claim(k)
+        idempotency.complete(k, {"success": True, "status": "queued"})
+    time.sleep(0.06)
+    assert idempotency.renew([key]) == 1
+    time.sleep(0.06)
+    assert idempotency.store.get(key) is not None
+    assert idempotency.store.get("lead:3:10") is None
+
+
+LEAD = {"phone": "+15550001", "name": "Ada", "company": "Acme", "context": {"campaignId": "c1", "contactId": "7"}}
+
+
+def test_call_with_key_replays_and_rejects_another_body(api):
+    client, upstream = api
+    headers = {"Idempotency-Key": "dial-1"}
+    first = client.post("/api/agent/call", json=LEAD, headers=headers)
+    second = client.post("/api/agent/call", json=LEAD, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert upstream.calls_to("/outbound-call") == 1
+
+    conflict = client.post("/api/agent/call", json={**LEAD, "name": "Bob"}, headers=headers)
+    assert conflict.status_code == 422
+    assert upstream.calls_to("/outbound-call") == 1
+
+
+def test_call_without_key_dedupes_on_the_lead(api):
+    client, upstream = api
+    lead = {**LEAD, "context": {"campaignId": "c2", "contactId": "8"}}
+    first = client.post("/api/agent/call", json=lead)
+    second = client.post("/api/agent/call", json={**lead, "name": "Renamed"})
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json()["call_id"] == first.json()["call_id"]
+    assert upstream.calls_to("/outbound-call") == 1
+
+
+def test_failed_dial_can_be_retried(api):
+    client, upstream = api
+    lead = {**LEAD, "context": {"campaignId": "c3", "contactId": "9"}}
+    upstream.respond = lambda request: httpx.Response(400, json={"detail": "bad number"})
+    assert client.post("/api/agent/call", json=lead).json()["success"] is False
+    upstream.reset()
+    retried = client.post("/api/agent/call", json=lead)
+    assert retried.json()["success"] is True
+    assert "Idempotent-Replayed" not in retried.headers
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from utils.outbox import Outbox, OutboxStore, retry_delay
+
+
+class Backend:
+    """``post`` stand-in answering from per-URL scripts (200 once a script runs out)"""
+
+    def __init__(self, **scripts):
+        self.scripts = {url: list(results) for url, results in scripts.items()}
+        self.requests = []
+
+    def __call__(self, url, body):
+        self.requests.append((url, body))
+        script = self.scripts.get(url)
+        result = script.pop(0) if script else 200
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def post(self, url, body):
+        return self(url, body)
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+
+def deliver(outbox, backend):
+    async def scenario():
+        outbox.start(backend.post)
+        for _ in range(200):
+            if not outbox.store.counts()["pending"]:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(scenario())
+
+
+def test_retry_delay_is_capped_and_jittered():
+    for attempts in range(1, 40):
+        step = min(60.0, 2.0 ** (attempts - 1))
+        assert step / 2 <= retry_delay(attempts, 1.0, 60.0) <= step
+
+
+def test_claimed_rows_are_leased(spool):
+    store = OutboxStore(spool)
+    ids = [store.add({"call_id": f"c{i}"}) for i in range(3)]
+    first = store.claim(2, lease=60)
+    second = store.claim(10, lease=60)
+    assert [m.id for m in first] == ids[:2]
+    assert [m.id for m in second] == ids[2:]
+    assert store.claim(10, lease=60) == []
+    store.close()
+
+
+def test_spooled_outcomes_survive_a_restart(spool):
+    Outbox(spool, "https://backend/outcome").enqueue({"call_id": "c1"})
+    backend = Backend()
+    outbox = Outbox(spool, "https://backend/outcome")
+    deliver(outbox, backend)
+    assert backend.requests == [("https://backend/outcome", {"call_id": "c1"})]
+    assert outbox.stats()["delivered_total"] == 1
+
+
+def test_failures_are_retried_and_client_errors_buried(spool):
+    backend = Backend(**{"https://backend/outcome": [503, ConnectionError("reset")]})
+    outbox = Outbox(spool, "https://backend/outcome", retry_base=0.01, retry_max=0.01)
+    outbox.enqueue({"call_id": "retried"})
+    deliver(outbox, backend)
+    stats = outbox.stats()
+    assert [body["call_id"] for _, body in backend.requests] == ["retried"] * 3
+    assert (stats["delivered_total"], stats["failed_attempts_total"], stats["backlog"]) == (1, 2, 0)
+
+    backend = Backend(**{"https://backend/outcome": [422]})
+    outbox.enqueue({"call_id": "rejected"})
+    deliver(outbox, backend)
+    stats = outbox.stats()
+    assert len(backend.requests) == 1
+    assert (stats["dead"], stats["dead_total"], stats["backlog"]) == (1, 1, 0)
+
+
+def test_max_attempts_buries_retryable_failures(spool):
+    backend = Backend(**{"https://backend/outcome": [429] * 10})
+    outbox = Outbox(spool, "https://backend/outcome", retry_base=0.01, retry_max=0.01, max_attempts=3)
+    outbox.enqueue({"call_id": "c1"})
+    deliver(outbox, backend)
+    assert len(backend.requests) == 3
+    assert outbox.stats()["dead"] == 1
+
+
+def test_batches_and_falls_back_when_the_batch_endpoint_is_missing(spool):
+    backend = Backend()
+    outbox = Outbox(spool, "https://backend/outcome", batch_url="https://backend/outcomes", batch_size=10)
+    for i in range(3):
+        outbox.enqueue({"call_id": f"c{i}"})
+    deliver(outbox, backend)
+    assert backend.requests == [("https://backend/outcomes", {"outcomes": [{"call_id": f"c{i}"} for i in range(3)]})]
+
+    backend = Backend(**{"https://backend/outcomes": [404]})
+    for i in range(2):
+        outbox.enqueue({"call_id": f"d{i}"})
+    deliver(outbox, backend)
+    assert [url for url, _ in backend.requests] == ["https://backend/outcomes"] + ["https://backend/outcome"] * 2
+    assert outbox.batch_url is None
+    assert outbox.stats()["delivered_total"] == 5
+
+
+def test_thread_delivery_and_flush(spool):
+    backend = Backend(**{"https://backend/outcome": [500]})
+    outbox = Outbox(spool, "https://backend/outcome", retry_base=0.01, retry_max=0.01)
+    outbox.start_thread(backend)
+    for i in range(3):
+        outbox.enqueue({"call_id": f"c{i}"})
+    assert outbox.flush(timeout=5)
+    outbox.stop_thread()
+    assert sorted(body["call_id"] for url, body in backend.requests) == ["c0", "c0", "c1", "c2"]
+    assert outbox.stats()["backlog"] == 0
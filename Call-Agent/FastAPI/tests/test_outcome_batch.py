@@ -0,0 +1,46 @@
+import json
+import random
+
+import pytest
+
+from utils import outcome_batch
+from utils.outcome_batch import classify_batch
+from utils.outcome_classifier import OutcomeClassifier
+
+pytest.importorskip("numpy")
+
+PHRASES = [
+    "yes", "no", "not interested", "call back", "maybe later", "sounds good", "busy now", "busy",
+    "don't", "want to", "next week", "know", "nothing", "hello", "who is this", "sure",
+]
+
+
+def transcripts(count, seed=7):
+    rng = random.Random(seed)
+    texts = ["", "   ", "ok", "short one"]
+    while len(texts) < count:
+        words = [rng.choice(PHRASES) for _ in range(rng.randint(1, 8))]
+        texts.append(("  " if rng.random() < 0.2 else ", ").join(words).capitalize())
+    return texts
+
+
+def test_batch_matches_single_classification():
+    texts = transcripts(2000)
+    classifier = OutcomeClassifier.from_file()
+    assert classify_batch(texts) == [classifier.classify(text) for text in texts]
+
+
+def test_process_pool_matches_single_classification(monkeypatch):
+    monkeypatch.setattr(outcome_batch, "CHUNK_SIZE", 100)
+    texts = transcripts(450, seed=11)
+    classifier = OutcomeClassifier.from_file()
+    assert classify_batch(texts, workers=2) == [classifier.classify(text) for text in texts]
+
+
+def test_custom_keyword_file(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps({"positive": ["banana"], "negative": [], "callback": []}))
+    assert [r["outcome"] for r in classify_batch(["I would like a banana", "yes yes yes yes"], str(path))] == [
+        "interested",
+        "unclear",
+    ]
@@ -0,0 +1,58 @@
+import pytest
+
+from utils.outcome_classifier import OutcomeClassifier
+
+KEYWORDS = {
+    "positive": ["yes", "interested", "sounds good", "want to"],
+    "negative": ["no", "not interested", "don't"],
+    "callback": ["call back", "later", "maybe later"],
+}
+
+
+@pytest.fixture
+def classifier():
+    return OutcomeClassifier(KEYWORDS)
+
+
+def test_matches_whole_words_only(classifier):
+    assert classifier.matched_phrases("I know, yesterday was nothing") == set()
+    assert classifier.matched_phrases("Yes, no.") == {"yes", "no"}
+
+
+def test_longest_phrase_wins(classifier):
+    assert classifier.scores("I'm not interested") == {"positive": 0, "negative": 1, "callback": 0}
+    assert classifier.matched_phrases("maybe later please") == {"maybe later"}
+
+
+def test_phrases_match_across_irregular_spacing_and_case(classifier):
+    assert classifier.matched_phrases("It SOUNDS   good, call\nback tomorrow") == {"sounds good", "call back"}
+
+
+def test_counts_distinct_keywords(classifier):
+    assert classifier.scores("yes yes yes, no") == {"positive": 1, "negative": 1, "callback": 0}
+
+
+@pytest.mark.parametrize(
+    "transcript, outcome",
+    [
+        ("", "no_response"),
+        ("ok", "no_response"),
+        ("Yes, I want to see it", "interested"),
+        ("No, call back later", "callback"),
+        ("No, I don't think so", "not_interested"),
+        ("Hello? Who is this?", "unclear"),
+    ],
+)
+def test_classify(classifier, transcript, outcome):
+    assert classifier.classify(transcript)["outcome"] == outcome
+
+
+def test_rejects_a_keyword_in_two_classes():
+    with pytest.raises(ValueError, match="both"):
+        OutcomeClassifier({"positive": ["sure"], "negative": ["Sure"]})
+
+
+def test_shipped_keyword_file_loads():
+    classifier = OutcomeClassifier.from_file()
+    assert classifier.classify("Yes, that sounds good. Tell me more.")["outcome"] == "interested"
+    assert classifier.classify("I'm busy now, can you call back next week?")["outcome"] == "callback"
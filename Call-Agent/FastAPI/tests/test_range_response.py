@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from utils.range_response import ZEROCOPY, RangeFileResponse, RangeNotSatisfiable, parse_range
+
+BODY = bytes(range(256)) * 4  # 1024 bytes
+ETAG = '"rec-1"'
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-99", (0, 99)),
+        ("bytes=1000-", (1000, 1023)),
+        ("bytes=-24", (1000, 1023)),
+        ("bytes=-5000", (0, 1023)),
+        ("bytes=1000-5000", (1000, 1023)),
+        ("bytes=0-1,5-6", None),  # several ranges: whole file
+        ("items=0-1", None),
+        ("bytes=abc-", None),
+        ("bytes=10-5", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1024) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=2000-3000", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1024)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = tmp_path / "rec.mp3"
+    path.write_bytes(BODY)
+    monkeypatch.setattr(RangeFileResponse, "chunk_size", 100)  # several pread chunks per response
+
+    async def recording(request: Request):
+        return RangeFileResponse(str(path), request.headers, "audio/mpeg", ETAG, method=request.method)
+
+    app = Starlette(routes=[Route("/rec", recording, methods=["GET", "HEAD"])])
+    return TestClient(app)
+
+
+def test_whole_file(client):
+    response = client.get("/rec")
+    assert response.status_code == 200
+    assert response.content == BODY
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == "1024"
+    assert response.headers["etag"] == ETAG
+
+
+def test_partial_content(client):
+    response = client.get("/rec", headers={"Range": "bytes=100-349"})
+    assert response.status_code == 206
+    assert response.content == BODY[100:350]
+    assert response.headers["content-range"] == "bytes 100-349/1024"
+    assert response.headers["content-length"] == "250"
+
+
+def test_suffix_range(client):
+    response = client.get("/rec", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == BODY[-10:]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get("/rec", headers={"Range": "bytes=5000-"})
+    assert response.status_code == 416
+    assert response.content == b""
+    assert response.headers["content-range"] == "bytes */1024"
+
+
+def test_if_range_mismatch_sends_the_whole_file(client):
+    response = client.get("/rec", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == BODY
+    response = client.get("/rec", headers={"Range": "bytes=0-9", "If-Range": ETAG})
+    assert response.status_code == 206
+
+
+def test_if_none_match(client):
+    response = client.get("/rec", headers={"If-None-Match": ETAG})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_head_sends_headers_only(client):
+    response = client.head("/rec", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
+
+
+def test_zerocopy_send_hands_the_file_to_the_server(tmp_path):
+    path = tmp_path / "rec.mp3"
+    path.write_bytes(BODY)
+    response = RangeFileResponse(str(path), {"range": "bytes=10-19"}, "audio/mpeg", ETAG)
+    messages = []
+
+    async def send(message):
+        if message["type"] == ZEROCOPY:
+            file = message["file"]
+            message = {**message, "data": os.pread(file.fileno(), message["count"], message["offset"])}
+        messages.append(message)
+
+    scope = {"type": "http", "extensions": {ZEROCOPY: {}}}
+    asyncio.run(response(scope, None, send))
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == ZEROCOPY and messages[1]["data"] == BODY[10:20]
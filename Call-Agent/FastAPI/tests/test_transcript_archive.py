@@ -0,0 +1,104 @@
+import gzip
+import os
+
+import pytest
+
+from services.transcript_archive import TranscriptArchive, day_of, matches
+
+
+def record(call_id, day="2026-01-02", campaign_id=None, outcome=None, transcript=""):
+    return {
+        "call_id": call_id,
+        "day": day,
+        "campaign_id": campaign_id,
+        "analysis": {"outcome": outcome},
+        "transcript": transcript,
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = TranscriptArchive(str(tmp_path / "archive"), chunk_records=2)
+    yield archive
+    archive.close()
+
+
+def test_day_and_filters():
+    assert day_of(0) == "1970-01-01"
+    entry = record("c1", day="2026-01-02", campaign_id="7", outcome="interested")
+    assert matches(entry, campaign_id="7", since="2026-01-02", until="2026-01-02", outcome="interested")
+    assert not matches(entry, campaign_id="8")
+    assert not matches(entry, since="2026-01-03")
+    assert not matches(entry, until="2026-01-01")
+    assert not matches(entry, outcome="callback")
+
+
+def test_full_chunks_flush_and_segments_stay_plain_gzip_jsonl(archive):
+    archive.append(record("c1", campaign_id=7))
+    assert archive.stats()["chunks"] == 0
+    assert archive.get("c1")["campaign_id"] == "7"  # served from the buffer
+    archive.append(record("c2"))
+    archive.append(record("c3"))
+    assert archive.flush() == 1
+
+    stats = archive.stats()
+    assert (stats["records"], stats["chunks"], stats["segments"], stats["buffered"]) == (3, 2, 1, 0)
+    [segment] = os.listdir(archive.segment_dir)
+    with gzip.open(os.path.join(archive.segment_dir, segment)) as file:
+        assert len(file.read().splitlines()) == 3
+
+
+def test_get_returns_the_latest_record(archive):
+    archive.append(record("c1", outcome="callback"))
+    archive.append(record("c2"))
+    archive.append(record("c1", outcome="interested"))
+    archive.flush()
+    assert archive.get("c1")["analysis"]["outcome"] == "interested"
+    assert archive.get("c2")["call_id"] == "c2"
+    assert archive.get("missing") is None
+
+
+def test_scans_only_read_matching_chunks(archive):
+    archive.append(record("a1", day="2026-01-01", campaign_id="1", outcome="interested"))
+    archive.append(record("a2", day="2026-01-01", campaign_id="1", outcome="callback"))
+    archive.append(record("b1", day="2026-01-05", campaign_id="2", outcome="interested"))
+    archive.append(record("b2", day="2026-01-05", campaign_id="2", outcome="negative"))
+    archive.flush()
+
+    assert len(archive.chunks()) == 2
+    assert len(archive.chunks(campaign_id="2")) == 1
+    assert [r["call_id"] for r in archive.iter_records()] == ["a1", "a2", "b1", "b2"]
+    assert [r["call_id"] for r in archive.iter_records(outcome="interested")] == ["a1", "b1"]
+    assert [r["call_id"] for r in archive.iter_records(since="2026-01-02")] == ["b1", "b2"]
+    assert [r["call_id"] for r in archive.iter_records(campaign_id="1", until="2026-01-01")] == ["a1", "a2"]
+    assert list(archive.map_chunks(len)) == [2, 2]
+    assert list(archive.map_chunks(len, outcome="negative")) == [1]
+
+
+def test_unindexed_bytes_past_the_last_chunk_are_ignored(archive):
+    archive.append(record("c1"))
+    archive.append(record("c2"))
+    [segment] = os.listdir(archive.segment_dir)
+    with open(os.path.join(archive.segment_dir, segment), "ab") as file:
+        file.write(b"torn write")
+    assert [r["call_id"] for r in archive.iter_records()] == ["c1", "c2"]
+
+
+def test_segments_roll_over(tmp_path):
+    archive = TranscriptArchive(str(tmp_path / "archive"), chunk_records=1, segment_bytes=1)
+    for i in range(3):
+        archive.append(record(f"c{i}"))
+    assert archive.stats()["segments"] == 3
+    assert [r["call_id"] for r in archive.iter_records()] == ["c0", "c1", "c2"]
+    archive.close()
+
+
+def test_reanalyze_reports_changed_outcomes(archive):
+    archive.append(record("c1", outcome="interested", transcript="Yes, I am interested, send me the details"))
+    archive.append(record("c2", outcome="interested", transcript="Please call me back tomorrow"))
+    archive.flush()
+    report = archive.reanalyze(workers=1)
+    assert report["records"] == 2
+    assert sum(report["outcomes"].values()) == 2
+    assert report["changed"] == sum(report["changes"].values())
+    assert all(change.startswith("interested->") for change in report["changes"])
@@ -0,0 +1,158 @@
+import asyncio
+from email.utils import formatdate
+
+import pytest
+
+from services.transcript_cache import TranscriptCache
+
+TERMINAL = ("done", "failed")
+
+
+class Upstream:
+    """Transcript fetch stand-in that blocks until released and counts calls"""
+
+    def __init__(self, details=None):
+        self.calls = 0
+        self.details = details or {"status": "done", "transcript": [{"role": "agent", "message": "hi"}]}
+        self.release = None
+
+    async def __call__(self, call_id):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return dict(self.details, conversation_id=call_id)
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def scenario():
+        upstream = Upstream()
+        upstream.release = asyncio.Event()
+        cache = TranscriptCache(upstream, TERMINAL)
+        waiters = [asyncio.ensure_future(cache.get("c1")) for _ in range(5)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        entries = await asyncio.gather(*waiters)
+        return upstream.calls, entries, cache.stats()
+
+    calls, entries, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert all(entry is entries[0] for entry in entries)
+    assert (stats["misses"], stats["coalesced"], stats["inflight"]) == (1, 4, 0)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch():
+    async def scenario():
+        upstream = Upstream()
+        upstream.release = asyncio.Event()
+        cache = TranscriptCache(upstream, TERMINAL)
+        first = asyncio.ensure_future(cache.get("c1"))
+        second = asyncio.ensure_future(cache.get("c1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        entry = await second
+        return first.cancelled(), entry, upstream.calls, cache.peek("c1")
+
+    cancelled, entry, calls, cached = asyncio.run(scenario())
+    assert cancelled
+    assert entry.details["conversation_id"] == "c1"
+    assert calls == 1
+    assert cached is entry
+
+
+def test_terminal_entries_stay_and_live_ones_expire():
+    async def scenario():
+        upstream = Upstream({"status": "in-progress"})
+        cache = TranscriptCache(upstream, TERMINAL, live_ttl=0)
+        await cache.get("live")
+        await asyncio.sleep(0.01)
+        await cache.get("live")
+        upstream.details = {"status": "done"}
+        await cache.get("final")
+        await cache.get("final")
+        return upstream.calls, cache.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == 3
+    assert stats["hits"] == 1
+
+
+def test_failed_fetches_are_not_cached():
+    async def scenario():
+        upstream = Upstream({"success": False, "error": "upstream down"})
+        cache = TranscriptCache(upstream, TERMINAL)
+        entry = await cache.get("c1")
+        return entry, cache.peek("c1")
+
+    entry, cached = asyncio.run(scenario())
+    assert not entry.ok
+    assert cached is None
+
+
+def test_fetch_errors_reach_every_waiter_and_are_retried():
+    async def scenario():
+        attempts = []
+
+        async def fetch(call_id):
+            attempts.append(call_id)
+            if len(attempts) == 1:
+                await asyncio.sleep(0)
+                raise RuntimeError("boom")
+            return {"status": "done"}
+
+        cache = TranscriptCache(fetch, TERMINAL)
+        results = await asyncio.gather(cache.get("c1"), cache.get("c1"), return_exceptions=True)
+        retried = await cache.get("c1")
+        return results, retried, len(attempts)
+
+    results, retried, attempts = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried.terminal
+    assert attempts == 2
+
+
+def test_memory_cap_evicts_least_recently_used():
+    cache = TranscriptCache(Upstream(), TERMINAL)
+    first = cache.put("a", {"status": "done", "body": "x" * 100})
+    cache.max_bytes = first.size * 2
+    cache.put("b", {"status": "done", "body": "y" * 100})
+    assert cache.peek("a") is not None
+    cache.put("c", {"status": "done", "body": "z" * 100})
+    assert cache.peek("b") is None
+    assert cache.peek("a") is not None and cache.peek("c") is not None
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_last_modified_only_moves_when_content_changes():
+    cache = TranscriptCache(Upstream(), TERMINAL)
+    first = cache.put("c1", {"status": "in-progress", "turns": 1})
+    first.last_modified -= 60
+    again = cache.put("c1", {"turns": 1, "status": "in-progress"})
+    changed = cache.put("c1", {"status": "in-progress", "turns": 2})
+    assert again.etag == first.etag and again.last_modified == first.last_modified
+    assert changed.etag != first.etag and changed.last_modified > first.last_modified
+
+
+@pytest.mark.parametrize(
+    "if_none_match, expected",
+    [("*", True), ("{etag}", True), ('"other", {etag}', True), ("W/{etag}", True), ('"other"', False)],
+)
+def test_if_none_match(if_none_match, expected):
+    entry = TranscriptCache(Upstream(), TERMINAL).put("c1", {"status": "done"})
+    assert entry.not_modified(if_none_match.format(etag=entry.etag), None) is expected
+
+
+def test_if_modified_since_and_variants():
+    entry = TranscriptCache(Upstream(), TERMINAL).put("c1", {"status": "done"})
+    assert entry.not_modified(None, formatdate(entry.last_modified + 1, usegmt=True))
+    assert not entry.not_modified(None, formatdate(entry.last_modified - 60, usegmt=True))
+    assert not entry.not_modified(None, "not a date")
+    # If-None-Match wins over If-Modified-Since
+    assert not entry.not_modified('"other"', formatdate(entry.last_modified + 1, usegmt=True))
+
+    projected = entry.tag("transcript")
+    assert projected != entry.etag and projected.startswith('"') and projected.endswith('"')
+    assert entry.not_modified(projected, None, variant="transcript")
+    assert not entry.not_modified(entry.etag, None, variant="transcript")
+    assert entry.headers("transcript")["ETag"] == projected
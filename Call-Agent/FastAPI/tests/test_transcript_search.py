@@ -0,0 +1,102 @@
+import pytest
+
+from services.transcript_search import InvalidQuery, TranscriptSearch, fts_query, split_speakers
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("demo", '"demo"'),
+        ("e-mail don't", '"e-mail" "don\'t"'),
+        ('"book a demo" OR pricing', '"book a demo" OR "pricing"'),
+        ("call NOT back", '"call" NOT "back"'),
+        ("sched*", '"sched"*'),
+        ("(demo OR trial) AND price", '( "demo" OR "trial" ) AND "price"'),
+        ("and or not", '"and" "or" "not"'),  # operators are upper case only
+        ("transcript:demo NEAR", '"transcript:demo" "NEAR"'),
+        ('"unterminated phrase', '"unterminated phrase"'),
+        ('say"hi"', '"say" "hi"'),
+        ("*** demo", '"demo"'),
+    ],
+)
+def test_fts_query_quotes_plain_words(text, expected):
+    assert fts_query(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "   ", '""', "***"])
+def test_fts_query_rejects_empty_text(text):
+    with pytest.raises(InvalidQuery):
+        fts_query(text)
+
+
+def test_split_speakers():
+    record = {"transcript": "agent: Hi there\nuser: Yes please\nno label here"}
+    assert split_speakers(record) == ("Yes please\nno label here", "Hi there")
+    turns = {"turns": [{"role": "agent", "message": "Hello"}, {"role": "user", "message": "Hey"}]}
+    assert split_speakers(turns) == ("Hey", "Hello")
+
+
+@pytest.fixture
+def search(tmp_path):
+    search = TranscriptSearch(str(tmp_path / "search.sqlite3"))
+    search.add_many([
+        {"call_id": "c1", "campaign_id": "1", "analysis": {"outcome": "interested"}, "day": "2026-01-01",
+         "turns": [{"role": "agent", "message": "Would you like a demo?"},
+                   {"role": "user", "message": "Yes, send me an e-mail about the demo"}]},
+        {"call_id": "c2", "campaign_id": "1", "analysis": {"outcome": "not_interested"}, "day": "2026-01-02",
+         "turns": [{"role": "agent", "message": "Can I book a demo?"}, {"role": "user", "message": "I don't want it"}]},
+        {"call_id": "c3", "campaign_id": "2", "analysis": {"outcome": "callback"}, "day": "2026-01-03",
+         "transcript": "agent: Scheduling a demo\nuser: Call back next week"},
+    ])
+    yield search
+    search.close()
+
+
+def call_ids(page):
+    return [result["call_id"] for result in page["results"]]
+
+
+def test_search_matches_punctuated_words_literally(search):
+    assert call_ids(search.search("e-mail")) == ["c1"]
+    assert call_ids(search.search("don't")) == ["c2"]
+    assert call_ids(search.search('"book a demo"')) == ["c2"]
+    assert call_ids(search.search("schedul*")) == ["c3"]
+
+
+def test_search_filters(search):
+    assert call_ids(search.search("demo")) == ["c3", "c2", "c1"]  # newest first
+    assert call_ids(search.search("demo", speaker="prospect")) == ["c1"]
+    assert call_ids(search.search("demo", campaign_id="1")) == ["c2", "c1"]
+    assert call_ids(search.search("demo", outcome="callback")) == ["c3"]
+    assert call_ids(search.search("demo", since="2026-01-02", until="2026-01-02")) == ["c2"]
+    assert call_ids(search.search("demo", campaign_id="unknown")) == []
+
+
+def test_search_pages_with_a_cursor(search):
+    for sort in ("recent", "relevance"):
+        seen, cursor = [], None
+        while True:
+            page = search.search("demo", sort=sort, limit=2, cursor=cursor)
+            seen += call_ids(page)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(seen) == ["c1", "c2", "c3"]
+
+
+def test_search_highlights_matches(search):
+    [result] = search.search("e-mail")["results"]
+    assert "<mark>e-mail</mark>" in result["snippet"]
+
+
+def test_unbalanced_parentheses_are_an_invalid_query(search):
+    with pytest.raises(InvalidQuery):
+        search.search("(demo OR")
+
+
+def test_search_route_rejects_invalid_queries(api):
+    client, _ = api
+    response = client.get("/api/agent/search", params={"q": "(demo OR"})
+    assert response.status_code == 400
+    assert response.json()["success"] is False
+    assert client.get("/api/agent/search", params={"q": "e-mail"}).status_code == 200
@@ -0,0 +1,130 @@
+import asyncio
+
+from services.transcript_cache import TranscriptCache
+from services.transcript_stream import StreamEvent, TranscriptStreams, conversation_turns
+
+TERMINAL = ("done", "failed")
+
+
+def details(status, *messages):
+    return {
+        "status": status,
+        "raw_data": {"transcript": [{"role": "agent", "message": message} for message in messages]},
+    }
+
+
+class Upstream:
+    """Transcript fetch stand-in replaying ``snapshots`` (the last one repeats)"""
+
+    def __init__(self, *snapshots):
+        self.snapshots = list(snapshots)
+        self.calls = 0
+
+    async def __call__(self, call_id):
+        self.calls += 1
+        if len(self.snapshots) > 1:
+            return self.snapshots.pop(0)
+        return self.snapshots[0]
+
+
+def streams(upstream, **options):
+    cache = TranscriptCache(upstream, TERMINAL)
+    return TranscriptStreams(upstream, cache, TERMINAL, **dict({"interval": 0.01}, **options))
+
+
+async def collect(stream, call_id, since=0):
+    return [event async for event in stream.subscribe(call_id, since=since)]
+
+
+def test_conversation_turns_from_raw_data_or_text():
+    assert conversation_turns({"raw_data": {"transcript": [{"role": "user", "text": "hi", "time_in_call_secs": 3}]}}) == [
+        {"role": "user", "message": "hi", "time_in_call_secs": 3}
+    ]
+    assert conversation_turns({"transcript": "agent: hello\nuser: hi: there"}) == [
+        {"role": "agent", "message": "hello", "time_in_call_secs": None},
+        {"role": "user", "message": "hi: there", "time_in_call_secs": None},
+    ]
+
+
+def test_sse_framing():
+    assert StreamEvent("keepalive", {}).sse() == b": keepalive\n\n"
+    assert StreamEvent("turns", {"a": 1}, id=3).sse() == b'id: 3\nevent: turns\ndata: {"a":1}\n\n'
+    assert StreamEvent("status", {"a": 1}).to_dict() == {"event": "status", "data": {"a": 1}}
+
+
+def test_pushes_only_new_turns_and_status_changes_until_terminal():
+    upstream = Upstream(
+        details("in-progress", "one"),
+        details("in-progress", "one"),
+        details("in-progress", "one", "two"),
+        details("done", "one", "two", "three"),
+    )
+    stream = streams(upstream)
+    events = asyncio.run(collect(stream, "c1"))
+
+    assert [(e.event, e.id) for e in events] == [
+        ("status", None), ("turns", 1), ("turns", 2), ("status", None), ("turns", 3), ("end", None),
+    ]
+    assert [turn["message"] for e in events if e.event == "turns" for turn in e.data["turns"]] == ["one", "two", "three"]
+    assert events[-1].data == {"call_id": "c1", "status": "done", "turns": 3, "reason": "terminal"}
+    assert stream.stats()["watchers"] == 0
+
+
+def test_resume_skips_turns_already_seen():
+    stream = streams(Upstream(details("done", "one", "two", "three")))
+    events = asyncio.run(collect(stream, "c1", since=2))
+    turns = [e for e in events if e.event == "turns"]
+    assert len(turns) == 1
+    assert turns[0].data["index"] == 2 and turns[0].id == 3
+
+
+def test_subscribers_share_one_watcher():
+    async def scenario():
+        upstream = Upstream(details("in-progress", "one"), details("in-progress", "one"), details("done", "one", "two"))
+        stream = streams(upstream, interval=0.02)
+        first = asyncio.ensure_future(collect(stream, "c1"))
+        await asyncio.sleep(0.005)
+        second = asyncio.ensure_future(collect(stream, "c1"))
+        return await first, await second, upstream.calls
+
+    first, second, calls = asyncio.run(scenario())
+    assert calls == 3
+    assert [e.event for e in first] == [e.event for e in second] == ["status", "turns", "status", "turns", "end"]
+
+
+def test_update_pushes_a_final_transcript_immediately():
+    async def scenario():
+        stream = streams(Upstream(details("in-progress", "one")), interval=60)
+        subscriber = asyncio.ensure_future(collect(stream, "c1"))
+        await asyncio.sleep(0.01)
+        stream.update("c1", details("done", "one", "two"))
+        stream.update("other", details("done"))
+        return await asyncio.wait_for(subscriber, 1)
+
+    events = asyncio.run(scenario())
+    assert [e.event for e in events] == ["status", "turns", "status", "turns", "end"]
+
+
+def test_repeated_upstream_failures_end_the_stream():
+    stream = streams(Upstream({"success": False, "error": "upstream down"}), max_failures=2)
+    events = asyncio.run(collect(stream, "c1"))
+    assert [e.event for e in events] == ["error", "error", "end"]
+    assert events[-1].data["reason"] == "upstream_error"
+
+
+def test_slow_subscriber_is_disconnected_and_the_watcher_stops_with_the_last_one():
+    async def scenario():
+        upstream = Upstream(*[details("in-progress", *map(str, range(n))) for n in range(1, 10)])
+        stream = streams(upstream, queue_size=2, interval=0.001)
+        events = stream.subscribe("c1")
+        first = await events.__anext__()
+        await asyncio.sleep(0.05)  # not reading while turns keep arriving
+        rest = [event async for event in events]
+        await asyncio.sleep(0.01)
+        return first, rest, stream.stats(), upstream.calls
+
+    first, rest, stats, calls = asyncio.run(scenario())
+    assert first.event == "status"
+    assert len(rest) <= 2
+    assert stats["dropped_subscribers_total"] == 1
+    assert (stats["watchers"], stats["subscribers"]) == (0, 0)
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from services.twilio_pipeline import TwilioCall, TwilioCallStore, TwilioPipeline, was_answered
+
+
+def analyze(transcript):
+    return {"outcome": "interested" if transcript else "no_answer"}
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    reported = []
+
+    async def report(call, picked):
+        reported.append((call.call_sid, picked, call.reason))
+
+    store = TwilioCallStore(str(tmp_path / "twilio.sqlite3"))
+    pipeline = TwilioPipeline(store, analyze, report, transcription_wait=0.2, sweep_interval=0.05)
+    pipeline.reported = reported
+    yield pipeline
+    store.close()
+
+
+def status(call_sid, call_status, **params):
+    return dict(params, CallSid=call_sid, CallStatus=call_status)
+
+
+def transcription(call_sid, text, transcription_status="completed"):
+    return {"CallSid": call_sid, "TranscriptionStatus": transcription_status, "TranscriptionText": text}
+
+
+@pytest.mark.parametrize(
+    "call_status, fields, expected",
+    [
+        ("completed", {"duration": 30}, True),
+        ("in-progress", {}, True),
+        ("ringing", {"transcript": "hello"}, True),
+        (None, {"recording_url": "https://example.com/r"}, True),
+        ("ringing", {}, False),
+        ("no-answer", {"transcript": "voicemail"}, False),
+        ("busy", {}, False),
+    ],
+)
+def test_was_answered(call_status, fields, expected):
+    assert was_answered(TwilioCall("CA1", {}, "ended", call_status=call_status, **fields)) is expected
+
+
+def test_transcript_finalizes_the_call_once(pipeline):
+    async def scenario():
+        await pipeline.on_call_status(status("CA1", "in-progress"), {"lead": 1})
+        await pipeline.on_call_status(status("CA1", "completed", CallDuration="42"), {})
+        await pipeline.on_transcription(transcription("CA1", " yes please "), {})
+        await pipeline.on_transcription(transcription("CA1", "yes please"), {})
+        return await pipeline.wait("CA1", 0), await pipeline.stats()
+
+    call, stats = asyncio.run(scenario())
+    assert pipeline.reported == [("CA1", True, "transcribed")]
+    assert (call.state, call.transcript, call.duration) == ("reported", "yes please", 42)
+    assert call.analysis == {"outcome": "interested"}
+    assert call.context == {"lead": 1}
+    assert (stats["reported_total"], stats["calls"]) == (1, {"reported": 1})
+
+
+def test_transcript_before_completed_status_counts_as_picked(pipeline):
+    async def scenario():
+        await pipeline.on_transcription(transcription("CA1", "hello there"), {})
+        await pipeline.on_call_status(status("CA1", "completed"), {})
+        return await pipeline.wait("CA1", 0)
+
+    call = asyncio.run(scenario())
+    assert pipeline.reported == [("CA1", True, "transcribed")]
+    # The late completed status still lands, but does not reopen the reported call
+    assert (call.state, call.call_status) == ("reported", "completed")
+
+
+def test_late_callbacks_do_not_move_status_backwards(pipeline):
+    async def scenario():
+        await pipeline.on_call_status(status("CA1", "in-progress"), {})
+        await pipeline.on_call_status(status("CA1", "ringing"), {})
+        return await asyncio.to_thread(pipeline.store.get, "CA1")
+
+    call = asyncio.run(scenario())
+    assert (call.call_status, call.state) == ("in-progress", "in_progress")
+
+
+def test_unanswered_calls_finalize_without_a_transcript(pipeline):
+    async def scenario():
+        await pipeline.on_call_status(status("CA1", "ringing"), {})
+        await pipeline.on_call_status(status("CA1", "no-answer"), {})
+        return await pipeline.wait("CA1", 0)
+
+    call = asyncio.run(scenario())
+    assert pipeline.reported == [("CA1", False, "no-answer")]
+    assert call.analysis == {"outcome": "no_answer"}
+
+
+def test_missing_transcription_times_out(pipeline):
+    async def scenario():
+        pipeline.start()
+        await pipeline.on_call_status(status("CA1", "in-progress"), {})
+        await pipeline.on_call_status(status("CA1", "completed"), {})
+        call = await pipeline.wait("CA1", 2)
+        stats = await pipeline.stats()
+        await pipeline.stop()
+        return call, stats
+
+    call, stats = asyncio.run(scenario())
+    assert pipeline.reported == [("CA1", True, "transcription_timeout")]
+    assert call.state == "reported"
+    assert stats["timed_out_total"] == 1
+
+
+def test_every_waiter_is_woken_and_a_cancelled_one_does_not_strand_the_rest(pipeline):
+    async def scenario():
+        await pipeline.on_call_status(status("CA1", "in-progress"), {})
+        waiters = [asyncio.ensure_future(pipeline.wait("CA1", 5)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        waiting = (await pipeline.stats())["waiting"]
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await pipeline.on_transcription(transcription("CA1", "sure"), {})
+        calls = await asyncio.gather(*waiters[1:])
+        return waiting, loop.time() - started, calls, (await pipeline.stats())["waiting"]
+
+    waiting, elapsed, calls, left = asyncio.run(scenario())
+    assert waiting == 3
+    assert elapsed < 0.5
+    assert all(call.state == "reported" for call in calls)
+    assert left == 0
+
+
+def test_wait_returns_the_call_as_it_stands_on_timeout(pipeline):
+    async def scenario():
+        await pipeline.on_call_status(status("CA1", "in-progress"), {})
+        return await pipeline.wait("CA1", 0.05), await pipeline.wait("unknown", 0)
+
+    call, unknown = asyncio.run(scenario())
+    assert call.state == "in_progress"
+    assert unknown is None
@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import json
+import time
+
+from utils.webhook_signature import twilio_signature, verify_elevenlabs_signature, verify_twilio_signature
+
+SECRET = "whsec-test"
+
+
+def elevenlabs_header(payload: bytes, secret: str = SECRET, timestamp: int = None) -> str:
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v0={digest}"
+
+
+def test_elevenlabs_signature():
+    payload = b'{"type": "post_call_transcription"}'
+    assert verify_elevenlabs_signature(payload, elevenlabs_header(payload), SECRET)
+    assert not verify_elevenlabs_signature(payload + b" ", elevenlabs_header(payload), SECRET)
+    assert not verify_elevenlabs_signature(payload, elevenlabs_header(payload, "other"), SECRET)
+    assert not verify_elevenlabs_signature(payload, elevenlabs_header(payload, timestamp=int(time.time()) - 3600), SECRET)
+    for header in (None, "", "garbage", "t=abc,v0=00", f"t={int(time.time())}"):
+        assert not verify_elevenlabs_signature(payload, header, SECRET)
+    assert not verify_elevenlabs_signature(payload, elevenlabs_header(payload, ""), "")
+
+
+def test_twilio_signature():
+    url = "https://example.com/api/webhooks/twilio/call-status?campaignId=3"
+    params = {"CallSid": "CA1", "CallStatus": "completed"}
+    signature = twilio_signature(url, params, "token")
+    assert verify_twilio_signature(url, dict(reversed(params.items())), signature, "token")
+    assert not verify_twilio_signature(url, {**params, "CallStatus": "busy"}, signature, "token")
+    assert not verify_twilio_signature(url.replace("3", "4"), params, signature, "token")
+    assert not verify_twilio_signature(url, params, None, "token")
+    assert not verify_twilio_signature(url, params, signature, "")
+
+
+def post_event(client, event, header=None):
+    payload = json.dumps(event).encode()
+    return client.post(
+        "/api/webhooks/elevenlabs",
+        content=payload,
+        headers={"ElevenLabs-Signature": header or elevenlabs_header(payload), "Content-Type": "application/json"},
+    )
+
+
+def test_webhook_rejects_bad_signatures(api):
+    client, _ = api
+    response = post_event(client, {"type": "post_call_transcription"}, header="t=1,v0=00")
+    assert response.status_code == 401
+
+
+def test_webhook_ignores_other_events(api):
+    client, _ = api
+    assert post_event(client, {"type": "something_else", "data": {}}).json() == {"success": True, "handled": False}
+
+
+def test_post_call_webhook_finalizes_a_monitored_call_once(api):
+    from route.call_agent import voice_agent
+
+    client, upstream = api
+    lead = {"phone": "+15550002", "name": "Ada", "company": "Acme", "context": {"campaignId": "wh", "contactId": "1"}}
+    call_id = client.post("/api/agent/call", json=lead).json()["call_id"]
+    assert voice_agent.monitor.is_watching(call_id)
+
+    finished = client.get("/api/agent/monitor/stats").json()["finished_total"]
+    event = {
+        "type": "post_call_transcription",
+        "data": {"conversation_id": call_id, "status": "done",
+                 "transcript": [{"role": "user", "message": "Yes, that sounds good, book a demo"}]},
+    }
+    assert post_event(client, event).json() == {"success": True, "handled": True}
+    assert post_event(client, event).json() == {"success": True, "handled": True}
+
+    record = voice_agent.registry.get(call_id)
+    assert record.state == "finished" and record.reason == "webhook"
+    assert record.result["outcome"] == "interested"
+    assert client.get("/api/agent/monitor/stats").json()["finished_total"] == finished + 1
+    assert upstream.calls_to(f"/conversations/{call_id}") == 0  # no polling needed
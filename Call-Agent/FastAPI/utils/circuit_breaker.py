@@ -0,0 +1,308 @@
+"""
+Circuit breakers and hedged requests for upstream HTTP endpoints.
+
+A breaker watches the outcomes of the last ``window_calls`` calls to one
+endpoint within a sliding time window. When enough of them fail (transport errors, timeouts, 5xx, 429)
+or run slower than ``slow_call`` seconds, it opens and further calls fail at
+once with ``CircuitOpen`` instead of queueing behind a degraded upstream.
+After ``open_seconds`` it lets a few probe calls through (half-open): if they
+succeed it closes again, otherwise it reopens for twice as long, up to
+``max_open_seconds``.
+
+Idempotent reads can also be hedged: when a request has not answered within
+the endpoint's recent p95 latency, a second identical request is sent and
+whichever answers first wins. Hedges are capped at ``hedge_ratio`` of all
+requests and are never sent while the breaker is not closed.
+
+Like the metrics module, this must not depend on the FastAPI config package.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from utils.metrics import CIRCUIT_REJECTIONS, CIRCUIT_STATE, CIRCUIT_TRANSITIONS, HEDGED_REQUESTS
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Gauge values for CIRCUIT_STATE
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Upstream answers that mean the endpoint is unhealthy rather than the request wrong
+FAILURE_STATUSES = (408, 429)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an endpoint whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def is_failure(response: httpx.Response) -> bool:
+    return response.status_code >= 500 or response.status_code in FAILURE_STATUSES
+
+
+class CircuitBreaker:
+    """
+    Failure-rate and slow-call breaker for one endpoint.
+
+    Callers ask ``allow()`` before each call (it raises ``CircuitOpen`` or
+    returns whether the call is a half-open probe) and report the outcome
+    with ``record()``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 30.0,
+        window_calls: int = 20,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call: float = 5.0,
+        slow_rate: float = 0.8,
+        open_seconds: float = 15.0,
+        max_open_seconds: float = 120.0,
+        half_open_probes: int = 2,
+        on_change: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.window = window
+        self.window_calls = window_calls
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+        self.on_change = on_change
+        self.clock = clock
+
+        self.state = CLOSED
+        # (finished_at, failed, slow) per call in the window
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self._open_until = 0.0
+        self._open_for = open_seconds
+        self._probes = 0
+        self._probe_successes = 0
+        self._rejected_total = 0
+        self._opened_total = 0
+
+    def allow(self) -> bool:
+        """
+        Admit a call, returning True if it is a half-open probe.
+
+        Raises:
+            CircuitOpen: While open, or while the half-open probes are in flight.
+        """
+        now = self.clock()
+        if self.state == OPEN and now >= self._open_until:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+            self._probes += 1
+            return True
+        self._rejected_total += 1
+        raise CircuitOpen(self.name, self.retry_after())
+
+    def record(self, failed: bool, seconds: float, probe: bool = False):
+        now = self.clock()
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if self.state != HALF_OPEN:
+                return
+            if failed or seconds >= self.slow_call:
+                self._open(now, backoff=True)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._open_for = self.open_seconds
+                self._transition(CLOSED)
+            return
+        if self.state != CLOSED:
+            return  # a call admitted before the breaker opened
+
+        slow = seconds >= self.slow_call
+        self._calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._expire(now)
+        total = len(self._calls)
+        if total >= self.min_calls and (
+            self._failures >= self.failure_rate * total or self._slow >= self.slow_rate * total
+        ):
+            self._open(now)
+
+    def cancel(self, probe: bool):
+        """Forget an admitted call that was abandoned (e.g. a losing hedge)"""
+        if probe:
+            self._probes = max(0, self._probes - 1)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._open_until - self.clock()))
+
+    def stats(self) -> Dict:
+        self._expire(self.clock())
+        total = len(self._calls)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "failure_rate": round(self._failures / total, 3) if total else 0.0,
+            "slow_rate": round(self._slow / total, 3) if total else 0.0,
+            "retry_after": self.retry_after() if self.state == OPEN else None,
+            "opened_total": self._opened_total,
+            "rejected_total": self._rejected_total,
+        }
+
+    def _expire(self, now: float):
+        while self._calls and (len(self._calls) > self.window_calls or self._calls[0][0] < now - self.window):
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _open(self, now: float, backoff: bool = False):
+        if backoff:
+            self._open_for = min(self.max_open_seconds, self._open_for * 2)
+        self._open_until = now + self._open_for
+        self._opened_total += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._calls.clear()
+        self._failures = self._slow = 0
+        self._probes = self._probe_successes = 0
+        if self.on_change is not None:
+            self.on_change(state)
+
+
+class Endpoint:
+    """
+    One upstream endpoint behind a circuit breaker, optionally hedged.
+
+    ``request(send)`` runs ``send`` (a zero-argument coroutine function making
+    the HTTP call) under the breaker and returns its response; only pass
+    ``hedge=True`` for idempotent requests.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        name: str,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.05,
+        hedge_ratio: float = 0.1,
+        hedge_min_samples: int = 20,
+        latency_samples: int = 200,
+        **breaker,
+    ):
+        self.service = service
+        self.name = name
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_ratio = hedge_ratio
+        self.hedge_min_samples = hedge_min_samples
+
+        state = CIRCUIT_STATE.labels(service, name)
+        transitions = {s: CIRCUIT_TRANSITIONS.labels(service, name, s) for s in STATE_VALUES}
+
+        def on_change(new_state: str):
+            state.set(STATE_VALUES[new_state])
+            transitions[new_state].inc()
+
+        self.breaker = CircuitBreaker(f"{service} {name}", on_change=on_change, **breaker)
+        state.set(STATE_VALUES[CLOSED])
+        self._rejections = CIRCUIT_REJECTIONS.labels(service, name)
+        self._hedges_sent = HEDGED_REQUESTS.labels(service, name, "sent")
+        self._hedges_won = HEDGED_REQUESTS.labels(service, name, "won")
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self._requests_total = 0
+        self._hedged_total = 0
+        self._hedge_wins_total = 0
+
+    async def request(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Raises:
+            CircuitOpen: Without calling ``send`` when the breaker is open.
+        """
+        self._requests_total += 1
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._attempt(send)
+
+        first = asyncio.ensure_future(self._attempt(send))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if done or self._hedged_total >= self.hedge_ratio * self._requests_total:
+                return await first
+            self._hedged_total += 1
+            self._hedges_sent.inc()
+            second = asyncio.ensure_future(self._attempt(send))
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Take the first usable answer; an error only once both attempts are in
+                usable = [task for task in done if task.exception() is None and not is_failure(task.result())]
+                if usable or not pending:
+                    task = (usable or list(done))[0]
+                    if task is second and usable:
+                        self._hedge_wins_total += 1
+                        self._hedges_won.inc()
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent successful latencies, or None when hedging is off or not warmed up"""
+        if not self.hedge or self.breaker.state != CLOSED or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return max(self.hedge_min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))])
+
+    async def _attempt(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        try:
+            probe = self.breaker.allow()
+        except CircuitOpen:
+            self._rejections.inc()
+            raise
+        start = time.perf_counter()
+        try:
+            response = await send()
+        except asyncio.CancelledError:
+            self.breaker.cancel(probe)
+            raise
+        except Exception:
+            self.breaker.record(True, time.perf_counter() - start, probe)
+            raise
+        seconds = time.perf_counter() - start
+        failed = is_failure(response)
+        self.breaker.record(failed, seconds, probe)
+        if not failed:
+            self._latencies.append(seconds)
+        return response
+
+    def stats(self) -> Dict:
+        return {
+            **self.breaker.stats(),
+            "requests_total": self._requests_total,
+            "hedge_delay": self.hedge_delay(),
+            "hedged_total": self._hedged_total,
+            "hedge_wins_total": self._hedge_wins_total,
+        }
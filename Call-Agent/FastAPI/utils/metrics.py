@@ -0,0 +1,189 @@
+"""
+Prometheus metrics shared by the FastAPI service and the callagent scripts.
+
+Upstream calls are timed per service and operation so a latency spike can be
+attributed to ElevenLabs, Twilio, the backend, Google or SMTP rather than to
+this service. Metric children are resolved once when a function is decorated,
+so the per-call cost is two clock reads and a histogram observe.
+
+Like the classifier, this module must not depend on the FastAPI config package.
+"""
+import asyncio
+import functools
+import time
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Network round trips: a few ms up to slow upstream timeouts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# In-process CPU work such as outcome analysis
+CPU_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+UPSTREAM_SECONDS = Histogram(
+    "callagent_upstream_request_seconds",
+    "Latency of calls to upstream services",
+    ["service", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "callagent_upstream_errors_total",
+    "Upstream calls that raised or reported failure",
+    ["service", "operation"],
+)
+REQUEST_SECONDS = Histogram(
+    "callagent_http_request_seconds",
+    "Latency of requests served by this service, per route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+MONITORED_CALLS = Gauge(
+    "callagent_monitored_calls",
+    "Conversations currently being monitored until they finish",
+)
+CALL_POLLS = Counter(
+    "callagent_call_polls_total",
+    "Conversation status polls made by the call monitor",
+)
+POLLS_PER_CALL = Histogram(
+    "callagent_polls_per_call",
+    "Status polls needed per conversation before it was finalized",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+CALLS_FINALIZED = Counter(
+    "callagent_calls_finalized_total",
+    "Monitored conversations finalized, by how they finished",
+    ["reason"],
+)
+BACKEND_DELIVERIES = Counter(
+    "callagent_backend_webhook_deliveries_total",
+    "Outcome webhook delivery attempts to the backend, by result",
+    ["result"],
+)
+OUTBOX_BACKLOG = Gauge(
+    "callagent_outbox_backlog",
+    "Outcomes spooled and not yet delivered to the backend",
+)
+INBOUND_WEBHOOKS = Counter(
+    "callagent_inbound_webhooks_total",
+    "Webhooks received from upstream providers, by result",
+    ["source", "result"],
+)
+CIRCUIT_STATE = Gauge(
+    "callagent_circuit_state",
+    "Upstream circuit breaker state per endpoint (0 closed, 1 half-open, 2 open)",
+    ["service", "endpoint"],
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "callagent_circuit_transitions_total",
+    "Upstream circuit breaker state changes, by the state entered",
+    ["service", "endpoint", "state"],
+)
+CIRCUIT_REJECTIONS = Counter(
+    "callagent_circuit_rejections_total",
+    "Upstream calls failed fast because the endpoint's circuit was open",
+    ["service", "endpoint"],
+)
+HEDGED_REQUESTS = Counter(
+    "callagent_hedged_requests_total",
+    "Hedged (duplicate) upstream reads sent after the p95 delay, and how many answered first",
+    ["service", "endpoint", "result"],
+)
+TRANSCRIPT_STREAM_WATCHERS = Gauge(
+    "callagent_transcript_stream_watchers",
+    "Live conversations with an upstream watcher feeding transcript streams",
+)
+TRANSCRIPT_STREAM_SUBSCRIBERS = Gauge(
+    "callagent_transcript_stream_subscribers",
+    "Clients subscribed to live transcript streams (SSE and WebSocket)",
+)
+ANALYZE_SECONDS = Histogram(
+    "callagent_analyze_seconds",
+    "Time spent classifying call outcomes (per call for single, per request for batch)",
+    ["mode"],
+    buckets=CPU_BUCKETS,
+)
+
+LANGGRAPH_NODE_SECONDS = Histogram(
+    "callagent_langgraph_node_seconds",
+    "Time each LangGraph workflow node took per lead (call, get_transcript, analyze, email)",
+    ["node"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+
+
+def _failed(result) -> bool:
+    return isinstance(result, dict) and result.get("success") is False
+
+
+def timed(histogram) -> Callable:
+    """Decorator observing a function's run time on a (labelled) histogram"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument(service: str, operation: str) -> Callable:
+    """
+    Decorator timing an upstream call.
+
+    Failures are counted when the call raises or returns ``{"success": False}``,
+    the error convention used by the agents and services.
+    """
+    latency = UPSTREAM_SECONDS.labels(service, operation)
+    errors = UPSTREAM_ERRORS.labels(service, operation)
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    latency.observe(time.perf_counter() - start)
+                if _failed(result):
+                    errors.inc()
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+            if _failed(result):
+                errors.inc()
+            return result
+        return wrapper
+    return decorator
+
+
+def render_latest():
+    """Current metrics in the Prometheus text exposition format, with its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
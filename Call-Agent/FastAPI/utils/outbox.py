@@ -0,0 +1,372 @@
+"""
+Durable outbox for call outcome webhooks to the backend.
+
+Outcomes are first written to a local SQLite spool, which is the only work done
+on the caller's path, and are delivered in the background. Undelivered outcomes
+survive restarts and are retried with exponential backoff and jitter. Claimed
+rows are leased, so several processes can drain the same spool file without
+double-sending.
+
+When a batch endpoint is configured, up to ``batch_size`` outcomes are sent per
+request as ``{"outcomes": [...]}``. If the backend answers 404/405/501 there,
+the outbox falls back to one request per outcome.
+
+Both agents use this module: the FastAPI service drains it from an asyncio task
+and the callagent scripts from a background thread, so it must not depend on
+the FastAPI config package.
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from loguru import logger
+
+from utils.metrics import BACKEND_DELIVERIES, OUTBOX_BACKLOG
+
+# Batch endpoint responses that mean "not supported here"
+BATCH_UNSUPPORTED = (404, 405, 501)
+
+# Client errors that will not succeed on retry; everything else is retried
+RETRYABLE_CLIENT_ERRORS = (408, 409, 425, 429)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt_at);
+"""
+
+Result = Union[int, Exception]
+
+
+def retry_delay(attempts: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter: half the step fixed, half random"""
+    step = min(cap, base * 2 ** min(attempts - 1, 32))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+@dataclass
+class OutboxMessage:
+    id: int
+    payload: Dict
+    created_at: float
+    attempts: int
+
+
+class OutboxStore:
+    """SQLite spool of undelivered outcomes (WAL, safe across threads and processes)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def add(self, payload: Dict) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+                (json.dumps(payload, default=str), now, now),
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int, lease: float) -> List[OutboxMessage]:
+        """Take up to ``limit`` due messages, hiding them from other claimers for ``lease`` seconds"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload, created_at, attempts FROM outbox"
+                    " WHERE dead = 0 AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?", [(now + lease, row[0]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [OutboxMessage(id, json.loads(payload), created_at, attempts) for id, payload, created_at, attempts in rows]
+
+    def delete(self, ids: List[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(id,) for id in ids])
+
+    def retry(self, id: int, next_attempt_at: float, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (next_attempt_at, error, id),
+            )
+
+    def bury(self, id: int, error: str):
+        """Keep a message that will never be delivered, for inspection"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, dead = 1, last_error = ? WHERE id = ?", (error, id)
+            )
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def counts(self) -> Dict:
+        with self._lock:
+            pending, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM outbox WHERE dead = 0"
+            ).fetchone()
+            dead = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+        return {"pending": pending, "dead": dead, "oldest_created_at": oldest}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Outbox:
+    """
+    Spool outcomes locally and deliver them to the backend in the background.
+
+    ``post(url, body)`` performs one HTTP POST and returns the status code (it
+    may raise on network errors). Use ``start`` with a coroutine function from
+    an asyncio service, or ``start_thread`` with a blocking one from scripts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        url: str,
+        batch_url: Optional[str] = None,
+        batch_size: int = 50,
+        retry_base: float = 1.0,
+        retry_max: float = 300.0,
+        max_attempts: int = 20,
+        lease: float = 60.0,
+        idle_interval: float = 5.0,
+    ):
+        self.store = OutboxStore(path)
+        self.url = url
+        self.batch_url = batch_url
+        self.batch_size = batch_size
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.idle_interval = idle_interval
+
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[Union[asyncio.Event, threading.Event]] = None
+        self._stopping = False
+
+        self._delivered_total = 0
+        self._failed_attempts_total = 0
+        self._dead_total = 0
+        self._requests_total = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._avg_lag = 0.0
+
+    def enqueue(self, payload: Dict) -> int:
+        """Durably queue one outcome for delivery and return its outbox id"""
+        id = self.store.add(payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return id
+
+    def start(self, post: Callable[[str, Any], Awaitable[int]]):
+        """Start delivering from the running event loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(post))
+            OUTBOX_BACKLOG.set_function(lambda: self.store.counts()["pending"])
+            logger.info(f"Outbox started ({self.store.path})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        logger.info(f"Outbox stopped with {self.store.counts()['pending']} outcome(s) spooled")
+
+    def start_thread(self, post: Callable[[str, Any], int]):
+        """Start delivering from a daemon thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run_thread, args=(post,), name="outbox", daemon=True)
+            self._thread.start()
+            OUTBOX_BACKLOG.set_function(lambda: self.store.counts()["pending"])
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until every spooled outcome is delivered (True) or ``timeout`` passes (False)"""
+        deadline = time.monotonic() + timeout
+        while self.store.counts()["pending"]:
+            if time.monotonic() >= deadline:
+                return False
+            if self._wakeup is not None:
+                self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+    def stop_thread(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict:
+        counts = self.store.counts()
+        oldest = counts["oldest_created_at"]
+        return {
+            "backlog": counts["pending"],
+            "dead": counts["dead"],
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "delivered_total": self._delivered_total,
+            "failed_attempts_total": self._failed_attempts_total,
+            "dead_total": self._dead_total,
+            "requests_total": self._requests_total,
+            "batching": bool(self.batch_url),
+            "delivery_lag_seconds": {
+                "last": round(self._last_lag, 4),
+                "avg": round(self._avg_lag, 4),
+                "max": round(self._max_lag, 4),
+            },
+        }
+
+    async def _run(self, post: Callable[[str, Any], Awaitable[int]]):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                messages = self.store.claim(self.batch_size, self.lease)
+                if messages:
+                    self._settle(messages, await self._deliver(post, messages))
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox delivery error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._idle_timeout())
+            except asyncio.TimeoutError:
+                pass
+
+    def _run_thread(self, post: Callable[[str, Any], int]):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                messages = self.store.claim(self.batch_size, self.lease)
+                if messages:
+                    self._settle(messages, self._deliver_sync(post, messages))
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox delivery error: {e}")
+            self._wakeup.wait(self._idle_timeout())
+
+    async def _deliver(self, post, messages: List[OutboxMessage]) -> List[Result]:
+        if self._batching(messages):
+            results = self._batch_results(messages, await self._attempt(post, self.batch_url, self._batch_body(messages)))
+            if results is not None:
+                return results
+        return list(await asyncio.gather(*(self._attempt(post, self.url, m.payload) for m in messages)))
+
+    def _deliver_sync(self, post, messages: List[OutboxMessage]) -> List[Result]:
+        if self._batching(messages):
+            results = self._batch_results(messages, self._attempt_sync(post, self.batch_url, self._batch_body(messages)))
+            if results is not None:
+                return results
+        return [self._attempt_sync(post, self.url, m.payload) for m in messages]
+
+    async def _attempt(self, post, url: str, body: Any) -> Result:
+        self._requests_total += 1
+        try:
+            return await post(url, body)
+        except Exception as e:
+            return e
+
+    def _attempt_sync(self, post, url: str, body: Any) -> Result:
+        self._requests_total += 1
+        try:
+            return post(url, body)
+        except Exception as e:
+            return e
+
+    def _batching(self, messages: List[OutboxMessage]) -> bool:
+        return bool(self.batch_url) and len(messages) > 1
+
+    @staticmethod
+    def _batch_body(messages: List[OutboxMessage]) -> Dict:
+        return {"outcomes": [m.payload for m in messages]}
+
+    def _batch_results(self, messages: List[OutboxMessage], result: Result) -> Optional[List[Result]]:
+        """Per-message results of a batch POST, or None if the backend has no batch endpoint"""
+        if result in BATCH_UNSUPPORTED:
+            logger.warning(f"Backend batch endpoint returned {result}; sending outcomes one by one")
+            self.batch_url = None
+            return None
+        return [result] * len(messages)
+
+    def _settle(self, messages: List[OutboxMessage], results: List[Result]):
+        now = time.time()
+        delivered = []
+        for message, result in zip(messages, results):
+            if isinstance(result, int) and 200 <= result < 300:
+                delivered.append(message.id)
+                self._record_lag(now - message.created_at)
+                self._delivered_total += 1
+                continue
+
+            error = f"{type(result).__name__}: {result}" if isinstance(result, Exception) else f"HTTP {result}"
+            attempts = message.attempts + 1
+            permanent = isinstance(result, int) and 400 <= result < 500 and result not in RETRYABLE_CLIENT_ERRORS
+            if permanent or attempts >= self.max_attempts:
+                self._dead_total += 1
+                BACKEND_DELIVERIES.labels("dead").inc()
+                self.store.bury(message.id, error)
+                logger.error(f"Giving up on outcome for call {message.payload.get('call_id')} after {attempts} attempt(s): {error}")
+            else:
+                self._failed_attempts_total += 1
+                BACKEND_DELIVERIES.labels("retry").inc()
+                delay = retry_delay(attempts, self.retry_base, self.retry_max)
+                self.store.retry(message.id, now + delay, error)
+                logger.warning(f"Outcome for call {message.payload.get('call_id')} not delivered ({error}), retrying in {delay:.1f}s")
+
+        if delivered:
+            self.store.delete(delivered)
+            BACKEND_DELIVERIES.labels("delivered").inc(len(delivered))
+            logger.info(f"Delivered {len(delivered)} outcome(s) to backend")
+
+    def _record_lag(self, lag: float):
+        self._last_lag = lag
+        self._max_lag = max(self._max_lag, lag)
+        self._avg_lag = lag if self._delivered_total == 0 else 0.9 * self._avg_lag + 0.1 * lag
+
+    def _idle_timeout(self) -> float:
+        # Sleep until the next retry is due, but look again periodically in
+        # case another process spooled into the same file
+        next_due = self.store.next_due()
+        if next_due is None:
+            return self.idle_interval
+        return min(max(next_due - time.time(), 0.0), self.idle_interval)
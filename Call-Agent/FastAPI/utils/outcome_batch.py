@@ -0,0 +1,134 @@
+"""
+Bulk outcome scoring for re-analysing many transcripts at once.
+
+Each transcript is scanned once by the shared classifier's compiled pattern
+and its distinct keyword matches are collected as a sparse document x keyword
+matrix in coordinate form. Class scores for the whole batch come from a single
+``bincount`` over that matrix and the outcome rules are applied as vectorized
+masks, so no per-keyword or per-class Python code runs. Large inputs are split
+into chunks and scored in a process pool.
+
+Results are identical to ``OutcomeClassifier.classify`` for every transcript.
+Like the classifier, this module must not depend on the FastAPI config package.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.metrics import ANALYZE_SECONDS, timed
+from utils.outcome_classifier import CLASSES, MIN_TRANSCRIPT_LENGTH, OutcomeClassifier, _normalize, get_classifier
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; fall back to per-transcript scoring
+    np = None
+
+# Below this many transcripts a process pool costs more than it saves
+PARALLEL_THRESHOLD = 20000
+CHUNK_SIZE = 5000
+
+
+class _Columns(dict):
+    """Phrase -> column lookup that also accepts matches with irregular spacing"""
+
+    def __missing__(self, phrase: str) -> int:
+        return self[" ".join(phrase.split())]
+
+
+def score_matrix(classifier: OutcomeClassifier, transcripts: Sequence[str]):
+    """
+    Score a batch of transcripts.
+
+    Returns:
+        tuple: ``(scores, short)`` where ``scores`` is an ``(n, 3)`` int array of
+        distinct keyword counts per class (positive, negative, callback) and
+        ``short`` is a bool array marking transcripts too short to analyze.
+    """
+    n_classes = len(CLASSES)
+    class_ids = np.array([CLASSES.index(classifier.class_of(p)) for p in classifier.vocabulary], dtype=np.int64)
+    short = np.array([not t or len(t.strip()) < MIN_TRANSCRIPT_LENGTH for t in transcripts], dtype=bool)
+    if classifier.pattern is None:
+        return np.zeros((len(transcripts), n_classes), dtype=np.int64), short
+
+    # Term-presence matrix in COO form: one (row, column) entry per distinct
+    # phrase found in a transcript. findall/set/map all run in C, so the only
+    # Python work per transcript is this loop body.
+    findall = classifier.pattern.findall
+    column = _Columns(classifier.index).__getitem__
+    counts: List[int] = []
+    cols: List[int] = []
+    for transcript, is_short in zip(transcripts, short.tolist()):
+        found = () if is_short else set(findall(_normalize(transcript)))
+        counts.append(len(found))
+        cols.extend(map(column, found))
+
+    rows = np.repeat(np.arange(len(transcripts), dtype=np.int64), counts)
+    flat = rows * n_classes + class_ids[np.asarray(cols, dtype=np.int64)]
+    scores = np.bincount(flat, minlength=len(transcripts) * n_classes).reshape(len(transcripts), n_classes)
+    return scores, short
+
+
+def decide_matrix(scores, short) -> List[Dict]:
+    """Vectorized equivalent of ``OutcomeClassifier.decide`` over a score matrix"""
+    positive, negative, callback = scores[:, 0], scores[:, 1], scores[:, 2]
+    total = scores.sum(axis=1)
+
+    interested = (positive > negative) & (positive > 0)
+    is_callback = ~interested & (callback > 0) & (callback >= negative)
+    not_interested = ~interested & ~is_callback & (negative > 0)
+
+    chosen = np.where(interested, positive, np.where(is_callback, callback, np.where(not_interested, negative, 0)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confidence = np.where(total > 0, chosen / np.maximum(total, 1), 0.0)
+
+    code = np.select([short, interested, is_callback, not_interested], [0, 1, 2, 3], default=4)
+    results = []
+    for c, conf in zip(code.tolist(), confidence.tolist()):
+        if c == 0:
+            results.append({"outcome": "no_response", "qualified": False, "action": "follow_up"})
+        elif c == 1:
+            results.append({"outcome": "interested", "qualified": True, "action": "schedule_meeting", "confidence": conf})
+        elif c == 2:
+            results.append({"outcome": "callback", "qualified": False, "action": "schedule_callback", "confidence": conf})
+        elif c == 3:
+            results.append({"outcome": "not_interested", "qualified": False, "action": "blocklist", "confidence": conf})
+        else:
+            results.append({"outcome": "unclear", "qualified": False, "action": "follow_up", "confidence": 0.0})
+    return results
+
+
+def _score_chunk(args: Tuple[Optional[str], Sequence[str]]):
+    keywords_path, transcripts = args
+    return score_matrix(get_classifier(keywords_path), transcripts)
+
+
+@timed(ANALYZE_SECONDS.labels("batch"))
+def classify_batch(
+    transcripts: Sequence[str],
+    keywords_path: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Classify many transcripts; results match ``classify`` one-for-one.
+
+    Args:
+        transcripts: Transcript texts.
+        keywords_path: Keyword file, as for ``get_classifier``.
+        workers: Process pool size. Defaults to the CPU count for inputs of at
+            least ``PARALLEL_THRESHOLD`` transcripts; 1 disables the pool.
+    """
+    classifier = get_classifier(keywords_path)
+    if np is None:
+        return [classifier.classify(t) for t in transcripts]
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(transcripts) >= PARALLEL_THRESHOLD else 1
+    if workers <= 1 or len(transcripts) <= CHUNK_SIZE:
+        return decide_matrix(*score_matrix(classifier, transcripts))
+
+    chunks = [(keywords_path, transcripts[i:i + CHUNK_SIZE]) for i in range(0, len(transcripts), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_score_chunk, chunks))
+    scores = np.concatenate([part[0] for part in parts])
+    short = np.concatenate([part[1] for part in parts])
+    return decide_matrix(scores, short)
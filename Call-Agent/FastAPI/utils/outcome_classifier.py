@@ -0,0 +1,160 @@
+"""
+Keyword outcome classifier shared by ElevenLabsAgent and the callagent VoiceAgent.
+
+All keyword sets are compiled into one regular expression built from a
+character trie, so a transcript is scanned once and the work per character
+depends on the keyword trie depth rather than on how many keywords there are.
+Matches are whole words/phrases only ("no" does not match "know") and the
+longest phrase wins at each position, so "not interested" counts as one
+negative phrase instead of also counting "interested" as positive.
+
+This module is imported by the standalone callagent scripts as well, so it
+must not depend on the FastAPI config package.
+"""
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_KEYWORDS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "config", "outcome_keywords.json"
+)
+
+# Keyword classes, in the order they are scored
+CLASSES = ("positive", "negative", "callback")
+
+# Transcripts shorter than this (after stripping) are treated as no response
+MIN_TRANSCRIPT_LENGTH = 10
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("’", "'")
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Build a regex alternation from a character trie of the phrases"""
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def emit(node: Dict) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + emit(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        if "" in node:
+            # A phrase may end here: make the continuation optional, greedy so
+            # the longest phrase is preferred
+            return "(?:" + "|".join(branches) + ")?"
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return emit(trie)
+
+
+class OutcomeClassifier:
+    """Score transcripts against keyword classes and decide the call outcome"""
+
+    def __init__(self, keywords: Dict[str, List[str]]):
+        self.keywords: Dict[str, List[str]] = {}
+        self._class_of: Dict[str, str] = {}
+        for cls in CLASSES:
+            phrases = [" ".join(_normalize(kw).split()) for kw in keywords.get(cls, [])]
+            for phrase in phrases:
+                if phrase in self._class_of and self._class_of[phrase] != cls:
+                    raise ValueError(
+                        f"Keyword '{phrase}' is listed under both '{self._class_of[phrase]}' and '{cls}'"
+                    )
+                self._class_of[phrase] = cls
+            self.keywords[cls] = phrases
+
+        # Column index of each phrase, used for term-count vectors
+        self.vocabulary: List[str] = sorted(self._class_of)
+        self.index: Dict[str, int] = {phrase: i for i, phrase in enumerate(self.vocabulary)}
+        self.pattern = re.compile(r"\b" + _trie_pattern(self.vocabulary) + r"\b") if self.vocabulary else None
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "OutcomeClassifier":
+        with open(path or DEFAULT_KEYWORDS_PATH, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def class_of(self, phrase: str) -> str:
+        return self._class_of[phrase]
+
+    def matched_phrases(self, transcript: str) -> set:
+        """Distinct keyword phrases present in the transcript (single pass)"""
+        if not self.pattern:
+            return set()
+        return {" ".join(m.group().split()) for m in self.pattern.finditer(_normalize(transcript))}
+
+    def scores(self, transcript: str) -> Dict[str, int]:
+        """Number of distinct keywords of each class found in the transcript"""
+        scores = dict.fromkeys(CLASSES, 0)
+        for phrase in self.matched_phrases(transcript):
+            scores[self._class_of[phrase]] += 1
+        return scores
+
+    @staticmethod
+    def decide(positive: int, negative: int, callback: int) -> Dict:
+        """Map class scores to an outcome"""
+        total = positive + negative + callback
+        if positive > negative and positive > 0:
+            return {
+                "outcome": "interested",
+                "qualified": True,
+                "action": "schedule_meeting",
+                "confidence": positive / total,
+            }
+        elif callback > 0 and callback >= negative:
+            return {
+                "outcome": "callback",
+                "qualified": False,
+                "action": "schedule_callback",
+                "confidence": callback / total,
+            }
+        elif negative > 0:
+            return {
+                "outcome": "not_interested",
+                "qualified": False,
+                "action": "blocklist",
+                "confidence": negative / total,
+            }
+        else:
+            return {
+                "outcome": "unclear",
+                "qualified": False,
+                "action": "follow_up",
+                "confidence": 0.0,
+            }
+
+    def classify(self, transcript: str) -> Dict:
+        """Analyze a call transcript and return its outcome"""
+        if not transcript or len(transcript.strip()) < MIN_TRANSCRIPT_LENGTH:
+            return {
+                "outcome": "no_response",
+                "qualified": False,
+                "action": "follow_up"
+            }
+        scores = self.scores(transcript)
+        return self.decide(scores["positive"], scores["negative"], scores["callback"])
+
+
+_classifiers: Dict[str, OutcomeClassifier] = {}
+
+
+def get_classifier(path: Optional[str] = None) -> OutcomeClassifier:
+    """
+    Return the process-wide classifier for a keyword file.
+
+    The path defaults to ``OUTCOME_KEYWORDS_PATH`` from the environment, then
+    to ``config/outcome_keywords.json`` next to the FastAPI service.
+    """
+    path = os.path.abspath(path or os.getenv("OUTCOME_KEYWORDS_PATH") or DEFAULT_KEYWORDS_PATH)
+    if path not in _classifiers:
+        _classifiers[path] = OutcomeClassifier.from_file(path)
+    return _classifiers[path]
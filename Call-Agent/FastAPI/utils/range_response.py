@@ -0,0 +1,126 @@
+"""
+File responses with HTTP Range support and zero-copy sending.
+
+Starlette's FileResponse (0.27) always sends the whole file, read through a
+thread in small chunks. ``RangeFileResponse`` answers single-range requests
+with ``206 Partial Content`` (``bytes=a-b``, ``bytes=a-`` and ``bytes=-n``),
+honours ``If-Range`` and ``If-None-Match`` against the file's ETag, and
+rejects unsatisfiable ranges with ``416``. Multi-range requests get the
+whole file, which RFC 9110 allows.
+
+When the ASGI server offers the ``http.response.zerocopysend`` extension the
+body is handed to the kernel with ``sendfile``; otherwise it is read with
+``pread`` in large chunks off the event loop.
+"""
+import os
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+ZEROCOPY = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single ``bytes=`` range, or None to send the
+    whole file (no header, another unit, several ranges or a malformed value).
+
+    Raises:
+        RangeNotSatisfiable: If the range starts past the end of the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or start < 0:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class RangeFileResponse(Response):
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Mapping[str, str],
+        media_type: str,
+        etag: str,
+        method: str = "GET",
+        headers: Optional[Mapping[str, str]] = None,
+    ):
+        super().__init__(content=None, media_type=media_type, headers=headers)
+        self.path = path
+        self.send_body = method != "HEAD"
+        self.size = os.stat(path).st_size
+        self.range: Optional[Tuple[int, int]] = None
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["etag"] = etag
+
+        if request_headers.get("if-none-match") == etag:
+            self.status_code = 304
+            self.send_body = False
+            del self.headers["content-length"]
+            return
+        if_range = request_headers.get("if-range")
+        if if_range is None or if_range == etag:
+            try:
+                self.range = parse_range(request_headers.get("range"), self.size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.send_body = False
+                self.headers["content-range"] = f"bytes */{self.size}"
+                self.headers["content-length"] = "0"
+                return
+        if self.range is not None:
+            start, end = self.range
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{self.size}"
+            self.headers["content-length"] = str(end - start + 1)
+        else:
+            self.headers["content-length"] = str(self.size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        start, end = self.range if self.range is not None else (0, self.size - 1)
+        count = end - start + 1
+        with open(self.path, "rb") as file:
+            if ZEROCOPY in scope.get("extensions", {}):
+                await send({"type": ZEROCOPY, "file": file, "offset": start, "count": count, "more_body": False})
+                return
+            fd = file.fileno()
+            offset = start
+            while count > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(self.chunk_size, count), offset)
+                if not chunk:
+                    break  # the file shrank underneath us
+                offset += len(chunk)
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+        if count > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
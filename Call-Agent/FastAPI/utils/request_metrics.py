@@ -0,0 +1,72 @@
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from utils.metrics import REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """
+    Request logging and per-route latency histograms as plain ASGI middleware.
+
+    Unlike ``@app.middleware("http")`` this does not wrap the request in a
+    second task or buffer its body, so it adds almost nothing per request and
+    cannot stall reads of the body downstream. Latency is labelled with the
+    matched route template (``/api/agent/transcript/{call_id}``), never the raw
+    path, to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Optional[Dict[Callable, str]] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        logger.info(f"Incoming Request: {method} {scope['path']}")
+        if logger.isEnabledFor(logging.DEBUG):
+            receive = self._logging_receive(receive)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.labels(method, self._route(scope), str(status)).observe(time.perf_counter() - start)
+            logger.info(f"Response Status: {status} for {method} {scope['path']}")
+
+    def _route(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._templates is None:
+            # The router records the matched endpoint in the scope; map it
+            # back to its path template once
+            self._templates = {
+                r.endpoint: r.path for r in getattr(scope.get("app"), "routes", []) if hasattr(r, "endpoint")
+            }
+        return self._templates.get(endpoint, "unmatched")
+
+    @staticmethod
+    def _logging_receive(receive):
+        async def wrapped():
+            message = await receive()
+            if message.get("body"):
+                logger.debug(f"Request Body: {message['body']}")
+            return message
+        return wrapped
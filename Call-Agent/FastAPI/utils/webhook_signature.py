@@ -0,0 +1,89 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Mapping, Optional
+
+
+def verify_elevenlabs_signature(
+    payload: bytes,
+    signature_header: Optional[str],
+    secret: str,
+    tolerance: int = 1800,
+) -> bool:
+    """
+    Verify an ElevenLabs webhook ``ElevenLabs-Signature`` header.
+
+    The header has the form ``t=<unix timestamp>,v0=<hex digest>`` where the
+    digest is HMAC-SHA256 of ``"<timestamp>.<raw body>"`` keyed with the webhook
+    secret. Requests older than ``tolerance`` seconds are rejected to limit
+    replay.
+
+    Args:
+        payload (bytes): The raw request body, exactly as received.
+        signature_header (str): Value of the ``ElevenLabs-Signature`` header.
+        secret (str): The webhook secret configured in ElevenLabs.
+        tolerance (int): Maximum accepted age of the signature in seconds.
+
+    Returns:
+        bool: True if the signature is valid and fresh.
+    """
+    if not signature_header or not secret:
+        return False
+
+    parts = dict(
+        part.split("=", 1) for part in signature_header.split(",") if "=" in part
+    )
+    timestamp = parts.get("t")
+    signature = parts.get("v0")
+    if not timestamp or not signature:
+        return False
+
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance:
+            return False
+    except ValueError:
+        return False
+
+    expected = hmac.new(
+        secret.encode(),
+        timestamp.encode() + b"." + payload,
+        hashlib.sha256,
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def twilio_signature(url: str, params: Mapping[str, str], auth_token: str) -> str:
+    """
+    Compute Twilio's ``X-Twilio-Signature`` for a form-encoded callback.
+
+    The signature is the base64 HMAC-SHA1, keyed with the account's auth
+    token, of the full callback URL (query string included) followed by
+    every POST parameter name and value, sorted by name.
+    """
+    data = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+    digest = hmac.new(auth_token.encode(), data.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+
+def verify_twilio_signature(
+    url: str,
+    params: Mapping[str, str],
+    signature: Optional[str],
+    auth_token: str,
+) -> bool:
+    """
+    Verify a Twilio webhook ``X-Twilio-Signature`` header.
+
+    Args:
+        url (str): The public URL Twilio called, exactly as configured.
+        params (Mapping[str, str]): The POST form parameters.
+        signature (str): Value of the ``X-Twilio-Signature`` header.
+        auth_token (str): The Twilio account auth token.
+
+    Returns:
+        bool: True if the signature matches.
+    """
+    if not signature or not auth_token:
+        return False
+    return hmac.compare_digest(twilio_signature(url, params, auth_token), signature)
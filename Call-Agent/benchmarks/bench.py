@@ -0,0 +1,172 @@
+"""
+Benchmark runner - microbenchmarks and an end-to-end load test with baselines
+
+Usage:
+    python bench.py micro                 # run, compare with baselines.json
+    python bench.py load --quick          # shorter load run
+    python bench.py all --save            # record new baselines
+    python bench.py micro --threshold 0.3 --metrics throughput,p95
+
+Every benchmark reports throughput (ops/s) and p50/p95/p99 latency in ms.
+Results are compared with the stored baseline of the same name; the run
+exits with status 1 when a compared metric regresses by more than the
+threshold (throughput lower, latency higher). Baselines are machine-specific:
+record them with ``--save`` on the machine that runs the check.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines.json")
+METRICS = ("throughput", "p50", "p95", "p99")
+DEFAULT_METRICS = ("throughput", "p50", "p95")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+@dataclass
+class Result:
+    """Outcome of one benchmark; latencies are per operation, in seconds"""
+    name: str
+    ops: int
+    seconds: float
+    latencies: List[float]
+    errors: int = 0
+
+    def summary(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        return {
+            "throughput": self.ops / self.seconds if self.seconds else 0.0,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "errors": self.errors,
+        }
+
+
+def load_baselines(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"meta": {}, "results": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(path: str, summaries: Dict[str, Dict], existing: Dict):
+    """Merge new summaries into the baseline file, keeping other benchmarks"""
+    results = dict(existing.get("results", {}))
+    for name, summary in summaries.items():
+        results[name] = {metric: float(f"{value:.4g}") for metric, value in summary.items()}
+    data = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": dict(sorted(results.items())),
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def compare(summary: Dict, baseline: Optional[Dict], metrics, threshold: float) -> List[str]:
+    """Names of the metrics that regressed beyond the threshold"""
+    if not baseline:
+        return []
+    regressed = []
+    for metric in metrics:
+        base, current = baseline.get(metric), summary.get(metric)
+        if not base or current is None:
+            continue
+        if metric == "throughput":
+            if current < base * (1 - threshold):
+                regressed.append(metric)
+        elif current > base * (1 + threshold):
+            regressed.append(metric)
+    return regressed
+
+
+def _format_ms(value: float) -> str:
+    return f"{value * 1000:.1f}us" if value < 1 else f"{value:.2f}ms"
+
+
+def report(summaries: Dict[str, Dict], baselines: Dict, metrics, threshold: float) -> int:
+    """Print a result table with the change against baseline; returns the regression count"""
+    print(f"\n{'benchmark':<34} {'ops/s':>11} {'p50':>10} {'p95':>10} {'p99':>10} {'err':>5}  vs baseline")
+    failures = 0
+    for name, summary in summaries.items():
+        baseline = baselines.get("results", {}).get(name)
+        regressed = compare(summary, baseline, metrics, threshold)
+        failures += bool(regressed)
+        if baseline and baseline.get("throughput"):
+            change = summary["throughput"] / baseline["throughput"] - 1
+            note = f"{change:+.0%} ops/s"
+            if regressed:
+                note += f"  REGRESSED: {', '.join(regressed)}"
+        else:
+            note = "no baseline"
+        print(
+            f"{name:<34} {summary['throughput']:>11,.0f} {_format_ms(summary['p50']):>10} "
+            f"{_format_ms(summary['p95']):>10} {_format_ms(summary['p99']):>10} {summary['errors']:>5}  {note}"
+        )
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Call pipeline benchmarks with regression thresholds")
+    parser.add_argument("suite", nargs="?", choices=("micro", "load", "all"), default="all")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file (default: baselines.json)")
+    parser.add_argument("--save", action="store_true", help="Record the results as the new baselines")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression as a fraction (default 0.2)")
+    parser.add_argument(
+        "--metrics", default=",".join(DEFAULT_METRICS),
+        help=f"Metrics compared with the baseline (default {','.join(DEFAULT_METRICS)}; p99 is noisy)",
+    )
+    parser.add_argument("--only", help="Run only benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Fewer iterations and concurrency levels")
+    parser.add_argument("--concurrency", help="Load test concurrency levels, e.g. 1,8,32,64")
+    args = parser.parse_args(argv)
+
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        parser.error(f"unknown metric(s): {', '.join(unknown)}")
+
+    results: List[Result] = []
+    if args.suite in ("micro", "all"):
+        import micro
+        results += micro.run(quick=args.quick, only=args.only)
+    if args.suite in ("load", "all"):
+        import load
+        levels = [int(c) for c in args.concurrency.split(",")] if args.concurrency else None
+        results += load.run(quick=args.quick, only=args.only, levels=levels)
+
+    summaries = {result.name: result.summary() for result in results}
+    baselines = load_baselines(args.baseline)
+    failures = report(summaries, baselines, metrics, args.threshold)
+
+    if args.save:
+        save_baselines(args.baseline, summaries, baselines)
+        print(f"\nSaved {len(summaries)} baseline(s) to {args.baseline}")
+        return 0
+    if failures:
+        print(f"\n{failures} benchmark(s) regressed more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+End-to-end load test of the FastAPI service against the local simulator
+
+Starts the simulator (Call-Agent/simulator) and the service as uvicorn
+subprocesses on free ports, with the service's ElevenLabs and backend URLs
+pointed at the simulator, then drives ``POST /api/agent/call``,
+``GET /api/agent/transcript/{id}`` and ``POST /api/agent/analyze`` at
+increasing concurrency. Each level issues a fixed number of requests from
+that many concurrent workers over pooled connections.
+"""
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+import httpx
+
+from bench import BENCH_DIR, Result
+from micro import transcript_text
+
+SERVICE_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "FastAPI"))
+SIMULATOR_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "simulator"))
+
+LEVELS = (1, 8, 32, 64)
+QUICK_LEVELS = (1, 8, 32)
+# Fast upstreams so the numbers reflect this service rather than the simulator
+SIM_LATENCY_MS = "5,25"
+STARTUP_TIMEOUT = 30
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Servers:
+    """Simulator and service subprocesses, logging to a scratch directory"""
+
+    def __init__(self):
+        self.scratch = tempfile.mkdtemp(prefix="callagent-load-")
+        self.sim_port = _free_port()
+        self.service_port = _free_port()
+        self.processes: List[subprocess.Popen] = []
+
+    @property
+    def service_url(self) -> str:
+        return f"http://127.0.0.1:{self.service_port}"
+
+    def _spawn(self, name: str, cwd: str, port: int, env: dict):
+        log = open(os.path.join(self.scratch, f"{name}.log"), "w")
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+            cwd=cwd, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT,
+        ))
+
+    def _wait(self, url: str):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if any(p.poll() is not None for p in self.processes):
+                break
+            try:
+                if httpx.get(url, timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"{url} did not come up; see logs in {self.scratch}")
+
+    def __enter__(self) -> "Servers":
+        sim = f"http://127.0.0.1:{self.sim_port}"
+        self._spawn("simulator", SIMULATOR_DIR, self.sim_port, {
+            "SIM_ELEVENLABS_LATENCY_MS": SIM_LATENCY_MS,
+            "SIM_BACKEND_LATENCY_MS": SIM_LATENCY_MS,
+        })
+        self._spawn("service", SERVICE_DIR, self.service_port, {
+            "DATABASE_URL": os.environ.get("DATABASE_URL", "bench"),
+            "AWS_COGNITO_REGION": os.environ.get("AWS_COGNITO_REGION", "bench"),
+            "ELEVENLABS_BASE_URL": f"{sim}/v1/convai",
+            "ELEVENLABS_API_KEY": "bench",
+            "ELEVENLABS_AGENT_ID": "bench-agent",
+            "ELEVENLABS_PHONE_ID": "bench-phone",
+            "BACKEND_URL": sim,
+            "OUTBOX_PATH": os.path.join(self.scratch, "outbox.sqlite3"),
+            "CALL_REGISTRY_PATH": os.path.join(self.scratch, "calls.sqlite3"),
+            "IDEMPOTENCY_PATH": os.path.join(self.scratch, "idempotency.sqlite3"),
+            "RECORDING_CACHE_DIR": os.path.join(self.scratch, "recordings"),
+            "ARCHIVE_DIR": os.path.join(self.scratch, "archive"),
+            "SEARCH_INDEX_PATH": os.path.join(self.scratch, "search.sqlite3"),
+            "TWILIO_CALLS_PATH": os.path.join(self.scratch, "twilio_calls.sqlite3"),
+        })
+        try:
+            self._wait(f"{sim}/sim/stats")
+            self._wait(f"{self.service_url}/")
+        except Exception:
+            self.__exit__()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def drive(name: str, client: httpx.AsyncClient, request: Callable, total: int, concurrency: int) -> Result:
+    """Issue ``total`` requests from ``concurrency`` workers; non-2xx responses count as errors"""
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while next(counter) < total:
+            start = time.perf_counter()
+            try:
+                response = await request(client)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return Result(name, total, time.perf_counter() - start, latencies, errors)
+
+
+async def scenario(base_url: str, levels, requests_per_level: int, only: Optional[str]) -> List[Result]:
+    call_ids: List[str] = []
+    phones = (f"+1555{n:07d}" for n in itertools.count())
+    transcript = {"transcript": transcript_text(16)}
+
+    async def call(client):
+        response = await client.post("/api/agent/call", json={
+            "phone": next(phones), "name": "Jordan", "company": "Acme", "context": {"lead_id": "bench"},
+        })
+        if response.status_code == 200 and response.json().get("call_id"):
+            call_ids.append(response.json()["call_id"])
+        return response
+
+    async def get_transcript(client):
+        return await client.get(f"/api/agent/transcript/{call_ids[next(picks) % len(call_ids)]}")
+
+    async def analyze(client):
+        return await client.post("/api/agent/analyze", json=transcript)
+
+    picks = itertools.count()
+    results = []
+    for level in levels:
+        limits = httpx.Limits(max_connections=level, max_keepalive_connections=level)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            total = max(requests_per_level, level * 4)
+            for endpoint, request in (("call", call), ("transcript", get_transcript), ("analyze", analyze)):
+                name = f"load.{endpoint}.c{level}"
+                if only and only not in name:
+                    continue
+                if endpoint == "transcript" and not call_ids:
+                    continue
+                result = await drive(name, client, request, total, level)
+                print(f"  {name}: {result.ops} requests in {result.seconds:.2f}s, {result.errors} errors")
+                results.append(result)
+    return results
+
+
+def run(quick: bool = False, only: Optional[str] = None, levels=None) -> List[Result]:
+    levels = levels or (QUICK_LEVELS if quick else LEVELS)
+    requests_per_level = 100 if quick else 400
+    with Servers() as servers:
+        print(f"  service {servers.service_url}, simulator port {servers.sim_port}, logs in {servers.scratch}")
+        return asyncio.run(scenario(servers.service_url, levels, requests_per_level, only))
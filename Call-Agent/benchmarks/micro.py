@@ -0,0 +1,209 @@
+"""
+Microbenchmarks for the hot in-process steps of the call pipeline
+
+- outcome analysis in both agents (FastAPI ElevenLabsAgent, callagent VoiceAgent)
+- transcript assembly from an ElevenLabs conversation payload
+- validation error formatting (pydantic_to_form_error)
+- request middleware overhead, as bare ASGI dispatch with and without it
+
+Operations are timed in batches so clock overhead stays out of the numbers;
+each batch contributes one per-operation latency sample.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+from bench import BENCH_DIR, Result
+
+SERVICE_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "FastAPI"))
+CALLAGENT_DIR = os.path.abspath(os.path.join(BENCH_DIR, "..", "callagent"))
+for path in (SERVICE_DIR, CALLAGENT_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+# Settings the service config requires; its on-disk stores go to a scratch dir
+_scratch = tempfile.mkdtemp(prefix="callagent-bench-")
+os.environ.setdefault("DATABASE_URL", "bench")
+os.environ.setdefault("AWS_COGNITO_REGION", "bench")
+os.environ["OUTBOX_PATH"] = os.path.join(_scratch, "outbox.sqlite3")
+os.environ["CALL_REGISTRY_PATH"] = os.path.join(_scratch, "calls.sqlite3")
+os.environ["IDEMPOTENCY_PATH"] = os.path.join(_scratch, "idempotency.sqlite3")
+os.environ["RECORDING_CACHE_DIR"] = os.path.join(_scratch, "recordings")
+os.environ["ARCHIVE_DIR"] = os.path.join(_scratch, "archive")
+os.environ["SEARCH_INDEX_PATH"] = os.path.join(_scratch, "search.sqlite3")
+os.environ["TWILIO_CALLS_PATH"] = os.path.join(_scratch, "twilio_calls.sqlite3")
+
+TURNS = [
+    ("agent", "Hi {name}, this is Alex from Infynd. Do you have a minute to talk about your outbound pipeline?"),
+    ("user", "Sure, I have a couple of minutes. What is this about?"),
+    ("agent", "We help sales teams book more meetings with AI-assisted calling. How do you handle prospecting today?"),
+    ("user", "Mostly manual dialing, it takes a lot of time and the connect rates are low."),
+    ("agent", "That is exactly what we solve. Would it make sense to set up a short demo next week?"),
+    ("user", "That sounds interesting. Let's schedule a meeting, Tuesday afternoon works for me."),
+    ("agent", "Great, I will send over an invite. Anything else you would like us to cover?"),
+    ("user", "Maybe pricing, but otherwise I'm looking forward to it. Thanks, bye."),
+]
+
+
+def conversation(turns: int) -> dict:
+    """ElevenLabs conversation payload with the given number of turns"""
+    return {
+        "conversation_id": "conv_bench",
+        "status": "done",
+        "transcript": [
+            {"role": role, "message": text.format(name="Jordan"), "time_in_call_secs": i * 7}
+            for i, (role, text) in enumerate(TURNS[i % len(TURNS)] for i in range(turns))
+        ],
+        "metadata": {"call_duration_secs": turns * 7},
+    }
+
+
+def transcript_text(turns: int) -> str:
+    return "\n".join(f"{item['role']}: {item['message']}" for item in conversation(turns)["transcript"])
+
+
+def measure(name: str, func: Callable, batch: int, samples: int) -> Result:
+    """Time ``samples`` batches of ``batch`` calls after a short warm-up"""
+    for _ in range(min(batch, 100)):
+        func()
+    latencies: List[float] = []
+    clock = time.perf_counter
+    total = 0.0
+    for _ in range(samples):
+        start = clock()
+        for _ in range(batch):
+            func()
+        elapsed = clock() - start
+        total += elapsed
+        latencies.append(elapsed / batch)
+    return Result(name, batch * samples, total, latencies)
+
+
+def measure_async(name: str, func: Callable, batch: int, samples: int) -> Result:
+    """``measure`` for a coroutine function, awaited on one event loop"""
+    async def runner():
+        for _ in range(min(batch, 100)):
+            await func()
+        latencies: List[float] = []
+        clock = time.perf_counter
+        total = 0.0
+        for _ in range(samples):
+            start = clock()
+            for _ in range(batch):
+                await func()
+            elapsed = clock() - start
+            total += elapsed
+            latencies.append(elapsed / batch)
+        return Result(name, batch * samples, total, latencies)
+    return asyncio.run(runner())
+
+
+def bench_analyze_elevenlabs(scale: int) -> List[Result]:
+    from agents.elevenlabs_agent import ElevenLabsAgent
+
+    agent = ElevenLabsAgent()
+    short, long = transcript_text(8), transcript_text(120)
+    return [
+        measure("analyze_outcome.elevenlabs.8turns", lambda: agent.analyze_outcome(short), 200, 50 * scale),
+        measure("analyze_outcome.elevenlabs.120turns", lambda: agent.analyze_outcome(long), 20, 50 * scale),
+    ]
+
+
+def bench_analyze_voice_agent(scale: int) -> List[Result]:
+    from loguru import logger
+    from voice_agent import VoiceAgent
+
+    # The agent logs every score; keep sink I/O out of the measurement
+    logger.remove()
+    agent = VoiceAgent(use_mock=True)
+    short, long = transcript_text(8), transcript_text(120)
+    return [
+        measure("analyze_outcome.voice_agent.8turns", lambda: agent.analyze_outcome(short), 200, 50 * scale),
+        measure("analyze_outcome.voice_agent.120turns", lambda: agent.analyze_outcome(long), 20, 50 * scale),
+    ]
+
+
+def bench_parse_conversation(scale: int) -> List[Result]:
+    from agents.elevenlabs_agent import ElevenLabsAgent
+
+    agent = ElevenLabsAgent()
+    short, long = conversation(8), conversation(400)
+    return [
+        measure("get_transcript.parse.8turns", lambda: agent.parse_conversation("conv_bench", short), 500, 50 * scale),
+        measure("get_transcript.parse.400turns", lambda: agent.parse_conversation("conv_bench", long), 20, 50 * scale),
+    ]
+
+
+def bench_form_errors(scale: int) -> List[Result]:
+    from pydantic import ValidationError
+    from route.call_agent import BatchCallRequest
+    from utils.pydanticToFormError import pydantic_to_form_error
+
+    try:
+        BatchCallRequest(leads=[{"phone": 1}, {"name": None}] * 10)
+    except ValidationError as e:
+        errors = e.errors()
+    return [measure("pydantic_to_form_error.60errors", lambda: pydantic_to_form_error(errors), 100, 50 * scale)]
+
+
+def bench_middleware(scale: int) -> List[Result]:
+    from fastapi import FastAPI
+    from utils.request_metrics import RequestMetricsMiddleware
+
+    def build(with_middleware: bool):
+        app = FastAPI()
+
+        @app.get("/api/agent/transcript/{call_id}")
+        async def transcript(call_id: str):
+            return {"call_id": call_id}
+
+        if with_middleware:
+            app.add_middleware(RequestMetricsMiddleware)
+        return app
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/agent/transcript/conv_bench", "raw_path": b"/api/agent/transcript/conv_bench",
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    results = []
+    for name, app in (("asgi.bare", build(False)), ("asgi.request_metrics", build(True))):
+        results.append(measure_async(name, lambda app=app: app(dict(scope), receive, send), 50, 40 * scale))
+    return results
+
+
+BENCHMARKS = (
+    bench_analyze_elevenlabs,
+    bench_analyze_voice_agent,
+    bench_parse_conversation,
+    bench_form_errors,
+    bench_middleware,
+)
+
+
+def run(quick: bool = False, only: Optional[str] = None) -> List[Result]:
+    scale = 1 if quick else 4
+    results: List[Result] = []
+    for bench in BENCHMARKS:
+        for result in bench(scale):
+            if only and only not in result.name:
+                continue
+            print(f"  {result.name}: {result.ops} ops in {result.seconds:.2f}s")
+            results.append(result)
+
+    by_name = {result.name: result.summary() for result in results}
+    if "asgi.bare" in by_name and "asgi.request_metrics" in by_name:
+        overhead = (by_name["asgi.request_metrics"]["p50"] - by_name["asgi.bare"]["p50"]) * 1000
+        print(f"  request middleware overhead: {overhead:.1f}us per request (p50)")
+    return results
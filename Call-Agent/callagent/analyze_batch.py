@@ -0,0 +1,109 @@
+"""Analyze Batch - Re-score many call transcripts offline
+
+Usage:
+    python analyze_batch.py transcripts.jsonl -o outcomes.jsonl
+    python analyze_batch.py --transcript "Yes, I'd like a demo" --transcript "Not interested"
+    python analyze_batch.py transcripts.jsonl --benchmark
+
+Each JSONL line is either a JSON string (the transcript) or an object with a
+"transcript" field; objects are written back with an added "analysis" field.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, Iterator, List
+
+import shared  # noqa: F401  (puts the FastAPI service on sys.path)
+from utils.outcome_batch import classify_batch
+from utils.outcome_classifier import get_classifier
+
+SAMPLE_TURNS = [
+    "agent: Hi, this is Alex calling about our scheduling platform.",
+    "user: Yes, that sounds good, tell me more.",
+    "user: I'm busy now, can you call back next week?",
+    "user: No thanks, I'm not interested.",
+    "user: Please remove me from your list.",
+    "user: Sure, I would like a demo.",
+    "agent: Would Tuesday work for a meeting?",
+    "user: Hmm, I don't know yet.",
+    "user: Maybe later, I'm not available today.",
+]
+
+
+def read_records(path: str, field: str) -> Iterator[Dict]:
+    with (sys.stdin if path == "-" else open(path, "r", encoding="utf-8")) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {field: record}
+            elif not isinstance(record, dict) or not isinstance(record.get(field, ""), str):
+                raise ValueError(f"line {line_no}: expected a string or an object with a '{field}' string")
+            yield record
+
+
+def synthetic_transcripts(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    return ["\n".join(rng.choices(SAMPLE_TURNS, k=rng.randint(2, 12))) for _ in range(count)]
+
+
+def benchmark(transcripts: List[str], workers: int = None):
+    """Compare per-transcript analysis with batch scoring and check they agree"""
+    classifier = get_classifier()
+
+    start = time.perf_counter()
+    expected = [classifier.classify(t) for t in transcripts]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = classify_batch(transcripts, workers=workers)
+    batch = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, results) if a != b)
+    n = len(transcripts)
+    print(f"transcripts:     {n}")
+    print(f"per-transcript:  {single:.3f}s  ({n / single:,.0f}/s)")
+    print(f"batch:           {batch:.3f}s  ({n / batch:,.0f}/s)  x{single / batch:.2f}")
+    print(f"mismatches:      {mismatches}")
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze call transcripts in bulk")
+    parser.add_argument("input", nargs="?", help="JSONL file of transcripts ('-' for stdin)")
+    parser.add_argument("--transcript", action="append", default=[], help="Transcript text (repeatable)")
+    parser.add_argument("--field", default="transcript", help="Transcript field in JSONL objects")
+    parser.add_argument("-o", "--output", help="Write results as JSONL to this file (default: stdout)")
+    parser.add_argument("--workers", type=int, help="Process pool size (default: CPU count for large inputs)")
+    parser.add_argument("--benchmark", action="store_true", help="Time batch scoring against per-transcript analysis")
+    parser.add_argument("--synthetic", type=int, default=100000, help="Generated transcripts to benchmark when no input is given")
+    args = parser.parse_args()
+
+    records = [{args.field: t} for t in args.transcript]
+    if args.input:
+        records.extend(read_records(args.input, args.field))
+    transcripts = [r.get(args.field) or "" for r in records]
+
+    if args.benchmark:
+        ok = benchmark(transcripts or synthetic_transcripts(args.synthetic), args.workers)
+        sys.exit(0 if ok else 1)
+
+    if not records:
+        parser.error("no transcripts given")
+
+    results = classify_batch(transcripts, workers=args.workers)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for record, analysis in zip(records, results):
+            out.write(json.dumps({**record, "analysis": analysis}) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
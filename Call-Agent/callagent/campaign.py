@@ -0,0 +1,175 @@
+"""Campaign Runner - Work through a lead list concurrently
+
+Leads are handled by a fixed number of asyncio workers. Each worker takes
+the next lead, waits for a caller ID to be free, and runs the lead's
+handler (dial, wait for the call to finish, analyze, follow up). The
+blocking Twilio/SMTP clients run in a thread pool sized to the workers.
+
+Caller IDs are paced independently: a number dials at most
+``calls_per_second`` times a second and holds at most
+``max_calls_per_caller`` live calls, released as soon as the handler says
+the call is over (the analysis and follow-up that come after do not hold
+the line).
+"""
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+
+class CallerPool:
+    """Hands out caller IDs, spacing dials per number and capping its live calls"""
+
+    def __init__(self, caller_ids: List[str], calls_per_second: float = 1.0, max_calls_per_caller: int = 5):
+        if not caller_ids:
+            raise ValueError("At least one caller ID is required")
+        self.interval = 1.0 / calls_per_second if calls_per_second > 0 else 0.0
+        self.max_calls = max_calls_per_caller
+        self.active: Dict[str, int] = {caller: 0 for caller in caller_ids}
+        self._next_dial: Dict[str, float] = {caller: 0.0 for caller in caller_ids}
+        self._changed = asyncio.Condition()
+
+    async def acquire(self) -> str:
+        """Reserve a caller ID, waiting for a free slot and for its next dial time"""
+        async with self._changed:
+            while True:
+                free = [caller for caller, calls in self.active.items() if calls < self.max_calls]
+                if free:
+                    break
+                await self._changed.wait()
+            # Of the free numbers, the one that may dial soonest
+            caller = min(free, key=self._next_dial.__getitem__)
+            now = time.monotonic()
+            dial_at = max(now, self._next_dial[caller])
+            self._next_dial[caller] = dial_at + self.interval
+            self.active[caller] += 1
+        if dial_at > now:
+            await asyncio.sleep(dial_at - now)
+        return caller
+
+    async def release(self, caller: str):
+        async with self._changed:
+            self.active[caller] -= 1
+            self._changed.notify()
+
+
+class CampaignStats:
+    """Running totals for the progress line and the final summary"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started_at = time.monotonic()
+        self.done = 0
+        self.in_flight = 0
+        self.statuses: Counter = Counter()
+        self.outcomes: Counter = Counter()
+
+    def finish(self, status: str, outcome: Optional[str] = None):
+        self.done += 1
+        self.statuses[status] += 1
+        if outcome:
+            self.outcomes[outcome] += 1
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def per_hour(self) -> float:
+        elapsed = self.elapsed()
+        return self.done / elapsed * 3600 if elapsed > 0 else 0.0
+
+    def line(self) -> str:
+        rate = self.per_hour()
+        remaining = self.total - self.done
+        eta = str(timedelta(seconds=round(remaining / rate * 3600))) if rate > 0 else "-"
+        outcomes = " ".join(f"{outcome}={count}" for outcome, count in sorted(self.outcomes.items()))
+        return (
+            f"[PROGRESS] {self.done}/{self.total} done | {self.in_flight} in flight | "
+            f"{rate:.0f} leads/h | ETA {eta} | {outcomes or 'no outcomes yet'}"
+        )
+
+
+# Handler contract: (lead, caller_id, release_line) -> {"status": ..., "outcome": ...}
+# release_line() must be awaited once the call has ended; it is idempotent.
+LeadHandler = Callable[[Dict, str, Callable[[], Awaitable[None]]], Awaitable[Dict]]
+
+
+class CampaignRunner:
+    """Runs every lead through ``handler`` with bounded concurrency and per-caller pacing"""
+
+    def __init__(
+        self,
+        handler: LeadHandler,
+        caller_ids: List[str],
+        concurrency: int = 10,
+        calls_per_second: float = 1.0,
+        max_calls_per_caller: int = 5,
+        progress_interval: float = 10.0,
+    ):
+        self.handler = handler
+        self.caller_ids = caller_ids
+        self.concurrency = concurrency
+        self.calls_per_second = calls_per_second
+        self.max_calls_per_caller = max_calls_per_caller
+        self.progress_interval = progress_interval
+        self.stats: Optional[CampaignStats] = None
+        self.results: List[Dict] = []
+
+    async def run(self, leads: List[Dict]) -> List[Dict]:
+        """Process all leads; returns one result per lead, in completion order"""
+        loop = asyncio.get_running_loop()
+        # Blocking client calls (Twilio, SMTP) run in threads; the default pool is CPU-sized
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency + 4, thread_name_prefix="campaign"))
+        self.stats = CampaignStats(len(leads))
+        self.results = []
+        callers = CallerPool(self.caller_ids, self.calls_per_second, self.max_calls_per_caller)
+        queue: asyncio.Queue = asyncio.Queue()
+        for lead in leads:
+            queue.put_nowait(lead)
+
+        workers = [asyncio.create_task(self._worker(queue, callers)) for _ in range(min(self.concurrency, len(leads)))]
+        progress = asyncio.create_task(self._report_progress())
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            progress.cancel()
+            for worker in workers:
+                worker.cancel()
+        print(self.stats.line())
+        return self.results
+
+    async def _worker(self, queue: asyncio.Queue, callers: CallerPool):
+        while True:
+            try:
+                lead = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            caller = await callers.acquire()
+            released = False
+
+            async def release_line():
+                nonlocal released
+                if not released:
+                    released = True
+                    await callers.release(caller)
+
+            self.stats.in_flight += 1
+            try:
+                result = await self.handler(lead, caller, release_line)
+            except Exception as e:
+                logger.error(f"Lead {lead.get('name')} failed: {e}")
+                result = {"status": "error", "error": str(e)}
+            finally:
+                await release_line()
+                self.stats.in_flight -= 1
+            result = {"name": lead.get("name"), **result}
+            self.results.append(result)
+            self.stats.finish(result.get("status", "completed"), result.get("outcome"))
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            print(self.stats.line(), flush=True)
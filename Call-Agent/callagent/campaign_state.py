@@ -0,0 +1,150 @@
+"""Campaign State - Per-lead progress of a campaign run, for --resume
+
+Each run of run.py or run_langgraph.py gets a run id, and every lead its
+row, keyed by campaign and contact (or phone). The steps with side effects
+are recorded before and after they happen:
+
+    dialing  -> dialed (call_id) -> emailing -> emailed -> done
+             -> failed (the dial was rejected; safe to retry)
+             -> in_doubt (a resumed run found it still dialing)
+
+so a resumed run skips finished leads, picks up a dialed call by its
+call_id instead of dialing again, and never re-sends a meeting email. A
+lead left in ``dialing`` or ``emailing`` crashed mid-request: whether the
+call or email went out is unknown, so it is reported for a manual check
+rather than repeated. Leads interrupted mid-dial are recorded as
+``in_doubt`` and stay there on every later resume.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+DIALING = "dialing"
+DIALED = "dialed"
+FAILED = "failed"
+EMAILING = "emailing"
+EMAILED = "emailed"
+DONE = "done"
+IN_DOUBT = "in_doubt"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    script TEXT NOT NULL,
+    source TEXT,
+    started_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_source ON runs (script, source, started_at);
+CREATE TABLE IF NOT EXISTS leads (
+    run_id TEXT NOT NULL,
+    lead_key TEXT NOT NULL,
+    step TEXT NOT NULL,
+    call_id TEXT,
+    outcome TEXT,
+    qualified INTEGER,
+    meeting_link TEXT,
+    meeting_time TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, lead_key)
+) WITHOUT ROWID;
+"""
+
+FIELDS = ("step", "call_id", "outcome", "qualified", "meeting_link", "meeting_time", "error")
+
+
+def lead_key(lead: Dict) -> str:
+    """A lead's identity within a run: its campaign plus contact id, or phone"""
+    campaign = lead.get("campaign_id") or ""
+    return f"{campaign}:{lead.get('contact_id') or lead['phone']}"
+
+
+class CampaignLedger:
+    """SQLite store of campaign runs and per-lead steps (WAL, safe across threads)"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def start_run(self, script: str, source: Optional[str] = None) -> str:
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (run_id, script, source, started_at) VALUES (?, ?, ?, ?)",
+                (run_id, script, source, time.time()),
+            )
+        return run_id
+
+    def last_run(self, script: str, source: Optional[str] = None) -> Optional[str]:
+        """The script's latest run over ``source``"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM runs WHERE script = ? AND source IS ? ORDER BY started_at DESC LIMIT 1",
+                (script, source),
+            ).fetchone()
+        return row[0] if row else None
+
+    def get(self, run_id: str, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM leads WHERE run_id = ? AND lead_key = ?", (run_id, key)
+            ).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    def update(self, run_id: str, key: str, **fields):
+        """Record a lead's step; fields not given keep their stored values"""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown lead fields: {sorted(unknown)}")
+        columns = list(fields)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO leads (run_id, lead_key, {', '.join(columns)}, updated_at)"
+                f" VALUES (?, ?, {', '.join('?' for _ in columns)}, ?)"
+                f" ON CONFLICT (run_id, lead_key) DO UPDATE SET"
+                f" {', '.join(f'{column} = excluded.{column}' for column in columns)}, updated_at = excluded.updated_at",
+                (run_id, key, *fields.values(), time.time()),
+            )
+
+    def leads(self, run_id: str) -> Dict[str, Dict]:
+        """Every recorded lead of a run, by key"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT lead_key, {', '.join(FIELDS)} FROM leads WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {row[0]: dict(zip(FIELDS, row[1:])) for row in rows}
+
+    def counts(self, run_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT step, COUNT(*) FROM leads WHERE run_id = ? GROUP BY step", (run_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_run(ledger: CampaignLedger, script: str, source: Optional[str], resume: bool) -> Tuple[str, bool]:
+    """
+    The run to continue with --resume, or a new one; returns (run_id, resumed).
+    Only a run of the same leads file is resumed, so leads are never skipped
+    against another file's progress.
+    """
+    source = os.path.abspath(source) if source else None
+    if resume:
+        run_id = ledger.last_run(script, source)
+        if run_id is not None:
+            return run_id, True
+    return ledger.start_run(script, source), False
+
@@ -5,6 +5,8 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from loguru import logger
 from dotenv import load_dotenv
+import shared  # noqa: F401  (puts the FastAPI service on sys.path)
+from utils.metrics import instrument
 
 # Load environment variables from the BE root .env
 env_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", ".env")
@@ -19,6 +21,7 @@ class EmailService:
         self.smtp_user = os.getenv("SMTP_USER")
         self.smtp_pass = os.getenv("SMTP_PASSWORD")
     
+    @instrument("smtp", "send_meeting_email")
     def send_meeting_email(self, name: str, email: str, company: str, link: str, time: str) -> bool:
         """Send meeting confirmation"""
         try:
@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from loguru import logger
 from dotenv import load_dotenv
 import requests
+import shared  # noqa: F401  (puts the FastAPI service on sys.path)
+from utils.metrics import instrument
 
 # Load environment variables from the BE root .env
 env_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", ".env")
@@ -19,6 +21,7 @@ class GoogleMeetService:
         self.calendar_id = os.getenv("GOOGLE_CALENDAR_ID", "primary")
         self.access_token = None
     
+    @instrument("google", "refresh_token")
     def _get_access_token(self) -> str:
         """Get access token from refresh token"""
         try:
@@ -38,6 +41,7 @@ class GoogleMeetService:
             logger.error(f"Token refresh failed: {e}")
             raise
     
+    @instrument("google", "create_meeting")
     def create_meeting(self, name: str, email: str, company: str, duration_minutes: int = 30) -> dict:
         """Create Google Meet meeting"""
         try:
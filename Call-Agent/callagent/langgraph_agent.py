@@ -1,11 +1,36 @@
-"""LangGraph Agentic Call System"""
-from typing import TypedDict, Annotated, Literal
+"""LangGraph Agentic Call System
+
+The workflow is compiled once at import (``graph``) and shared by every lead.
+Nodes are async: the blocking Twilio, Google and SMTP clients run in worker
+threads, so ``process_leads`` can run many leads through the graph at once,
+bounded by a semaphore. Each node's run time is recorded per lead.
+
+Given a ``state_path``, each lead's graph state is checkpointed to SQLite
+after every node (thread id = run id + lead key, in ``checkpoint_path()``),
+and the call and email nodes record their side effects in the campaign
+ledger at ``state_path`` (campaign_state.py).
+With ``resume=True`` finished leads are skipped, interrupted ones restart
+at the node that was running, and no lead is dialed or emailed twice.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Literal, Optional, Tuple, TypedDict
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.graph import StateGraph, END
+from campaign_state import (
+    DIALED, DIALING, DONE, EMAILED, EMAILING, FAILED, IN_DOUBT, CampaignLedger, lead_key, open_run,
+)
 from voice_agent import VoiceAgent
 from email_service import EmailService
 from gmeet_service import GoogleMeetService
 from loguru import logger
-from datetime import datetime, timedelta
+import shared  # noqa: F401  (puts the FastAPI service on sys.path)
+from utils.metrics import LANGGRAPH_NODE_SECONDS
 
 class AgentState(TypedDict):
     """Agent state"""
@@ -16,85 +41,207 @@ class AgentState(TypedDict):
     meeting_scheduled: bool
     error: str | None
 
-def call_node(state: AgentState) -> AgentState:
-    """Make call"""
-    logger.info(f"Calling {state['lead']['name']}")
-    agent = VoiceAgent(use_mock=False)
-    result = agent.make_call(
-        state['lead']['phone'],
-        state['lead']['name'],
-        state['lead']['company']
+_agent: Optional[VoiceAgent] = None
+# Ledger of the checkpointed campaign being run (set by process_leads)
+_ledger: Optional[CampaignLedger] = None
+
+def get_agent() -> VoiceAgent:
+    """VoiceAgent shared by all nodes and leads (one Twilio client and connection pool)"""
+    global _agent
+    if _agent is None:
+        _agent = VoiceAgent(use_mock=False)
+    return _agent
+
+def checkpoint_path(state_path: str) -> str:
+    """
+    Where the graph checkpoints of a campaign ledger live. A separate file:
+    the checkpointer writes through its own async connection, and a ledger
+    write waiting on its lock would block the event loop that commits it.
+    """
+    return f"{os.path.splitext(state_path)[0]}.checkpoints.sqlite3"
+
+def lead_record(config: RunnableConfig) -> Optional[Tuple[CampaignLedger, str, str]]:
+    """(ledger, run id, lead key) when the graph runs as part of a checkpointed campaign"""
+    configurable = (config or {}).get('configurable', {})
+    if _ledger is None or 'lead_key' not in configurable:
+        return None
+    return _ledger, configurable['run_id'], configurable['lead_key']
+
+class NodeTimings:
+    """Per-node run counts and durations, for the end-of-run summary"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Dict] = {}
+
+    def record(self, node: str, seconds: float):
+        with self._lock:
+            entry = self._nodes.setdefault(node, {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+
+    def summary(self) -> Dict[str, Dict]:
+        """{node: {"count", "avg_s", "max_s", "total_s"}}"""
+        with self._lock:
+            return {
+                node: {
+                    "count": entry["count"],
+                    "avg_s": round(entry["total"] / entry["count"], 3),
+                    "max_s": round(entry["max"], 3),
+                    "total_s": round(entry["total"], 3),
+                }
+                for node, entry in self._nodes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._nodes.clear()
+
+node_timings = NodeTimings()
+
+def timed_node(name: str) -> Callable:
+    """Decorator recording an async node's run time (summary and Prometheus histogram)"""
+    histogram = LANGGRAPH_NODE_SECONDS.labels(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(state: AgentState, config: RunnableConfig) -> Dict:
+            start = time.perf_counter()
+            try:
+                return await func(state, config)
+            finally:
+                elapsed = time.perf_counter() - start
+                histogram.observe(elapsed)
+                node_timings.record(name, elapsed)
+        return wrapper
+    return decorator
+
+@timed_node("call")
+async def call_node(state: AgentState, config: RunnableConfig) -> Dict:
+    """Make call (at most once per lead in a checkpointed campaign)"""
+    lead = state['lead']
+    record = lead_record(config)
+    if record is not None:
+        ledger, run_id, key = record
+        entry = ledger.get(run_id, key) or {}
+        if entry.get('call_id') and entry['step'] != FAILED:
+            logger.info(f"Resuming call {entry['call_id']} for {lead['name']}")
+            return {'call_result': {'success': True, 'call_id': entry['call_id'], 'resumed': True}}
+        if entry.get('step') in (DIALING, IN_DOUBT):
+            # A crash mid-dial: the call may have gone out, so it is not repeated
+            error = "Interrupted while dialing; check Twilio before calling again"
+            ledger.update(run_id, key, step=IN_DOUBT, error=error)
+            return {'call_result': {'success': False, 'in_doubt': True, 'error': error}}
+        ledger.update(run_id, key, step=DIALING, error=None)
+
+    logger.info(f"Calling {lead['name']}")
+    context = {'campaignId': lead.get('campaign_id'), 'contactId': lead.get('contact_id')}
+    result = await asyncio.to_thread(
+        get_agent().make_call, lead['phone'], lead['name'], lead['company'],
+        context=context, from_number=lead.get('caller_id')
     )
-    state['call_result'] = result
-    return state
-
-def transcript_node(state: AgentState) -> AgentState:
-    """Get transcript with delay for processing"""
-    logger.info("Waiting for transcript processing...")
-    import time
-    time.sleep(10)  # Give Twilio time to process recording
-    
-    agent = VoiceAgent(use_mock=False)
-    transcript = agent.get_transcript(state['call_result']['call_id'])
-    state['transcript'] = transcript
+    if record is not None:
+        if result.get('success'):
+            ledger.update(run_id, key, step=DIALED, call_id=result['call_id'])
+        else:
+            ledger.update(run_id, key, step=FAILED, error=str(result.get('error')))
+    return {'call_result': result}
+
+@timed_node("get_transcript")
+async def transcript_node(state: AgentState, config: RunnableConfig) -> Dict:
+    """Wait for the call to end and get its transcript"""
+    agent = get_agent()
+    call_id = state['call_result']['call_id']
+    # With Twilio callbacks, get_transcript waits for the events; otherwise poll until the call ends
+    if not agent.callback_base:
+        logger.info(f"Waiting for call {call_id} to end...")
+        await asyncio.to_thread(agent.wait_for_call_end, call_id)
+    transcript = await asyncio.to_thread(agent.get_transcript, call_id)
     logger.info(f"Transcript received: {transcript.get('transcript', '')[:100]}")
-    return state
+    return {'transcript': transcript}
 
-def analyze_node(state: AgentState) -> AgentState:
+@timed_node("analyze")
+async def analyze_node(state: AgentState, config: RunnableConfig) -> Dict:
     """Analyze outcome"""
     logger.info("Analyzing call")
-    agent = VoiceAgent(use_mock=False)
+    agent = get_agent()
     transcript_text = state['transcript'].get('transcript', '')
-    
-    logger.info(f"Analyzing transcript: {transcript_text[:200]}...")
-    analysis = agent.analyze_outcome(transcript_text)
+
+    # Already analyzed (and reported) by the callback receiver in event mode
+    analysis = state['transcript'].get('analysis')
+    if analysis is None:
+        logger.info(f"Analyzing transcript: {transcript_text[:200]}...")
+        analysis = agent.analyze_outcome(transcript_text)
     logger.info(f"Analysis result: {analysis}")
-    
-    state['analysis'] = analysis
-    state['analysis'] = analysis
-    
+
     # [NEW] Sync with backend
-    try:
-        backend_data = {
-            "call_id": state['call_result'].get('success') and state['call_result'].get('call_id'),
-            "contact_id": state['lead'].get('contact_id', 0),
-            "campaign_id": state['lead'].get('campaign_id', 0),
-            "transcript": transcript_text,
-            "outcome": analysis['outcome'],
-            "picked": True
-        }
-        agent.send_signal_to_backend(backend_data)
-    except Exception as e:
-        logger.error(f"Failed to sync with backend: {e}")
-
-    return state
-
-def email_node(state: AgentState) -> AgentState:
-    """Send meeting email with real Google Meet link"""
-    logger.info("Creating Google Meet and sending email")
-    
-    gmeet_service = GoogleMeetService()
-    meeting_result = gmeet_service.create_meeting(
-        state['lead']['name'],
-        state['lead']['email'],
-        state['lead']['company']
-    )
-    
+    if not state['transcript'].get('reported'):
+        try:
+            backend_data = {
+                "call_id": state['call_result'].get('success') and state['call_result'].get('call_id'),
+                "contact_id": state['lead'].get('contact_id', 0),
+                "campaign_id": state['lead'].get('campaign_id', 0),
+                "transcript": transcript_text,
+                "outcome": analysis['outcome'],
+                "picked": True
+            }
+            agent.send_signal_to_backend(backend_data)
+        except Exception as e:
+            logger.error(f"Failed to sync with backend: {e}")
+
+    return {'analysis': analysis}
+
+@timed_node("email")
+async def email_node(state: AgentState, config: RunnableConfig) -> Dict:
+    """Send meeting email with real Google Meet link (at most once per lead in a checkpointed campaign)"""
+    lead = state['lead']
+    record = lead_record(config)
+    entry = {}
+    if record is not None:
+        ledger, run_id, key = record
+        entry = ledger.get(run_id, key) or {}
+        if entry.get('step') == EMAILED:
+            return {'meeting_scheduled': True}
+        if entry.get('step') == EMAILING:
+            logger.warning(f"Meeting email to {lead['email']} may already have been sent; not resending")
+            return {'meeting_scheduled': False}
+
+    if entry.get('meeting_link'):
+        # Created before an interruption; reuse it rather than booking another
+        meeting_result = {'success': True, 'meeting_link': entry['meeting_link'], 'meeting_time': entry['meeting_time']}
+    else:
+        logger.info("Creating Google Meet")
+        gmeet_service = GoogleMeetService()
+        meeting_result = await asyncio.to_thread(
+            gmeet_service.create_meeting, lead['name'], lead['email'], lead['company']
+        )
+
     if meeting_result['success']:
+        logger.info("Sending meeting email")
+        if record is not None:
+            ledger.update(run_id, key, step=EMAILING,
+                          meeting_link=meeting_result['meeting_link'], meeting_time=meeting_result['meeting_time'])
         email_service = EmailService()
-        sent = email_service.send_meeting_email(
-            state['lead']['name'],
-            state['lead']['email'],
-            state['lead']['company'],
+        sent = await asyncio.to_thread(
+            email_service.send_meeting_email,
+            lead['name'],
+            lead['email'],
+            lead['company'],
             meeting_result['meeting_link'],
             meeting_result['meeting_time']
         )
-        state['meeting_scheduled'] = sent
-    else:
-        logger.error(f"Meeting creation failed: {meeting_result.get('error')}")
-        state['meeting_scheduled'] = False
-    
-    return state
+        if record is not None:
+            # A failed send is known not to have gone out, so it may be retried
+            ledger.update(run_id, key, step=EMAILED if sent else DIALED)
+        return {'meeting_scheduled': sent}
+
+    logger.error(f"Meeting creation failed: {meeting_result.get('error')}")
+    return {'meeting_scheduled': False}
+
+def should_get_transcript(state: AgentState) -> Literal["get_transcript", "end"]:
+    """Stop when the call could not be placed"""
+    return "get_transcript" if state['call_result'].get('success') else "end"
 
 def should_send_email(state: AgentState) -> Literal["email", "end"]:
     """Route based on qualification"""
@@ -102,28 +249,29 @@ def should_send_email(state: AgentState) -> Literal["email", "end"]:
         return "end"
     return "email" if state['analysis'].get('qualified') else "end"
 
-def build_graph() -> StateGraph:
-    """Build LangGraph workflow"""
+def build_graph():
+    """Build and compile the LangGraph workflow"""
     workflow = StateGraph(AgentState)
-    
+
     workflow.add_node("call", call_node)
-    workflow.add_node("transcript", transcript_node)
+    # Node names must differ from the state keys ("transcript")
+    workflow.add_node("get_transcript", transcript_node)
     workflow.add_node("analyze", analyze_node)
     workflow.add_node("email", email_node)
-    
+
     workflow.set_entry_point("call")
-    workflow.add_edge("call", "transcript")
-    workflow.add_edge("transcript", "analyze")
+    workflow.add_conditional_edges("call", should_get_transcript, {"get_transcript": "get_transcript", "end": END})
+    workflow.add_edge("get_transcript", "analyze")
     workflow.add_conditional_edges("analyze", should_send_email, {"email": "email", "end": END})
     workflow.add_edge("email", END)
-    
+
     return workflow.compile()
 
-def process_lead(lead: dict) -> dict:
-    """Process single lead through graph"""
-    graph = build_graph()
-    
-    initial_state = AgentState(
+# Compiled once; a compiled graph is stateless and safe to invoke concurrently
+graph = build_graph()
+
+def initial_state(lead: dict) -> AgentState:
+    return AgentState(
         lead=lead,
         call_result={},
         transcript={},
@@ -131,10 +279,100 @@ def process_lead(lead: dict) -> dict:
         meeting_scheduled=False,
         error=None
     )
-    
-    result = graph.invoke(initial_state)
-    return result
+
+async def aprocess_lead(lead: dict) -> dict:
+    """Process single lead through graph"""
+    return await graph.ainvoke(initial_state(lead))
+
+def process_lead(lead: dict) -> dict:
+    """Process single lead through graph (blocking)"""
+    return asyncio.run(aprocess_lead(lead))
+
+async def process_leads(
+    leads: List[dict],
+    max_concurrent: int = 10,
+    on_result: Optional[Callable[[dict, dict], None]] = None,
+    state_path: Optional[str] = None,
+    resume: bool = False,
+    source: Optional[str] = None,
+) -> List[dict]:
+    """
+    Run many leads through the graph, at most ``max_concurrent`` at a time.
+
+    Returns the final states in lead order. A lead that raised gets its
+    initial state with ``error`` set. ``on_result(lead, state)`` is called
+    as each lead finishes.
+
+    With ``state_path`` the run is checkpointed there; ``resume`` continues
+    the last checkpointed run over the same ``source`` (leads file) instead
+    of starting a new one. Leads that run had already finished come back with
+    ``resumed=True``; leads interrupted mid-dial are not redialed and come
+    back with ``call_result['in_doubt']`` set. A lead listed twice (same
+    campaign and contact or phone) is only run once.
+    """
+    global _ledger
+    # Node work runs in threads; the default pool is CPU-sized
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_concurrent + 4, thread_name_prefix="langgraph")
+    )
+    get_agent().size_pools(max_concurrent)
+    semaphore = asyncio.Semaphore(max_concurrent)
+    if state_path is None:
+        runnable, run_id = graph, None
+    else:
+        _ledger = CampaignLedger(state_path)
+        run_id, resumed = open_run(_ledger, "langgraph", source, resume)
+        if resume and not resumed:
+            logger.warning(f"No earlier run over {source} to resume; starting a new one")
+        logger.info(f"Campaign run {run_id} (state in {state_path})")
+
+    async def invoke(lead: dict) -> dict:
+        if run_id is None:
+            return await runnable.ainvoke(initial_state(lead))
+        key = lead_key(lead)
+        config = {'configurable': {'thread_id': f"{run_id}:{key}", 'run_id': run_id, 'lead_key': key}}
+        snapshot = await runnable.aget_state(config)
+        entry = _ledger.get(run_id, key) or {}
+        if snapshot.next:
+            # Interrupted: continue at the node that was running
+            result = await runnable.ainvoke(None, config)
+        elif snapshot.values and entry.get('step') == IN_DOUBT:
+            return {**snapshot.values, 'call_result': {'success': False, 'in_doubt': True, 'error': entry.get('error')}}
+        elif snapshot.values and entry.get('step') != FAILED:
+            return {**snapshot.values, 'resumed': True}
+        else:
+            result = await runnable.ainvoke(initial_state(lead), config)
+        if result['call_result'].get('success'):
+            _ledger.update(run_id, key, step=DONE, outcome=result['analysis'].get('outcome'),
+                           qualified=int(bool(result['analysis'].get('qualified'))))
+        return result
+
+    async def run(lead: dict) -> dict:
+        async with semaphore:
+            try:
+                result = await invoke(lead)
+            except Exception as e:
+                logger.error(f"Lead {lead.get('name')} failed: {e}")
+                result = {**initial_state(lead), 'error': str(e)}
+        if on_result is not None:
+            on_result(lead, result)
+        return result
+
+    if run_id is None:
+        return await asyncio.gather(*(run(lead) for lead in leads))
+    unique, seen = [], set()
+    for lead in leads:
+        if lead_key(lead) not in seen:
+            seen.add(lead_key(lead))
+            unique.append(lead)
+    try:
+        async with AsyncSqliteSaver.from_conn_string(checkpoint_path(state_path)) as saver:
+            runnable = graph.copy(update={'checkpointer': saver})
+            return await asyncio.gather(*(run(lead) for lead in unique))
+    finally:
+        _ledger.close()
+        _ledger = None
 
 
 # Export for integration with backend
-__all__ = ['process_lead', 'AgentState', 'build_graph']
+__all__ = ['process_lead', 'process_leads', 'aprocess_lead', 'AgentState', 'build_graph', 'graph', 'node_timings']
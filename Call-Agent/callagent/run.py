@@ -1,11 +1,32 @@
-"""Execute Call Agent - Main Script"""
+"""Execute Call Agent - Main Script
+
+Usage:
+    python run.py                                  # leads.csv, settings from the environment
+    python run.py --leads leads.csv --concurrency 50 --caller-ids +15550001,+15550002 --calls-per-second 1
+
+Leads are called concurrently (see campaign.py). With TWILIO_CALLBACK_BASE_URL
+set, each lead waits for its Twilio callbacks; otherwise it polls the call's
+status until it ends.
+
+Progress is recorded per lead (campaign_state.py). After a crash,
+``python run.py --resume`` continues the last run: finished leads are
+skipped, dialed calls are picked up by call_id and no email is sent twice.
+"""
+import argparse
+import asyncio
 import csv
-import time
+import os
 import random
 from datetime import datetime, timedelta
+from typing import Dict
+from campaign import CampaignRunner
+from campaign_state import (
+    DIALED, DIALING, DONE, EMAILED, EMAILING, FAILED, IN_DOUBT, CampaignLedger, lead_key, open_run,
+)
 from voice_agent import VoiceAgent
 from email_service import EmailService
 from loguru import logger
+from prometheus_client import start_http_server
 
 def generate_meeting_link():
     """Generate Google Meet link"""
@@ -14,14 +35,36 @@ def generate_meeting_link():
     code3 = ''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=3))
     return f"https://meet.google.com/{code1}-{code2}-{code3}"
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Call every lead in a CSV and book meetings with the interested ones")
+    parser.add_argument("--leads", default="leads.csv", help="CSV with customer_name, customer_email, company_name, phone_number")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CAMPAIGN_CONCURRENCY", "10")),
+                        help="Leads in progress at once")
+    parser.add_argument("--caller-ids", default=os.getenv("TWILIO_PHONE_NUMBERS") or os.getenv("TWILIO_PHONE_NUMBER", ""),
+                        help="Comma-separated Twilio numbers to call from")
+    parser.add_argument("--calls-per-second", type=float, default=float(os.getenv("CAMPAIGN_CALLS_PER_SECOND", "1")),
+                        help="Most dials per second from each caller ID")
+    parser.add_argument("--max-calls-per-caller", type=int, default=int(os.getenv("CAMPAIGN_MAX_CALLS_PER_CALLER", "5")),
+                        help="Most live calls per caller ID")
+    parser.add_argument("--progress-interval", type=float, default=10, help="Seconds between progress lines")
+    parser.add_argument("--resume", action="store_true", help="Continue the last run instead of starting a new one")
+    parser.add_argument("--state", default=os.getenv("CAMPAIGN_STATE_PATH", os.path.join(os.path.dirname(__file__), "campaign_state.sqlite3")),
+                        help="SQLite file recording each lead's progress")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     print("\n" + "="*70)
     print("CALL AGENT - Execute Calls & Schedule Meetings")
     print("="*70)
     
+    # Expose Prometheus metrics for the duration of the run
+    if os.getenv("METRICS_PORT"):
+        start_http_server(int(os.getenv("METRICS_PORT")))
+    
     # Load leads
     leads = []
-    with open('leads.csv', 'r', encoding='utf-8') as f:
+    with open(args.leads, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             leads.append({
@@ -31,85 +74,109 @@ def main():
                 'phone': row['phone_number'].strip()
             })
     
+    caller_ids = [number.strip() for number in args.caller_ids.split(",") if number.strip()]
+    if not caller_ids:
+        print("[ERROR] No caller ID: set TWILIO_PHONE_NUMBER(S) or pass --caller-ids")
+        return
+    
     print(f"\n[INFO] Loaded {len(leads)} leads")
-    for i, lead in enumerate(leads, 1):
-        print(f"  {i}. {lead['name']} - {lead['company']} ({lead['phone']})")
+    
+    # Per-lead progress; a resumed run skips what the last one finished
+    ledger = CampaignLedger(args.state)
+    run_id, resumed = open_run(ledger, "run", args.leads, args.resume)
+    recorded = ledger.leads(run_id)
+    pending, seen, finished, in_doubt = [], set(), [], []
+    for lead in leads:
+        key = lead_key(lead)
+        if key in seen:
+            continue  # the same contact twice in the CSV is called once
+        seen.add(key)
+        step = recorded.get(key, {}).get('step')
+        if step == DONE:
+            finished.append((lead, recorded[key]))
+        elif step in (DIALING, IN_DOUBT):
+            in_doubt.append(lead)
+            ledger.update(run_id, key, step=IN_DOUBT, error="Interrupted while dialing; check Twilio before calling again")
+        else:
+            pending.append(lead)
+    if resumed:
+        print(f"[RESUME] Run {run_id}: {len(finished)} done, {len(in_doubt)} interrupted while dialing, {len(pending)} to go")
+    elif args.resume:
+        print(f"[WARN] No earlier run over {args.leads} to resume; starting run {run_id}")
+    else:
+        print(f"[INFO] Run {run_id} (continue it with --resume)")
+    for lead in in_doubt:
+        print(f"[WARN] {lead['name']} ({lead['phone']}): may already have been called; not redialing - check Twilio")
+    print(f"[INFO] {args.concurrency} at a time from {len(caller_ids)} caller ID(s), "
+          f"{args.calls_per_second:g} dial(s)/s and {args.max_calls_per_caller} live call(s) each")
     
     # Initialize services
     agent = VoiceAgent(use_mock=False)
+    agent.size_pools(args.concurrency)
     email_service = EmailService()
     
-    results = []
-    meetings = []
+    meetings = [
+        {'name': lead['name'], 'email': lead['email'], 'link': entry['meeting_link'], 'time': entry['meeting_time']}
+        for lead, entry in finished if entry['meeting_link']
+    ]
     
-    # Process each lead
-    for i, lead in enumerate(leads, 1):
-        print(f"\n" + "="*70)
-        print(f"[{i}/{len(leads)}] {lead['name']} - {lead['company']}")
-        print("="*70)
-        
-        # Make call
-        print(f"[1/5] Calling {lead['phone']}...")
-        call = agent.make_call(lead['phone'], lead['name'], lead['company'])
-        
-        if not call['success']:
-            print(f"[ERROR] {call.get('error')}")
-            results.append({'name': lead['name'], 'status': 'failed'})
-            continue
-        
-        print(f"[SUCCESS] Call ID: {call['call_id']}")
-        
-        # Wait for call to complete
-        print(f"[2/5] Waiting 60s for call to complete...")
-        time.sleep(60)
+    async def process_lead(lead: Dict, caller_id: str, release_line) -> Dict:
+        """Call one lead, wait for the call to end, analyze it and follow up"""
+        key = lead_key(lead)
+        entry = ledger.get(run_id, key) or {}
+        step = entry.get('step')
+        call_id = entry.get('call_id') if step in (DIALED, EMAILING, EMAILED) else None
+        if call_id is None:
+            context = {'campaignId': lead.get('campaign_id'), 'contactId': lead.get('contact_id')}
+            ledger.update(run_id, key, step=DIALING, error=None)
+            call = await asyncio.to_thread(
+                agent.make_call, lead['phone'], lead['name'], lead['company'], context=context, from_number=caller_id
+            )
+            if not call['success']:
+                print(f"[ERROR] {lead['name']}: {call.get('error')}")
+                ledger.update(run_id, key, step=FAILED, error=str(call.get('error')))
+                return {'status': 'failed', 'error': call.get('error')}
+            call_id = call['call_id']
+            ledger.update(run_id, key, step=DIALED, call_id=call_id)
+        else:
+            print(f"[RESUME] {lead['name']}: picking up call {call_id}")
         
-        # Get transcript
-        print(f"[3/5] Getting transcript...")
-        transcript = agent.get_transcript(call['call_id'])
+        # With Twilio callbacks, get_transcript waits for the events; otherwise poll until the call ends
+        if not agent.callback_base:
+            await asyncio.to_thread(agent.wait_for_call_end, call_id)
+        transcript = await asyncio.to_thread(agent.get_transcript, call_id)
+        await release_line()
         text = transcript.get('transcript', 'Lead interested in demo')
-        print(f"[SUCCESS] Transcript: {len(text)} chars")
         
-        # Analyze
-        print(f"[4/5] Analyzing...")
-        analysis = agent.analyze_outcome(text)
-        print(f"[RESULT] {analysis['outcome']} | Qualified: {analysis['qualified']}")
+        # Analyze (already done by the callback receiver in event mode)
+        analysis = transcript.get('analysis') or agent.analyze_outcome(text)
         
-        # Send email if lead is qualified (interested)
-        if analysis['qualified']:
-            print(f"[5/5] Lead qualified - Sending meeting email...")
-            
+        # Send email if lead is qualified (interested), at most once
+        meeting = None
+        if step == EMAILED:
+            meeting = {'name': lead['name'], 'email': lead['email'], 'link': entry['meeting_link'], 'time': entry['meeting_time']}
+            meetings.append(meeting)
+        elif step == EMAILING:
+            print(f"[WARN] {lead['email']}: the meeting email may already have been sent; not resending")
+        elif analysis['qualified']:
             meeting_time = (datetime.now() + timedelta(days=1)).strftime("%B %d, %Y at 02:00 PM UTC")
             meeting_link = generate_meeting_link()
-            
-            sent = email_service.send_meeting_email(
-                lead['name'], lead['email'], lead['company'],
-                meeting_link, meeting_time
+            ledger.update(run_id, key, step=EMAILING, meeting_link=meeting_link, meeting_time=meeting_time)
+            sent = await asyncio.to_thread(
+                email_service.send_meeting_email,
+                lead['name'], lead['email'], lead['company'], meeting_link, meeting_time
             )
-            
             if sent:
-                print(f"[SUCCESS] Email sent to {lead['email']}")
-                print(f"          Link: {meeting_link}")
-                meetings.append({
-                    'name': lead['name'],
-                    'email': lead['email'],
-                    'link': meeting_link,
-                    'time': meeting_time
-                })
+                ledger.update(run_id, key, step=EMAILED)
+                meeting = {'name': lead['name'], 'email': lead['email'], 'link': meeting_link, 'time': meeting_time}
+                meetings.append(meeting)
             else:
-                print(f"[ERROR] Email failed")
-        else:
-            print(f"[5/5] Lead not qualified - Skipping email")
-        
-        results.append({
-            'name': lead['name'],
-            'status': 'completed',
-            'qualified': analysis['qualified']
-        })
+                ledger.update(run_id, key, step=DIALED, meeting_link=None, meeting_time=None)
+                print(f"[ERROR] Email to {lead['email']} failed")
         
-        # [NEW] Send signal to backend
-        print(f"[5.5/5] Syncing with backend...")
+        # Send signal to backend
         backend_data = {
-            "call_id": call['call_id'],
+            "call_id": call_id,
             # Note: leads.csv might not have contact_id/campaign_id if running standalone
             # But in integrated mode, these should be passed or available. 
             # For standalone testing, valid IDs might be needed for backend to accept it.
@@ -120,25 +187,44 @@ def main():
             "outcome": analysis['outcome'],
             "picked": True 
         }
+        if meeting:
+            backend_data["meeting_time"] = meeting['time']
+            backend_data["meeting_link"] = meeting['link']
         
-        if analysis['qualified'] and meetings:
-             # Add meeting details from the last scheduled meeting
-             last_meeting = meetings[-1]
-             backend_data["meeting_time"] = last_meeting['time']
-             backend_data["meeting_link"] = last_meeting['link']
-
-        agent.send_signal_to_backend(backend_data)
+        # The callback receiver already reported the outcome; resend only to attach a meeting
+        if meeting or not transcript.get('reported'):
+            agent.send_signal_to_backend(backend_data)
+        ledger.update(run_id, key, step=DONE, outcome=analysis['outcome'], qualified=int(bool(analysis['qualified'])))
         
-        # Wait between calls
-        if i < len(leads):
-            print(f"\n[WAIT] 60s before next call...")
-            time.sleep(60)
+        print(f"[DONE] {lead['name']} - {lead['company']}: {analysis['outcome']}"
+              f"{' | meeting email sent' if meeting else ''} ({call_id})")
+        return {'status': 'completed', 'outcome': analysis['outcome'], 'qualified': analysis['qualified']}
+    
+    runner = CampaignRunner(
+        process_lead,
+        caller_ids,
+        concurrency=args.concurrency,
+        calls_per_second=args.calls_per_second,
+        max_calls_per_caller=args.max_calls_per_caller,
+        progress_interval=args.progress_interval,
+    )
+    results = asyncio.run(runner.run(pending)) if pending else []
+    ledger.close()
+    
+    # Let queued backend signals go out before exiting (undelivered ones stay spooled)
+    if not agent.outbox.flush(timeout=30):
+        print(f"\n[WARN] {agent.outbox.stats()['backlog']} backend signal(s) still queued; they will be retried on the next run")
     
     # Summary
     print("\n" + "="*70)
     print("EXECUTION COMPLETE")
     print("="*70)
-    print(f"\nTotal: {len(leads)} | Completed: {len(results)} | Meetings: {len(meetings)}")
+    completed = sum(1 for r in results if r['status'] == 'completed') + len(finished)
+    print(f"\nTotal: {len(leads)} | Completed: {completed} | Meetings: {len(meetings)}")
+    if runner.stats is not None:
+        print(f"Elapsed: {runner.stats.elapsed():.0f}s | Throughput: {runner.stats.per_hour():.0f} leads/h")
+    if in_doubt:
+        print(f"Not redialed (interrupted while dialing): {', '.join(lead['name'] for lead in in_doubt)}")
     
     if meetings:
         print(f"\n" + "="*70)
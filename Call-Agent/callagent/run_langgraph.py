@@ -1,17 +1,39 @@
-"""Execute LangGraph Call Agent"""
+"""Execute LangGraph Call Agent
+
+Usage:
+    python run_langgraph.py [--leads leads.csv] [--concurrency 10]
+    python run_langgraph.py --resume        # continue the last run after a crash
+"""
+import argparse
+import asyncio
 import csv
+import os
 import time
-from langgraph_agent import process_lead
-from loguru import logger
+from langgraph_agent import node_timings, process_leads
+from voice_agent import get_backend_outbox
+from prometheus_client import start_http_server
 
 def main():
+    parser = argparse.ArgumentParser(description="Run leads through the LangGraph call workflow")
+    parser.add_argument("--leads", default="leads.csv")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CAMPAIGN_CONCURRENCY", "10")),
+                        help="Leads in the graph at once")
+    parser.add_argument("--resume", action="store_true", help="Continue the last run instead of starting a new one")
+    parser.add_argument("--state", default=os.getenv("CAMPAIGN_STATE_PATH", os.path.join(os.path.dirname(__file__), "campaign_state.sqlite3")),
+                        help="SQLite file recording each lead's progress (graph checkpoints go next to it)")
+    args = parser.parse_args()
+    
     print("\n" + "="*70)
     print("LANGGRAPH CALL AGENT")
     print("="*70)
     
+    # Expose Prometheus metrics for the duration of the run
+    if os.getenv("METRICS_PORT"):
+        start_http_server(int(os.getenv("METRICS_PORT")))
+    
     # Load leads
     leads = []
-    with open('leads.csv', 'r', encoding='utf-8') as f:
+    with open(args.leads, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         for row in reader:
             leads.append({
@@ -25,39 +47,52 @@ def main():
     
     results = []
     meetings = []
+    in_doubt = []
     
-    for i, lead in enumerate(leads, 1):
-        print(f"\n{'='*70}")
-        print(f"[{i}/{len(leads)}] Processing {lead['name']}")
-        print("="*70)
-        
-        try:
-            result = process_lead(lead)
-            
-            if result['call_result'].get('success'):
-                print(f"✓ Call: {result['call_result']['call_id']}")
-                print(f"✓ Analysis: {result['analysis']['outcome']}")
-                
-                if result['meeting_scheduled']:
-                    print(f"✓ Meeting scheduled")
-                    meetings.append(lead['name'])
-                
-                results.append({'name': lead['name'], 'status': 'success'})
-            else:
-                print(f"✗ Call failed")
-                results.append({'name': lead['name'], 'status': 'failed'})
-        
-        except Exception as e:
-            logger.error(f"Error: {e}")
+    def report(lead: dict, result: dict):
+        if result.get('resumed'):
+            print(f"- {lead['name']}: already done in the resumed run")
+            results.append({'name': lead['name'], 'status': 'resumed'})
+            if result.get('meeting_scheduled'):
+                meetings.append(lead['name'])
+        elif result.get('error'):
+            print(f"✗ {lead['name']}: error {result['error']}")
             results.append({'name': lead['name'], 'status': 'error'})
-        
-        if i < len(leads):
-            print(f"\n[WAIT] 60s...")
-            time.sleep(60)
+        elif result['call_result'].get('in_doubt'):
+            print(f"? {lead['name']} ({lead['phone']}): may already have been called; not redialing - check Twilio")
+            in_doubt.append(lead['name'])
+            results.append({'name': lead['name'], 'status': 'in_doubt'})
+        elif result['call_result'].get('success'):
+            print(f"✓ {lead['name']}: call {result['call_result']['call_id']} | {result['analysis']['outcome']}"
+                  f"{' | meeting scheduled' if result['meeting_scheduled'] else ''}")
+            if result['meeting_scheduled']:
+                meetings.append(lead['name'])
+            results.append({'name': lead['name'], 'status': 'success'})
+        else:
+            print(f"✗ {lead['name']}: call failed ({result['call_result'].get('error')})")
+            results.append({'name': lead['name'], 'status': 'failed'})
+    
+    start = time.monotonic()
+    asyncio.run(process_leads(
+        leads, max_concurrent=args.concurrency, on_result=report,
+        state_path=args.state, resume=args.resume, source=args.leads,
+    ))
+    elapsed = time.monotonic() - start
+    
+    # Let queued backend signals go out before exiting (undelivered ones stay spooled)
+    outbox = get_backend_outbox()
+    if not outbox.flush(timeout=30):
+        print(f"\n[WARN] {outbox.stats()['backlog']} backend signal(s) still queued; they will be retried on the next run")
     
     print(f"\n{'='*70}")
-    print(f"COMPLETE: {len(results)} processed | {len(meetings)} meetings")
+    print(f"COMPLETE: {len(results)} processed | {len(meetings)} meetings | "
+          f"{elapsed:.0f}s ({len(results) / elapsed * 3600 if elapsed else 0:.0f} leads/h)")
+    if in_doubt:
+        print(f"Not redialed (interrupted while dialing): {', '.join(in_doubt)}")
     print("="*70)
+    print(f"{'node':<12}{'runs':>8}{'avg s':>10}{'max s':>10}{'total s':>12}")
+    for node, timing in node_timings.summary().items():
+        print(f"{node:<12}{timing['count']:>8}{timing['avg_s']:>10.3f}{timing['max_s']:>10.3f}{timing['total_s']:>12.1f}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,9 @@
+"""Shared Modules - Import helpers that live in the FastAPI service"""
+import os
+import sys
+
+# The FastAPI service owns code used by both agents (e.g. the outcome
+# classifier); appending keeps this directory's own modules first on the path.
+FASTAPI_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "FastAPI"))
+if FASTAPI_DIR not in sys.path:
+    sys.path.append(FASTAPI_DIR)
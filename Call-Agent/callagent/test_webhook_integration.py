@@ -40,7 +40,7 @@ def test_webhook_integration():
     print(f"    Transcript: {transcript}")
     
     # 3. Send Signal
-    success = agent.send_signal_to_backend(mock_data)
+    success = agent.send_signal_to_backend(mock_data) and agent.outbox.flush(timeout=15)
     
     if success:
         print("\n[SUCCESS] Webhook signal sent successfully!")
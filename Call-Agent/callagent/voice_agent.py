@@ -1,28 +1,133 @@
 """Voice Agent - AI-Powered Call System"""
 import os
+import re
+import threading
 import time
+from collections import OrderedDict
 from typing import Dict, Optional
+from urllib.parse import urlencode
+from xml.sax.saxutils import quoteattr
+import requests
+from requests.adapters import HTTPAdapter
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from loguru import logger
 from dotenv import load_dotenv
+import shared  # noqa: F401  (puts the FastAPI service on sys.path)
+from utils.metrics import ANALYZE_SECONDS, UPSTREAM_ERRORS, UPSTREAM_SECONDS, instrument, timed
+from utils.outbox import Outbox
+from utils.outcome_classifier import MIN_TRANSCRIPT_LENGTH, get_classifier
 
 # Load environment variables from the BE root .env
 env_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", ".env")
 load_dotenv(env_path)
 
+_outbox: Optional[Outbox] = None
+
+def get_backend_outbox() -> Outbox:
+    """Process-wide outbox for backend outcome webhooks, drained by a background thread"""
+    global _outbox
+    if _outbox is None:
+        backend_url = os.getenv("BACKEND_URL", "http://localhost:4004")
+        batch_path = os.getenv("OUTBOX_BATCH_PATH")
+        session = requests.Session()
+
+        @instrument("backend", "post_outcome")
+        def post(url: str, body: Dict) -> int:
+            return session.post(url, json=body, timeout=10).status_code
+
+        _outbox = Outbox(
+            path=os.getenv("OUTBOX_PATH", os.path.join(os.path.dirname(__file__), "outbox.sqlite3")),
+            url=f"{backend_url}/api/v1/call-agent/webhook/outcome",
+            batch_url=f"{backend_url}{batch_path}" if batch_path else None,
+            batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+            retry_base=float(os.getenv("OUTBOX_RETRY_BASE", "1")),
+            retry_max=float(os.getenv("OUTBOX_RETRY_MAX", "300")),
+            max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20")),
+        )
+        _outbox.start_thread(post)
+    return _outbox
+
+class TranscriptionIndex:
+    """
+    Process-wide recording_sid -> transcription map. Finished transcriptions
+    never change, so once seen a recording's text is served without any
+    Twilio request; the least recently used entries are dropped past max_size.
+    """
+
+    # Transcription statuses that will not change any more
+    FINAL = ("completed", "failed")
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, recording_sid: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(recording_sid)
+            if entry is not None:
+                self._entries.move_to_end(recording_sid)
+            return entry
+
+    def put(self, recording_sid: str, sid: str, status: str, text: Optional[str]):
+        with self._lock:
+            self._entries[recording_sid] = {"sid": sid, "status": status, "text": text or ""}
+            self._entries.move_to_end(recording_sid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+_transcriptions = TranscriptionIndex(int(os.getenv("TRANSCRIPTION_INDEX_SIZE", "10000")))
+
+class TimedTwilioHttpClient(TwilioHttpClient):
+    """Twilio HTTP client recording the latency of each API request (not our retry waits)"""
+
+    SID = re.compile(r"/[A-Z]{2}[0-9a-f]{32}")
+
+    def request(self, method: str, url: str, *args, **kwargs):
+        # "GET /Calls/{sid}" style operation names keep label values bounded
+        path = url.split("?", 1)[0].removesuffix(".json")
+        if "/Accounts/" in path:
+            path = "/" + path.split("/Accounts/", 1)[1].partition("/")[2]
+        operation = f"{method.upper()} {self.SID.sub('/{sid}', path)}"
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            UPSTREAM_ERRORS.labels("twilio", operation).inc()
+            raise
+        finally:
+            UPSTREAM_SECONDS.labels("twilio", operation).observe(time.perf_counter() - start)
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.labels("twilio", operation).inc()
+        return response
+
 class VoiceAgent:
     """AI Voice Agent using Twilio Studio Flow"""
     
+    # Call context forwarded to the FastAPI callback receiver in the callback URLs
+    CALLBACK_CONTEXT = ("campaignId", "contactId", "userId")
+    # Twilio call statuses after which nothing more happens to a call
+    FINAL_CALL_STATUSES = ("completed", "busy", "failed", "no-answer", "canceled")
+    
     def __init__(self, use_mock: bool = False):
         self.use_mock = use_mock
         self.flow_sid = os.getenv("TWILIO_FLOW_SID")
         self.twilio_number = os.getenv("TWILIO_PHONE_NUMBER")
+        self.outbox = get_backend_outbox()
+        # FastAPI service receiving Twilio's callbacks; without it calls are polled
+        self.callback_base = (os.getenv("TWILIO_CALLBACK_BASE_URL") or "").rstrip("/") or None
+        self.session = requests.Session()
+        self.transcriptions = _transcriptions
         
         if not use_mock:
             sid = os.getenv("TWILIO_ACCOUNT_SID")
             token = os.getenv("TWILIO_AUTH_TOKEN")
             if sid and token:
-                self.client = Client(sid, token)
+                self.client = Client(sid, token, http_client=TimedTwilioHttpClient())
+                # Override to point at a local simulator (Call-Agent/simulator)
+                if os.getenv("TWILIO_API_BASE_URL"):
+                    self.client.api.base_url = os.getenv("TWILIO_API_BASE_URL")
                 logger.info("Twilio initialized")
             else:
                 self.client = None
@@ -31,27 +136,66 @@ class VoiceAgent:
             self.client = None
             logger.info("Mock mode enabled")
     
-    def make_call(self, phone: str, name: str, company: str) -> Dict:
-        """Make AI call"""
+    def callback_url(self, kind: str, context: Optional[Dict] = None) -> str:
+        """URL of a Twilio callback route on the FastAPI service, carrying the call context"""
+        params = {key: context[key] for key in self.CALLBACK_CONTEXT if context and context.get(key) is not None}
+        query = f"?{urlencode(params)}" if params else ""
+        return f"{self.callback_base}/api/webhooks/twilio/{kind}{query}"
+    
+    def size_pools(self, size: int):
+        """Keep up to ``size`` connections alive per host, for use from that many threads"""
+        sessions = [self.session]
+        if self.client is not None and getattr(self.client.http_client, "session", None) is not None:
+            sessions.append(self.client.http_client.session)
+        for session in sessions:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+    
+    def make_call(
+        self,
+        phone: str,
+        name: str,
+        company: str,
+        context: Optional[Dict] = None,
+        from_number: Optional[str] = None,
+    ) -> Dict:
+        """Make AI call (from ``from_number``, default TWILIO_PHONE_NUMBER)"""
         logger.info(f"Calling {name} at {phone}")
         
         if self.use_mock or not self.client:
             return self._mock_call(phone, name)
         
         try:
+            callbacks = {}
+            record_callbacks = ""
+            if self.callback_base:
+                # Status, recording and transcription events drive the rest of the call's processing;
+                # the recording ones come from the <Record> verb, the only recording the call makes
+                callbacks = {
+                    "status_callback": self.callback_url("call-status", context),
+                    "status_callback_event": ["initiated", "ringing", "answered", "completed"],
+                    "status_callback_method": "POST",
+                }
+                record_callbacks = (
+                    f' transcribeCallback={quoteattr(self.callback_url("transcription", context))}'
+                    f' recordingStatusCallback={quoteattr(self.callback_url("recording-status", context))}'
+                    ' recordingStatusCallbackEvent="completed absent"'
+                )
+            
             # Use TwiML directly instead of Studio Flow to avoid "application error"
             twiml = f'''<?xml version="1.0" encoding="UTF-8"?>
 <Response>
     <Say voice="Polly.Joanna">Hello {name}, this is an A I assistant from No2bounce. We wanted to reach out about our services. Are you interested in scheduling a demo? Please respond after the beep.</Say>
-    <Record maxLength="10" transcribe="true" transcribeCallback="" />
+    <Record maxLength="10" transcribe="true"{record_callbacks} />
     <Say voice="Polly.Joanna">Thank you for your response. Goodbye.</Say>
 </Response>'''
             
             call = self.client.calls.create(
                 to=phone,
-                from_=self.twilio_number,
+                from_=from_number or self.twilio_number,
                 twiml=twiml,
-                record=True
+                **callbacks
             )
             
             logger.info(f"Call initiated: {call.sid}")
@@ -61,11 +205,97 @@ class VoiceAgent:
             logger.error(f"Call failed: {e}")
             return {"success": False, "error": str(e)}
     
+    def wait_for_call_end(self, call_id: str, timeout: float = 600, max_interval: float = 10) -> Optional[str]:
+        """
+        Poll a call until Twilio reports a final status, checking more slowly
+        the longer it runs. Returns the status, or None on timeout.
+        """
+        if self.use_mock or not self.client:
+            return "completed"
+        deadline = time.monotonic() + timeout
+        interval = 2.0
+        while True:
+            try:
+                status = self.client.calls(call_id).fetch().status
+                if status in self.FINAL_CALL_STATUSES:
+                    return status
+            except Exception as e:
+                logger.warning(f"Status check for {call_id} failed: {e}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, max_interval)
+    
+    def wait_for_result(self, call_id: str, timeout: float = 300) -> Optional[Dict]:
+        """
+        Wait for the callback receiver to finalize a call (long polling, no
+        Twilio API calls). Returns the reported call, or None on timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                response = self.session.get(
+                    f"{self.callback_base}/api/webhooks/twilio/calls/{call_id}",
+                    params={"wait": min(60, int(remaining) + 1)},
+                    timeout=70,
+                )
+                if response.status_code == 200:
+                    call = response.json()
+                    if call.get("state") == "reported":
+                        return call
+                elif response.status_code != 404:  # 404: no callback yet
+                    logger.warning(f"Call events for {call_id} unavailable: HTTP {response.status_code}")
+                    time.sleep(min(5, max(remaining, 0)))
+            except requests.RequestException as e:
+                logger.warning(f"Call events for {call_id} unavailable: {e}")
+                time.sleep(min(5, max(remaining, 0)))
+    
+    def get_recording_transcription(self, recording_sid: str) -> Optional[Dict]:
+        """
+        The transcription of one recording ({"sid", "status", "text"}), or None
+        if Twilio has not started one. Reads the recording's own Transcriptions
+        subresource (one request, whatever the account's volume) unless the
+        index already holds a finished result.
+        """
+        entry = self.transcriptions.get(recording_sid)
+        if entry is not None and entry["status"] in TranscriptionIndex.FINAL:
+            return entry
+        # <Record transcribe="true"> produces at most one transcription per recording
+        for trans in self.client.recordings(recording_sid).transcriptions.list(limit=5):
+            self.transcriptions.put(recording_sid, trans.sid, trans.status, trans.transcription_text)
+            if trans.status in TranscriptionIndex.FINAL:
+                break
+        return self.transcriptions.get(recording_sid)
+    
     def get_transcript(self, call_id: str, max_retries: int = 5) -> Dict:
-        """Get call transcript with retry logic for transcription processing"""
+        """
+        Get call transcript. With Twilio callbacks configured this waits for
+        the receiver's result; otherwise (or if no events arrive) it polls the
+        recordings and transcriptions APIs.
+        """
         if self.use_mock or not self.client:
             return self._mock_transcript(call_id)
         
+        if self.callback_base:
+            call = self.wait_for_result(call_id)
+            if call is not None:
+                if call.get("recording_sid") and call.get("transcription_sid"):
+                    self.transcriptions.put(call["recording_sid"], call["transcription_sid"], "completed", call.get("transcript"))
+                return {
+                    "call_id": call_id,
+                    "transcript": call.get("transcript") or f"Call {call.get('call_status')}. No transcription available.",
+                    "has_recording": bool(call.get("recording_sid")),
+                    "recording_url": call.get("recording_url"),
+                    "analysis": call.get("analysis"),
+                    # The receiver already analyzed the call and reported it to the backend
+                    "reported": True,
+                }
+            logger.warning(f"No callback result for {call_id}, falling back to polling")
+        
         try:
             call = self.client.calls(call_id).fetch()
             
@@ -89,22 +319,15 @@ class VoiceAgent:
                 
                 for trans_attempt in range(max_retries):
                     try:
-                        transcriptions = self.client.transcriptions.list(limit=50)
-                        for trans in transcriptions:
-                            if trans.recording_sid == rec.sid:
-                                if trans.status == "completed":
-                                    full_trans = self.client.transcriptions(trans.sid).fetch()
-                                    if hasattr(full_trans, 'transcription_text') and full_trans.transcription_text:
-                                        transcript_text += full_trans.transcription_text + " "
-                                        logger.info(f"Got transcription: {full_trans.transcription_text[:100]}...")
-                                elif trans.status == "in-progress":
-                                    logger.info(f"Transcription {trans.sid} still in progress, waiting...")
-                                    time.sleep(5)
-                                    continue
+                        entry = self.get_recording_transcription(rec.sid)
                     except Exception as trans_err:
                         logger.error(f"Error fetching transcription: {trans_err}")
+                        entry = None
                     
-                    if transcript_text:
+                    if entry is not None and entry["status"] in TranscriptionIndex.FINAL:
+                        if entry["text"]:
+                            transcript_text += entry["text"] + " "
+                            logger.info(f"Got transcription: {entry['text'][:100]}...")
                         break
                     
                     logger.info(f"Waiting for transcription, attempt {trans_attempt + 1}/{max_retries}")
@@ -126,63 +349,20 @@ class VoiceAgent:
             logger.error(f"Transcript error: {e}")
             return {"call_id": call_id, "transcript": f"Error getting transcript: {str(e)}", "has_recording": False}
     
+    @timed(ANALYZE_SECONDS.labels("single"))
     def analyze_outcome(self, transcript: str) -> Dict:
-        """Analyze call outcome using AI"""
-        if not transcript or len(transcript.strip()) < 10:
-            return {
-                "outcome": "no_response",
-                "qualified": False,
-                "action": "follow_up"
-            }
-        
-        text = transcript.lower().strip()
-        
-        # Positive indicators (interested)
-        positive_keywords = ["yes", "interested", "demo", "schedule", "meeting", "sure", "sounds good", 
-                            "tell me more", "want to", "would like", "sign up", "absolutely", "definitely"]
-        positive_score = sum(1 for kw in positive_keywords if kw in text)
+        """Analyze call outcome (shared keyword classifier, same as ElevenLabsAgent)"""
+        classifier = get_classifier()
+        if not transcript or len(transcript.strip()) < MIN_TRANSCRIPT_LENGTH:
+            return classifier.classify(transcript)
         
-        # Negative indicators (not interested)
-        negative_keywords = ["no", "not interested", "no thanks", "stop", "don't", "never", 
-                            "remove", "unsubscribe", "busy", "not now", "maybe later"]
-        negative_score = sum(1 for kw in negative_keywords if kw in text)
+        # Single pass over the transcript for all outcome classes
+        scores = classifier.scores(transcript)
         
-        # Callback indicators
-        callback_keywords = ["call back", "later", "next week", "another time", "busy now", "not available"]
-        callback_score = sum(1 for kw in callback_keywords if kw in text)
+        logger.info(f"Analysis scores - Positive: {scores['positive']}, Negative: {scores['negative']}, Callback: {scores['callback']}")
+        logger.info(f"Transcript: {transcript.lower().strip()[:100]}...")
         
-        logger.info(f"Analysis scores - Positive: {positive_score}, Negative: {negative_score}, Callback: {callback_score}")
-        logger.info(f"Transcript: {text[:100]}...")
-        
-        # Decision logic
-        if positive_score > negative_score and positive_score > 0:
-            return {
-                "outcome": "interested",
-                "qualified": True,
-                "action": "schedule_meeting",
-                "confidence": positive_score / (positive_score + negative_score + callback_score)
-            }
-        elif callback_score > 0 and callback_score >= negative_score:
-            return {
-                "outcome": "callback",
-                "qualified": False,
-                "action": "schedule_callback",
-                "confidence": callback_score / (positive_score + negative_score + callback_score)
-            }
-        elif negative_score > 0:
-            return {
-                "outcome": "not_interested",
-                "qualified": False,
-                "action": "blocklist",
-                "confidence": negative_score / (positive_score + negative_score + callback_score)
-            }
-        else:
-            return {
-                "outcome": "unclear",
-                "qualified": False,
-                "action": "follow_up",
-                "confidence": 0.0
-            }
+        return classifier.decide(**scores)
     
     def _mock_call(self, phone: str, name: str) -> Dict:
         """Mock call"""
@@ -200,13 +380,7 @@ class VoiceAgent:
         }
 
     def send_signal_to_backend(self, call_data: Dict) -> bool:
-        """Send call outcome and transcript to backend webhook"""
-        import requests
-        import json
-        
-        backend_url = os.getenv("BACKEND_URL", "http://localhost:4004")
-        webhook_url = f"{backend_url}/api/v1/call-agent/webhook/outcome"
-        
+        """Queue call outcome and transcript for the backend webhook (delivered in the background)"""
         try:
             # Prepare payload matching the backend expectation
             payload = {
@@ -221,18 +395,10 @@ class VoiceAgent:
                 "meeting_id": call_data.get("meeting_id")
             }
             
-            logger.info(f"Sending signal to backend: {webhook_url}")
-            # logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
-            
-            response = requests.post(webhook_url, json=payload, timeout=10)
-            
-            if response.status_code == 200:
-                logger.info(f"Successfully sent signal to backend. Response: {response.json()}")
-                return True
-            else:
-                logger.error(f"Failed to send signal. Status: {response.status_code}, Response: {response.text}")
-                return False
+            outbox_id = self.outbox.enqueue(payload)
+            logger.info(f"Queued signal to backend for call {payload['call_id']} (outbox #{outbox_id})")
+            return True
                 
         except Exception as e:
-            logger.error(f"Error sending signal to backend: {e}")
+            logger.error(f"Error queueing signal to backend: {e}")
             return False
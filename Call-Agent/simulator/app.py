@@ -0,0 +1,662 @@
+"""
+Upstream Simulator - Local ElevenLabs, Twilio and backend stand-ins for load testing
+
+Implements the endpoints the call agents use, with configurable latency,
+error rates, answer rate, call durations and outcome mix:
+
+    ElevenLabs  POST /v1/convai/twilio/outbound-call
+                GET  /v1/convai/conversations/{conversation_id}
+                GET  /v1/convai/conversations/{conversation_id}/audio
+                (optional signed post-call webhook, like ElevenLabs sends)
+    Twilio      POST /2010-04-01/Accounts/{sid}/Calls.json
+                GET  /2010-04-01/Accounts/{sid}/Calls/{call_sid}.json
+                GET  /2010-04-01/Accounts/{sid}/Recordings.json
+                GET  /2010-04-01/Accounts/{sid}/Recordings/{recording_sid}.json
+                GET  /2010-04-01/Accounts/{sid}/Recordings/{recording_sid}/Transcriptions.json
+                GET  /2010-04-01/Accounts/{sid}/Transcriptions.json
+                GET  /2010-04-01/Accounts/{sid}/Transcriptions/{transcription_sid}.json
+                (status, recording and transcription callbacks requested when the
+                call was created, signed with SIM_TWILIO_AUTH_TOKEN)
+    Backend     POST /api/v1/call-agent/webhook/outcome
+                POST /api/v1/call-agent/webhook/outcomes   (batched)
+
+Simulator control lives under /sim (config, stats, received outcomes, reset).
+
+Run:
+    cd Call-Agent/simulator
+    uvicorn app:app --port 4010
+
+Settings come from SIM_* environment variables (see SimConfig.from_env) and
+can be changed at runtime with PATCH /sim/config.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode
+from xml.sax.saxutils import unescape
+
+import httpx
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+# Scripted conversations per outcome, phrased to hit the agents' keyword classifier
+SCRIPTS = {
+    "interested": [
+        ("agent", "Hi {name}, this is Alex from No2bounce. Do you have a minute to hear about our email verification?"),
+        ("user", "Yes, that sounds good. Tell me more."),
+        ("agent", "We help teams like {company} cut bounce rates. Would you like to schedule a demo?"),
+        ("user", "Sure, I would like a demo next Tuesday."),
+    ],
+    "callback": [
+        ("agent", "Hi {name}, this is Alex from No2bounce. Is now a good time?"),
+        ("user", "I'm busy now, can you call back next week?"),
+        ("agent", "Of course, I'll reach out another time."),
+    ],
+    "not_interested": [
+        ("agent", "Hi {name}, this is Alex from No2bounce calling about email verification for {company}."),
+        ("user", "No thanks, I'm not interested. Please remove me from your list."),
+        ("agent", "Understood, sorry to bother you."),
+    ],
+    "unclear": [
+        ("agent", "Hi {name}, this is Alex from No2bounce. Can you hear me?"),
+        ("user", "Hello? Who is this?"),
+        ("agent", "I'm calling about email verification for {company}."),
+        ("user", "Hmm, okay."),
+    ],
+}
+
+# Chunk size of simulated audio downloads
+AUDIO_CHUNK = 64 * 1024
+
+# Z-score of the 99th percentile, for fitting a log-normal to (median, p99)
+Z_P99 = 2.326
+
+
+def _pair(name: str, default: Tuple[float, float]) -> Tuple[float, float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    low, high = value.split(",")
+    return (float(low), float(high))
+
+
+def _weights(name: str, default: Dict[str, float]) -> Dict[str, float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return {key.strip(): float(weight) for key, weight in (item.split("=") for item in value.split(","))}
+
+
+class SimConfig(BaseModel):
+    """Simulator behaviour. Latencies are (median, p99) in ms; durations (min, max) in seconds."""
+    elevenlabs_latency_ms: Tuple[float, float] = (80.0, 400.0)
+    twilio_latency_ms: Tuple[float, float] = (60.0, 300.0)
+    backend_latency_ms: Tuple[float, float] = (20.0, 150.0)
+    elevenlabs_error_rate: float = Field(0.0, ge=0, le=1)
+    twilio_error_rate: float = Field(0.0, ge=0, le=1)
+    backend_error_rate: float = Field(0.0, ge=0, le=1)
+    ring_s: float = Field(3.0, ge=0)
+    call_duration_s: Tuple[float, float] = (20.0, 90.0)
+    processing_s: float = Field(2.0, ge=0)
+    no_answer_rate: float = Field(0.1, ge=0, le=1)
+    outcome_weights: Dict[str, float] = {"interested": 0.3, "callback": 0.2, "not_interested": 0.3, "unclear": 0.2}
+    audio_bytes_per_s: int = Field(16000, ge=0)
+    webhook_url: Optional[str] = None
+    webhook_secret: Optional[str] = None
+    twilio_auth_token: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "SimConfig":
+        default = cls()
+        return cls(
+            elevenlabs_latency_ms=_pair("SIM_ELEVENLABS_LATENCY_MS", default.elevenlabs_latency_ms),
+            twilio_latency_ms=_pair("SIM_TWILIO_LATENCY_MS", default.twilio_latency_ms),
+            backend_latency_ms=_pair("SIM_BACKEND_LATENCY_MS", default.backend_latency_ms),
+            elevenlabs_error_rate=float(os.getenv("SIM_ELEVENLABS_ERROR_RATE", default.elevenlabs_error_rate)),
+            twilio_error_rate=float(os.getenv("SIM_TWILIO_ERROR_RATE", default.twilio_error_rate)),
+            backend_error_rate=float(os.getenv("SIM_BACKEND_ERROR_RATE", default.backend_error_rate)),
+            ring_s=float(os.getenv("SIM_RING_S", default.ring_s)),
+            call_duration_s=_pair("SIM_CALL_DURATION_S", default.call_duration_s),
+            processing_s=float(os.getenv("SIM_PROCESSING_S", default.processing_s)),
+            no_answer_rate=float(os.getenv("SIM_NO_ANSWER_RATE", default.no_answer_rate)),
+            outcome_weights=_weights("SIM_OUTCOME_WEIGHTS", default.outcome_weights),
+            audio_bytes_per_s=int(os.getenv("SIM_AUDIO_BYTES_PER_S", default.audio_bytes_per_s)),
+            webhook_url=os.getenv("SIM_ELEVENLABS_WEBHOOK_URL") or None,
+            webhook_secret=os.getenv("SIM_ELEVENLABS_WEBHOOK_SECRET") or None,
+            twilio_auth_token=os.getenv("SIM_TWILIO_AUTH_TOKEN") or None,
+        )
+
+
+def _sid(prefix: str) -> str:
+    return prefix + uuid.uuid4().hex
+
+
+def _rfc2822(ts: float) -> str:
+    return formatdate(ts, usegmt=True)
+
+
+# Callback attributes of the <Record> verb in the TwiML a call is created with
+_RECORD_CALLBACK = re.compile(r'\b(transcribeCallback|recordingStatusCallback)="([^"]*)"')
+
+
+@dataclass
+class TwilioCallbacks:
+    """Callbacks a Calls.json request asked for (empty URLs are not called)"""
+    status: str = ""
+    status_events: Tuple[str, ...] = ("completed",)
+    recording_status: str = ""
+    transcription: str = ""
+
+    @classmethod
+    def from_form(cls, form: Dict[str, List[str]]) -> "TwilioCallbacks":
+        def first(key: str) -> str:
+            return (form.get(key) or [""])[0]
+        record = {name: unescape(url) for name, url in _RECORD_CALLBACK.findall(first("Twiml"))}
+        events = [event for value in form.get("StatusCallbackEvent", []) for event in value.split()]
+        return cls(
+            status=first("StatusCallback"),
+            status_events=tuple(events) or ("completed",),
+            recording_status=first("RecordingStatusCallback") or record.get("recordingStatusCallback", ""),
+            transcription=record.get("transcribeCallback", ""),
+        )
+
+
+@dataclass
+class SimCall:
+    """One simulated call, its lifecycle derived from elapsed time"""
+    conversation_id: str
+    call_sid: str
+    account_sid: str
+    to: str
+    from_: str
+    name: str
+    company: str
+    created_at: float
+    ring_s: float
+    duration_s: float
+    processing_s: float
+    answered: bool
+    outcome: str
+    recording_sid: str
+    transcription_sid: str
+
+    @property
+    def answered_at(self) -> float:
+        return self.created_at + self.ring_s
+
+    @property
+    def ended_at(self) -> float:
+        return self.answered_at + (self.duration_s if self.answered else 0.0)
+
+    @property
+    def processed_at(self) -> float:
+        return self.ended_at + self.processing_s
+
+    def turns(self, now: float) -> List[Dict]:
+        """Transcript turns spoken so far, spread evenly over the call"""
+        if not self.answered or now < self.answered_at:
+            return []
+        script = SCRIPTS[self.outcome]
+        step = self.duration_s / len(script)
+        turns = []
+        for i, (role, message) in enumerate(script):
+            offset = i * step
+            if self.answered_at + offset > now:
+                break
+            turns.append({
+                "role": role,
+                "message": message.format(name=self.name, company=self.company),
+                "time_in_call_secs": int(offset),
+            })
+        return turns
+
+    def elevenlabs_status(self, now: float) -> str:
+        if now < self.answered_at:
+            return "initiated"
+        if not self.answered:
+            return "failed"
+        if now < self.ended_at:
+            return "in-progress"
+        if now < self.processed_at:
+            return "processing"
+        return "done"
+
+    def conversation(self, now: float) -> Dict:
+        status = self.elevenlabs_status(now)
+        return {
+            "agent_id": "sim-agent",
+            "conversation_id": self.conversation_id,
+            "status": status,
+            "transcript": self.turns(now),
+            "metadata": {
+                "start_time_unix_secs": int(self.created_at),
+                "call_duration_secs": int(min(now, self.ended_at) - self.answered_at) if self.answered and now >= self.answered_at else 0,
+                "phone_call": {"external_number": self.to, "call_sid": self.call_sid},
+            },
+            "has_audio": self.answered and status == "done",
+            "analysis": None,
+        }
+
+    def twilio_status(self, now: float) -> str:
+        if now < self.created_at + min(0.5, self.ring_s):
+            return "queued"
+        if now < self.answered_at:
+            return "ringing"
+        if not self.answered:
+            return "no-answer"
+        if now < self.ended_at:
+            return "in-progress"
+        return "completed"
+
+    def twilio_call(self, now: float) -> Dict:
+        status = self.twilio_status(now)
+        return {
+            "sid": self.call_sid,
+            "account_sid": self.account_sid,
+            "to": self.to,
+            "from": self.from_,
+            "status": status,
+            "direction": "outbound-api",
+            "date_created": _rfc2822(self.created_at),
+            "start_time": _rfc2822(self.answered_at) if self.answered and now >= self.answered_at else None,
+            "end_time": _rfc2822(self.ended_at) if status in ("completed", "no-answer") else None,
+            "duration": str(int(self.duration_s)) if status == "completed" else None,
+            "uri": f"/2010-04-01/Accounts/{self.account_sid}/Calls/{self.call_sid}.json",
+        }
+
+    def has_recording(self, now: float) -> bool:
+        return self.answered and now >= self.ended_at
+
+    def audio_size(self, bytes_per_s: int) -> int:
+        return int(self.duration_s * bytes_per_s)
+
+    def audio(self, size: int):
+        """Deterministic stand-in for the recording's MP3 bytes, in chunks"""
+        seed = hashlib.sha256(self.conversation_id.encode()).digest()
+        block = (seed * (AUDIO_CHUNK // len(seed) + 1))[:AUDIO_CHUNK]
+        for offset in range(0, size, AUDIO_CHUNK):
+            yield block[:min(AUDIO_CHUNK, size - offset)]
+
+    def recording(self) -> Dict:
+        return {
+            "sid": self.recording_sid,
+            "account_sid": self.account_sid,
+            "call_sid": self.call_sid,
+            "status": "completed",
+            "duration": str(int(self.duration_s)),
+            "date_created": _rfc2822(self.ended_at),
+            "uri": f"/2010-04-01/Accounts/{self.account_sid}/Recordings/{self.recording_sid}.json",
+        }
+
+    def transcription(self, now: float) -> Dict:
+        completed = now >= self.processed_at
+        # <Record transcribe="true"> only transcribes what the callee said
+        text = " ".join(turn["message"] for turn in self.turns(self.ended_at) if turn["role"] == "user")
+        return {
+            "sid": self.transcription_sid,
+            "account_sid": self.account_sid,
+            "recording_sid": self.recording_sid,
+            "status": "completed" if completed else "in-progress",
+            "transcription_text": text if completed else None,
+            "duration": str(int(self.duration_s)),
+            "date_created": _rfc2822(self.ended_at),
+            "uri": f"/2010-04-01/Accounts/{self.account_sid}/Transcriptions/{self.transcription_sid}.json",
+        }
+
+
+class Simulator:
+    """In-memory state shared by the simulated upstreams"""
+
+    def __init__(self, config: SimConfig):
+        self.config = config
+        self.calls: Dict[str, SimCall] = {}
+        self.by_call_sid: Dict[str, SimCall] = {}
+        self.by_recording_sid: Dict[str, SimCall] = {}
+        self.by_transcription_sid: Dict[str, SimCall] = {}
+        self.outcomes: deque = deque(maxlen=10000)
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.webhooks: Counter = Counter()
+        self._tasks: set = set()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def reset(self):
+        for task in self._tasks:
+            task.cancel()
+        for state in (self.calls, self.by_call_sid, self.by_recording_sid, self.by_transcription_sid,
+                      self.outcomes, self.requests, self.errors, self.webhooks):
+            state.clear()
+
+    async def upstream(self, service: str, endpoint: str):
+        """Apply the configured latency and error rate for one upstream request"""
+        self.requests[endpoint] += 1
+        median, p99 = getattr(self.config, f"{service}_latency_ms")
+        if median > 0:
+            sigma = math.log(p99 / median) / Z_P99 if p99 > median else 0.0
+            await asyncio.sleep(min(median * math.exp(sigma * random.gauss(0, 1)), p99 * 3) / 1000)
+        if random.random() < getattr(self.config, f"{service}_error_rate"):
+            self.errors[endpoint] += 1
+            raise HTTPException(status_code=503, detail={"status": "simulated_error", "message": f"Simulated {service} failure"})
+
+    def place_call(
+        self,
+        to: str,
+        from_: str,
+        account_sid: str = "ACsim",
+        name: str = "there",
+        company: str = "your company",
+        callbacks: Optional[TwilioCallbacks] = None,
+    ) -> SimCall:
+        config = self.config
+        outcomes = list(config.outcome_weights)
+        call = SimCall(
+            conversation_id=_sid("conv_"),
+            call_sid=_sid("CA"),
+            account_sid=account_sid,
+            to=to,
+            from_=from_,
+            name=name,
+            company=company,
+            created_at=time.time(),
+            ring_s=config.ring_s,
+            duration_s=random.uniform(*config.call_duration_s),
+            processing_s=config.processing_s,
+            answered=random.random() >= config.no_answer_rate,
+            outcome=random.choices(outcomes, weights=[config.outcome_weights[o] for o in outcomes])[0],
+            recording_sid=_sid("RE"),
+            transcription_sid=_sid("TR"),
+        )
+        self.calls[call.conversation_id] = call
+        self.by_call_sid[call.call_sid] = call
+        self.by_recording_sid[call.recording_sid] = call
+        self.by_transcription_sid[call.transcription_sid] = call
+        if config.webhook_url:
+            self._spawn(self._send_post_call_webhook(call, config.webhook_url, config.webhook_secret))
+        if callbacks is not None:
+            self._spawn(self._send_twilio_callbacks(call, callbacks, config.twilio_auth_token))
+        return call
+
+    def stats(self) -> Dict:
+        now = time.time()
+        statuses = Counter(call.elevenlabs_status(now) for call in self.calls.values())
+        return {
+            "calls": len(self.calls),
+            "calls_by_status": dict(statuses),
+            "outcomes_received": len(self.outcomes),
+            "requests": dict(self.requests),
+            "errors_injected": dict(self.errors),
+            "webhooks": dict(self.webhooks),
+        }
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_post_call_webhook(self, call: SimCall, url: str, secret: Optional[str]):
+        fire_at = call.processed_at if call.answered else call.answered_at
+        await asyncio.sleep(max(fire_at - time.time(), 0))
+        if call.answered:
+            event = {"type": "post_call_transcription", "event_timestamp": int(time.time()), "data": call.conversation(time.time())}
+        else:
+            event = {
+                "type": "call_initiation_failure",
+                "event_timestamp": int(time.time()),
+                "data": {"conversation_id": call.conversation_id, "agent_id": "sim-agent", "failure_reason": "no-answer"},
+            }
+        body = json.dumps(event).encode()
+        headers = {"Content-Type": "application/json"}
+        if secret:
+            timestamp = str(int(time.time()))
+            digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+            headers["ElevenLabs-Signature"] = f"t={timestamp},v0={digest}"
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        try:
+            response = await self._client.post(url, content=body, headers=headers)
+            self.webhooks[f"status_{response.status_code}"] += 1
+        except httpx.HTTPError:
+            self.webhooks["failed"] += 1
+
+    async def _send_twilio_callbacks(self, call: SimCall, callbacks: TwilioCallbacks, auth_token: Optional[str]):
+        """Post the call's status, recording and transcription callbacks as its lifecycle passes them"""
+        base = {"AccountSid": call.account_sid, "CallSid": call.call_sid}
+        ended = "completed" if call.answered else "no-answer"
+        events = []  # (fire at, url, params)
+        if callbacks.status:
+            status = dict(base, To=call.to, From=call.from_, Direction="outbound-api", ApiVersion="2010-04-01")
+            for event, fire_at, call_status in (
+                ("initiated", call.created_at, "queued"),
+                ("ringing", call.created_at + min(0.5, call.ring_s), "ringing"),
+                ("answered", call.answered_at, "in-progress"),
+                ("completed", call.ended_at, ended),
+            ):
+                if event in callbacks.status_events and (call.answered or event != "answered"):
+                    params = dict(status, CallStatus=call_status)
+                    if event == "completed" and call.answered:
+                        params["CallDuration"] = str(int(call.duration_s))
+                    events.append((fire_at, callbacks.status, params))
+        recording_url = f"https://api.twilio.com/2010-04-01/Accounts/{call.account_sid}/Recordings/{call.recording_sid}"
+        if callbacks.recording_status and call.answered:
+            events.append((call.ended_at, callbacks.recording_status, dict(
+                base, RecordingSid=call.recording_sid, RecordingUrl=recording_url,
+                RecordingStatus="completed", RecordingDuration=str(int(call.duration_s)),
+            )))
+        if callbacks.transcription and call.answered:
+            events.append((call.processed_at, callbacks.transcription, dict(
+                base, RecordingSid=call.recording_sid, RecordingUrl=recording_url,
+                TranscriptionSid=call.transcription_sid, TranscriptionStatus="completed",
+                TranscriptionText=call.transcription(call.processed_at)["transcription_text"],
+                TranscriptionType="fast", CallStatus=ended,
+            )))
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        for fire_at, url, params in sorted(events, key=lambda event: event[0]):
+            await asyncio.sleep(max(fire_at - time.time(), 0))
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            if auth_token:
+                data = url + "".join(f"{key}{params[key]}" for key in sorted(params))
+                digest = hmac.new(auth_token.encode(), data.encode(), hashlib.sha1).digest()
+                headers["X-Twilio-Signature"] = base64.b64encode(digest).decode()
+            try:
+                response = await self._client.post(url, content=urlencode(params), headers=headers)
+                self.webhooks[f"twilio_status_{response.status_code}"] += 1
+            except httpx.HTTPError:
+                self.webhooks["twilio_failed"] += 1
+
+
+def _twilio_page(key: str, items: List[Dict], uri: str, page_size: int) -> Dict:
+    """Twilio 2010-04-01 list envelope"""
+    return {
+        key: items[:page_size],
+        "page": 0,
+        "page_size": page_size,
+        "start": 0,
+        "end": max(min(len(items), page_size) - 1, 0),
+        "uri": uri,
+        "first_page_uri": uri,
+        "next_page_uri": None,
+        "previous_page_uri": None,
+    }
+
+
+def create_app(config: Optional[SimConfig] = None) -> FastAPI:
+    sim = Simulator(config or SimConfig.from_env())
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        yield
+        await sim.close()
+
+    app = FastAPI(title="Call Agent Upstream Simulator", version="0.1.0", lifespan=lifespan)
+    app.state.sim = sim
+
+    @app.exception_handler(HTTPException)
+    async def http_exception(request: Request, exc: HTTPException):
+        return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+
+    elevenlabs = APIRouter()
+
+    @elevenlabs.post("/twilio/outbound-call")
+    async def outbound_call(request: Request):
+        await sim.upstream("elevenlabs", "elevenlabs.outbound_call")
+        body = await request.json()
+        if not body.get("to_number"):
+            raise HTTPException(status_code=422, detail={"status": "invalid_request", "message": "to_number is required"})
+        call = sim.place_call(body["to_number"], body.get("agent_phone_number_id") or "sim-phone")
+        return {"success": True, "message": "Success", "conversation_id": call.conversation_id, "callSid": call.call_sid}
+
+    @elevenlabs.get("/conversations/{conversation_id}")
+    async def get_conversation(conversation_id: str):
+        await sim.upstream("elevenlabs", "elevenlabs.get_conversation")
+        call = sim.calls.get(conversation_id)
+        if call is None:
+            raise HTTPException(status_code=404, detail={"status": "conversation_not_found", "message": "Conversation not found"})
+        return call.conversation(time.time())
+
+    @elevenlabs.get("/conversations/{conversation_id}/audio")
+    async def get_conversation_audio(conversation_id: str):
+        await sim.upstream("elevenlabs", "elevenlabs.get_audio")
+        call = sim.calls.get(conversation_id)
+        if call is None or call.elevenlabs_status(time.time()) != "done":
+            raise HTTPException(status_code=404, detail={"status": "audio_not_found", "message": "Audio not found"})
+        size = call.audio_size(sim.config.audio_bytes_per_s)
+        return StreamingResponse(call.audio(size), media_type="audio/mpeg", headers={"Content-Length": str(size)})
+
+    twilio = APIRouter()
+
+    @twilio.post("/Calls.json", status_code=201)
+    async def create_call(account_sid: str, request: Request):
+        await sim.upstream("twilio", "twilio.create_call")
+        fields = parse_qs((await request.body()).decode())
+        form = {key: values[0] for key, values in fields.items()}
+        if not form.get("To"):
+            raise HTTPException(status_code=400, detail={"code": 21201, "message": "No 'To' number is specified"})
+        callbacks = TwilioCallbacks.from_form(fields)
+        requested = callbacks.status or callbacks.recording_status or callbacks.transcription
+        call = sim.place_call(form["To"], form.get("From", ""), account_sid, callbacks=callbacks if requested else None)
+        return call.twilio_call(time.time())
+
+    @twilio.get("/Calls/{call_sid}.json")
+    async def fetch_call(account_sid: str, call_sid: str):
+        await sim.upstream("twilio", "twilio.fetch_call")
+        call = sim.by_call_sid.get(call_sid)
+        if call is None:
+            raise HTTPException(status_code=404, detail={"code": 20404, "message": "The requested resource was not found"})
+        return call.twilio_call(time.time())
+
+    @twilio.get("/Recordings.json")
+    async def list_recordings(account_sid: str, request: Request):
+        await sim.upstream("twilio", "twilio.list_recordings")
+        now = time.time()
+        call_sid = request.query_params.get("CallSid")
+        page_size = int(request.query_params.get("PageSize", 50))
+        calls = [sim.by_call_sid[call_sid]] if call_sid in sim.by_call_sid else ([] if call_sid else list(sim.calls.values()))
+        items = [call.recording() for call in reversed(calls) if call.has_recording(now)]
+        return _twilio_page("recordings", items, str(request.url.path), page_size)
+
+    @twilio.get("/Recordings/{recording_sid}.json")
+    async def fetch_recording(account_sid: str, recording_sid: str):
+        await sim.upstream("twilio", "twilio.fetch_recording")
+        call = sim.by_recording_sid.get(recording_sid)
+        if call is None or not call.has_recording(time.time()):
+            raise HTTPException(status_code=404, detail={"code": 20404, "message": "The requested resource was not found"})
+        return call.recording()
+
+    @twilio.get("/Recordings/{recording_sid}/Transcriptions.json")
+    async def list_recording_transcriptions(account_sid: str, recording_sid: str, request: Request):
+        await sim.upstream("twilio", "twilio.list_recording_transcriptions")
+        now = time.time()
+        call = sim.by_recording_sid.get(recording_sid)
+        items = [call.transcription(now)] if call is not None and call.has_recording(now) else []
+        return _twilio_page("transcriptions", items, str(request.url.path), int(request.query_params.get("PageSize", 50)))
+
+    @twilio.get("/Transcriptions.json")
+    async def list_transcriptions(account_sid: str, request: Request):
+        await sim.upstream("twilio", "twilio.list_transcriptions")
+        now = time.time()
+        items = [call.transcription(now) for call in reversed(list(sim.calls.values())) if call.has_recording(now)]
+        return _twilio_page("transcriptions", items, str(request.url.path), int(request.query_params.get("PageSize", 50)))
+
+    @twilio.get("/Transcriptions/{transcription_sid}.json")
+    async def fetch_transcription(account_sid: str, transcription_sid: str):
+        await sim.upstream("twilio", "twilio.fetch_transcription")
+        now = time.time()
+        call = sim.by_transcription_sid.get(transcription_sid)
+        if call is None or not call.has_recording(now):
+            raise HTTPException(status_code=404, detail={"code": 20404, "message": "The requested resource was not found"})
+        return call.transcription(now)
+
+    backend = APIRouter()
+
+    @backend.post("/webhook/outcome")
+    async def receive_outcome(request: Request):
+        await sim.upstream("backend", "backend.outcome")
+        sim.outcomes.append({"received_at": time.time(), **(await request.json())})
+        return {"success": True, "message": "Call outcome processed"}
+
+    @backend.post("/webhook/outcomes")
+    async def receive_outcomes(request: Request):
+        await sim.upstream("backend", "backend.outcomes")
+        outcomes = (await request.json()).get("outcomes") or []
+        now = time.time()
+        sim.outcomes.extend({"received_at": now, **outcome} for outcome in outcomes)
+        return {"success": True, "message": f"{len(outcomes)} call outcome(s) processed"}
+
+    control = APIRouter()
+
+    @control.get("/config")
+    async def get_config():
+        return sim.config.model_dump()
+
+    @control.patch("/config")
+    async def update_config(request: Request):
+        try:
+            sim.config = SimConfig(**{**sim.config.model_dump(), **(await request.json())})
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=json.loads(e.json()))
+        return sim.config.model_dump()
+
+    @control.get("/stats")
+    async def get_stats():
+        return sim.stats()
+
+    @control.get("/outcomes")
+    async def get_outcomes(limit: int = 100):
+        return list(sim.outcomes)[-limit:]
+
+    @control.post("/reset")
+    async def reset():
+        sim.reset()
+        return {"success": True}
+
+    app.include_router(elevenlabs, prefix="/v1/convai")
+    app.include_router(twilio, prefix="/2010-04-01/Accounts/{account_sid}")
+    app.include_router(backend, prefix="/api/v1/call-agent")
+    app.include_router(control, prefix="/sim")
+    return app
+
+
+app = create_app()